@@ -5,8 +5,13 @@
 #    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
 
 __all__ = [
+    'aiorole',
     'asynrole',
+    'columnar',
     'debug',
+    'formatting',
+    'instrument',
+    'listener',
     'util',
     'rfc1155',
     'rfc1157',
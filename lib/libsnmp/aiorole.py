@@ -0,0 +1,325 @@
+# $Id$
+# $Revision$
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# An asyncio transport for the managers, in place of asynrole.
+#
+# Manager takes the same arguments and has the same send() and poll()
+# as asynrole.Manager, but its socket is an asyncio datagram endpoint,
+# so each datagram is handed to the callback as soon as it arrives.
+#
+# Without a loop, a Manager makes its own and only runs it inside
+# poll(), so the blocking run() loops of the managers work as they
+# did.  Given the event loop of a larger program, it doesn't need
+# poll() at all: received datagrams are dispatched by that loop, and
+# any number of managers can share it.
+#
+# With a batchSize, a Manager reads the socket itself rather than
+# through a transport, taking every datagram that has arrived, up to
+# batchSize of them, in one recvmmsg() call where there is one.
+
+import asyncio
+import logging
+import sys
+
+from libsnmp import role
+
+log = logging.getLogger('aiorole')
+
+
+class ManagerProtocol(asyncio.DatagramProtocol):
+    """ Hands each datagram received by a Manager's endpoint to the
+        Manager's callback
+    """
+
+    def __init__(self, manager):
+        self.manager = manager
+        return
+
+    def connection_made(self, transport):
+        self.manager.transport = transport
+        return
+
+    def datagram_received(self, data, addr):
+        self.manager.dispatch(data, addr)
+        self.manager.wake()
+        return
+
+    def error_received(self, exc):
+        ## Usually an ICMP port unreachable from an agent that isn't
+        ## there.  Its requests time out as any lost datagram would.
+        log.info('Error on %s: %s' % (self.manager.manager.interface, exc))
+        return
+
+    pass
+
+
+class Manager:
+
+    def __init__(self, callback_tuple, dst=(None, 0), interface=('0.0.0.0', 0), timeout=0.25, loop=None,
+                 batchSize=None, reusePort=False):
+
+        (cb_fun, cb_ctx) = callback_tuple
+        if not callable(cb_fun):
+            raise ValueError('Non-callable callback function')
+
+        self.cb_fun = cb_fun
+        self.cb_ctx = cb_ctx
+
+        self.timeout = timeout
+
+        # The future poll() or idle() is waiting on, and whether a
+        # wake() is already on its way from another thread
+        self.waiter = None
+        self.notified = False
+
+        # Whether sendDatagrams() is waiting for room in a full send
+        # buffer
+        self.sendBlocked = False
+
+        # Set by the protocol once the endpoint is made
+        self.transport = None
+        self.opening = None
+
+        self.ownLoop = loop is None
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            pass
+        self.loop = loop
+
+        self.batched = bool(batchSize)
+        if self.batched:
+            self.manager = role.manager(dst, interface, batchSize=batchSize, reusePort=reusePort)
+            sock = self.manager.open()
+            sock.setblocking(False)
+            loop.add_reader(sock.fileno(), self.readReady)
+            return
+
+        self.manager = role.manager(dst, interface, reusePort=reusePort)
+
+        endpoint = loop.create_datagram_endpoint(lambda: ManagerProtocol(self), sock=self.manager.open())
+        if loop.is_running():
+            # Made on the next pass of the loop.  Until then send()
+            # writes to the socket directly.
+            self.opening = loop.create_task(endpoint)
+        else:
+            loop.run_until_complete(endpoint)
+            pass
+        return
+
+    def __del__(self):
+        if hasattr(self, 'manager'):
+            self.close()
+            pass
+        return
+
+    def send(self, req, dst=(None, 0)):
+        if self.transport is not None:
+            self.transport.sendto(req, dst)
+        else:
+            self.manager.send(req, dst)
+            pass
+        return
+
+    def sendDatagrams(self, datagrams):
+        """ Send a list of (request, dst), in batches when batched,
+            returning how many were sent.  When batched, sending stops
+            once the socket's send buffer is full, and poll() or idle()
+            return when there is room for the rest.
+        """
+        if self.batched:
+            sent = self.manager.sendMany(datagrams)
+            if sent < len(datagrams) and not self.sendBlocked:
+                self.sendBlocked = True
+                self.loop.add_writer(self.manager.socket.fileno(), self.writable)
+                pass
+            return sent
+
+        ## The transport buffers what the socket has no room for
+        for (req, dst) in datagrams:
+            self.send(req, dst)
+            pass
+        return len(datagrams)
+
+    def writable(self):
+        """ The send buffer that filled up has room again
+        """
+        self.loop.remove_writer(self.manager.socket.fileno())
+        self.sendBlocked = False
+        self.wake()
+        return
+
+    def readReady(self):
+        """ Read the datagrams that have arrived, up to a batch of
+            them, when batched
+        """
+        batch = self.manager.readMany()
+        if batch:
+            self.receiveMany(batch)
+            self.wake()
+            pass
+        return
+
+    def receiveMany(self, batch):
+        """ Dispatch a batch of (data, src) read together
+        """
+        for (data, src) in batch:
+            self.dispatch(data, src)
+            pass
+        return
+
+    def dispatch(self, data, src):
+        """ Hand a datagram to the callback
+        """
+        try:
+            try:
+                self.cb_fun(self, self.cb_ctx, (data, src), (None, None, None))
+            except Exception:
+                self.handle_error(*sys.exc_info())
+                pass
+        except Exception as exc:
+            self.fail(exc)
+            pass
+        return
+
+    def poll(self, timeout=None):
+        """ Run the event loop until a received datagram has been
+            dispatched, or wake() is called, or for timeout seconds,
+            by default self.timeout.  On a loop that is already
+            running, datagrams are dispatched as they arrive, so
+            there's nothing to do.
+        """
+        loop = self.loop
+        if loop.is_running() or loop.is_closed():
+            return
+
+        if timeout is None:
+            timeout = self.timeout
+            pass
+
+        self.waiter = loop.create_future()
+        timer = loop.call_later(timeout, self.wake)
+        try:
+            loop.run_until_complete(self.waiter)
+        finally:
+            timer.cancel()
+            self.waiter = None
+            pass
+        return
+
+    async def idle(self, timeout=None):
+        """ As poll(), for a coroutine on the running loop.  Exceptions
+            raised by the callback go to the handler of the loop.
+        """
+        if timeout is None:
+            timeout = self.timeout
+            pass
+
+        loop = self.loop
+        self.waiter = waiter = loop.create_future()
+        timer = loop.call_later(timeout, self.wake)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # an Exception itself before Python 3.8
+            raise
+        except Exception as exc:
+            self.waiter = None
+            self.fail(exc)
+        finally:
+            timer.cancel()
+            self.waiter = None
+            pass
+        return
+
+    def notify(self):
+        """ Make poll() or idle() return as soon as it can, from any
+            thread.  If neither is waiting, the next one to be called
+            returns at once.
+        """
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+            pass
+
+        if running is self.loop:
+            self.wake()
+        elif not self.notified and not self.loop.is_closed():
+            self.notified = True
+            self.loop.call_soon_threadsafe(self.wake)
+            pass
+        return
+
+    def wake(self):
+        """ Make poll() or idle() return now
+        """
+        self.notified = False
+        waiter = self.waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+            pass
+        return
+
+    def fail(self, exc):
+        """ Pass on an exception raised by the callback: out of poll()
+            if it's waiting, as asynrole would, otherwise to the
+            handler of the loop
+        """
+        waiter = self.waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_exception(exc)
+        else:
+            self.loop.call_exception_handler({
+                'message': 'Exception in SNMP receive callback',
+                'exception': exc,
+                'transport': self.transport,
+            })
+            pass
+        return
+
+    def handle_error(self, exc_type=None, exc_value=None, exc_traceback=None):
+        if exc_type is None or exc_value is None or exc_traceback is None:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            pass
+        if type(exc_type) == type and issubclass(exc_type, ValueError):
+            self.cb_fun(self, self.cb_ctx, (None, None), (exc_type, exc_value, exc_traceback))
+        else:
+            raise exc_value
+
+        return
+
+    def close(self):
+        if self.batched and self.manager.socket is not None and not self.loop.is_closed():
+            self.loop.remove_reader(self.manager.socket.fileno())
+            if self.sendBlocked:
+                self.loop.remove_writer(self.manager.socket.fileno())
+                pass
+            pass
+
+        transport = self.transport
+        if transport is not None:
+            # The transport closes the socket
+            transport.close()
+            self.transport = None
+            self.manager.socket = None
+        else:
+            if self.opening is not None:
+                self.opening.cancel()
+                pass
+            self.manager.close()
+            pass
+
+        loop = self.loop
+        if self.ownLoop and not loop.is_closed() and not loop.is_running():
+            if transport is not None:
+                # let the transport finish closing
+                loop.run_until_complete(asyncio.sleep(0))
+                pass
+            loop.close()
+            pass
+        return
+
+    pass
@@ -0,0 +1,190 @@
+# $Id$
+# $Revision$
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Columnar decoding of numeric varbinds into NumPy arrays.
+#
+# Walking a counter column such as ifHCInOctets across many agents
+# only needs the numbers and the instance each belongs to.  This
+# decodes the varbinds of a column straight out of the encoded
+# responses into a uint64 or int64 array, with a parallel array of
+# the OID suffix of each value, without building a Counter64 or
+# Counter32 object for each one.
+#
+# NumPy is optional.  Everything else in libsnmp works without it.
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from . import rfc1155
+from . import rfc1905
+from .rfc1157 import locateVarBindList, iterVarBindOffsets
+
+## The widest numeric value: a Counter64 with a leading zero octet
+MAX_VALUE_OCTETS = 9
+
+
+def numericTags(codec=None):
+    """ Return the identifier octets of the unsigned and the signed
+        numeric types of a CodecRegistry, by default the SNMPv2c one,
+        as two sets.  Counters, Guages and TimeTicks are unsigned,
+        any other Integer is signed.
+    """
+    if codec is None:
+        codec = rfc1905.codec
+
+    unsigned = set()
+    signed = set()
+    for (tag, cls) in codec.types.items():
+        if issubclass(cls, (rfc1155.Counter, rfc1155.Guage, rfc1155.TimeTicks)):
+            unsigned.add(tag)
+        elif issubclass(cls, rfc1155.Integer):
+            signed.add(tag)
+            pass
+        pass
+    return unsigned, signed
+
+
+def decodeNumericColumn(responses, prefix):
+    """ Decode the numeric varbinds beneath prefix in one or more
+        encoded responses, returning (suffixes, values).
+
+        values is a uint64 array for Counter, Guage and TimeTicks
+        values, or an int64 array for Integers.  suffixes holds the
+        subids that follow prefix in each varbind name: a uint32
+        array with one row per value when every suffix is the same
+        length, as in an ifTable column, otherwise an object array of
+        tuples.  Varbinds outside prefix, or with a non numeric value
+        such as an EndOfMibView, are skipped.
+    """
+    if numpy is None:
+        raise ImportError('decodeNumericColumn needs NumPy')
+
+    if isinstance(responses, (bytes, bytearray, memoryview)):
+        responses = [responses]
+        pass
+
+    prefix = rfc1155.ObjectID(prefix)
+    prefixOctets = rfc1155.cachedEncodeSubIDs(prefix.value)
+    prefixLength = len(prefixOctets)
+    (unsignedTags, signedTags) = numericTags()
+    numeric = unsignedTags | signedTags
+
+    octets = bytearray()
+    starts = []
+    lengths = []
+    suffixes = []
+    seen = set()
+
+    for response in responses:
+        base = len(octets)
+        stream = rfc1155.octetStream(response)
+        (pduTag, pos, end) = locateVarBindList(stream)
+
+        for (start, nameEnd, tag, valueStart, valueEnd) in iterVarBindOffsets(stream, pos, end):
+            ## Subids are prefix free, so a name beneath prefix starts
+            ## with its octets, and what follows is the suffix.  A
+            ## shorter name isn't, whatever follows it.
+            if nameEnd - start < prefixLength or stream[start:start + prefixLength] != prefixOctets:
+                continue
+
+            if tag not in numeric:
+                continue
+
+            length = valueEnd - valueStart
+            if length == 0 or length > MAX_VALUE_OCTETS or (length == MAX_VALUE_OCTETS and stream[valueStart]):
+                raise ValueError('Numeric value of %d octets is out of range' % length)
+            seen.add(tag)
+
+            start += prefixLength
+            if nameEnd - start == 1 and stream[start] < 0x80:
+                suffixes.append((stream[start],))
+            else:
+                suffixes.append(decodeSuffix(stream, start, nameEnd))
+                pass
+            starts.append(base + valueStart)
+            lengths.append(length)
+            pass
+
+        octets += stream
+        pass
+
+    if seen & unsignedTags and seen & signedTags:
+        raise ValueError('Column mixes signed and unsigned values')
+
+    signed = bool(seen & signedTags)
+    values = decodeValues(octets, starts, lengths, signed)
+    return suffixIndex(suffixes), values
+
+
+def decodeSuffix(stream, pos, end):
+    """ Decode the subids of an OID suffix between pos and end
+    """
+    subids = []
+    value = 0
+    while pos < end:
+        byte = stream[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7f)
+        if not byte & 0x80:
+            subids.append(value)
+            value = 0
+            pass
+        pass
+    return tuple(subids)
+
+
+def decodeValues(octets, starts, lengths, signed):
+    """ Convert the big endian twos complement integers at starts in
+        octets into one int64 or uint64 array, all at once
+    """
+    count = len(starts)
+    if count == 0:
+        return numpy.zeros(0, dtype=signed and numpy.int64 or numpy.uint64)
+
+    buf = numpy.frombuffer(bytes(octets), dtype=numpy.uint8)
+    starts = numpy.array(starts, dtype=numpy.intp)
+    lengths = numpy.array(lengths, dtype=numpy.intp)
+    ends = starts + lengths
+
+    ## Line every value up at the right hand end of a row of eight
+    ## octets, sign extending the ones with the top bit set, then
+    ## read the rows as big endian 64 bit integers.  The ninth octet
+    ## of a 64 bit Counter is only ever a leading zero, so it's
+    ## dropped.
+    negative = buf[starts] & 0x80 != 0
+    rows = numpy.where(negative[:, None], numpy.uint8(0xff), numpy.uint8(0)).repeat(8, axis=1)
+    for column in range(8):
+        octet = 8 - column
+        present = lengths >= octet
+        rows[present, column] = buf[ends[present] - octet]
+        pass
+
+    if signed:
+        return rows.view('>i8').ravel().astype(numpy.int64)
+
+    ## Some agents encode 32 bit Counters as negative numbers, which
+    ## read as unsigned 32 bit numbers, as Counter.decodeContents()
+    ## does.  The same goes for Guages and TimeTicks here.
+    short = negative & (lengths <= 4)
+    rows[short, :4] = 0
+    return rows.view('>u8').ravel().astype(numpy.uint64)
+
+
+def suffixIndex(suffixes):
+    """ Build the index array of OID suffixes
+    """
+    if not suffixes:
+        return numpy.zeros((0, 0), dtype=numpy.uint32)
+
+    widths = set(len(suffix) for suffix in suffixes)
+    if len(widths) == 1:
+        return numpy.array(suffixes, dtype=numpy.uint32)
+
+    index = numpy.empty(len(suffixes), dtype=object)
+    index[:] = suffixes
+    return index
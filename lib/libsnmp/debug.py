@@ -6,14 +6,19 @@
 import logging
 import os
 
+from . import instrument
+from . import util
+
 class snmpLogger(logging.Logger):
 
     def __init__(self, name):
         pid = os.getpid()
 
         FORMAT = "%(asctime)s [" + str(pid) + "] %(name)s: %(levelname)s - %(message)s"
-        level = logging.DEBUG
-        logging.Logger.__init__(self, name, level)
+
+        ## Leave the level unset, so a logger only logs at DEBUG when
+        ## it, or the root logger, is set to
+        logging.Logger.__init__(self, name, logging.NOTSET)
 
         handler = logging.StreamHandler()
         formatter = logging.Formatter(FORMAT)
@@ -22,3 +27,28 @@ class snmpLogger(logging.Logger):
         return
 
 logging.setLoggerClass(snmpLogger)
+
+
+def traceCodec(logger=None):
+    """ Log every object the codec decodes or encodes at DEBUG level,
+        the way the codec used to log them itself.  Turns the codec
+        instrumentation on, and returns the tracer, for
+        instrument.removeTracer().
+    """
+    if logger is None:
+        logger = logging.getLogger('Asn1Object')
+        pass
+
+    def logEvent(event, obj, octets):
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        name = isinstance(obj, type) and obj.__name__ or obj.__class__.__name__
+        if octets is None:
+            logger.debug('%s %s' % (event, name))
+        else:
+            logger.debug('%s %s: %s' % (event, name, util.octetsToHex(octets)))
+        return
+
+    instrument.addTracer(logEvent)
+    instrument.enable()
+    return logEvent
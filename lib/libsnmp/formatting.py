@@ -0,0 +1,130 @@
+# $Id$
+# $Revision$
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Formatting of values and datagrams for people to read.
+#
+# Everything here takes time in proportion to the length of its
+# input: the work for each octet is done by bytes.hex(),
+# bytes.translate() or a lookup table, and the result is joined once
+# at the end, rather than built up a character at a time.  bytes.hex()
+# only takes a separator from Python 3.8, so separated hex is joined
+# from the HEX table instead.
+
+import sys
+
+from . import rfc1155
+
+## The octal rendering of every octet value, as octetsToOct() uses
+OCTAL = tuple('%s,' % oct(byte) for byte in range(256))
+
+## The two hex digits of every octet value
+HEX = tuple('%02x' % byte for byte in range(256))
+
+## The octets that print as themselves
+PRINTABLE = bytes(range(0x20, 0x7f)) + b'\t\n\r'
+
+## Maps every octet that doesn't print as itself to a '.'
+DOTTED = bytes(byte if byte in PRINTABLE and byte >= 0x20 else 0x2e for byte in range(256))
+
+
+def octetsToHex(octets, sep=''):
+    """ Convert a bytes-like object to a string of hex digits, with
+        sep between each octet
+    """
+    if sep:
+        return sep.join([ HEX[byte] for byte in bytes(octets) ])
+    return bytes(octets).hex()
+
+
+def octetsToOct(octets):
+    """ Convert a bytes-like object to a string of octal numbers, each
+        followed by a comma
+    """
+    return ''.join([ OCTAL[byte] for byte in bytes(octets) ])
+
+
+def isPrintable(octets):
+    """ Return True if every octet is printable ASCII, a tab or a
+        line break
+    """
+    return not bytes(octets).translate(None, PRINTABLE)
+
+
+def octetsToPrintable(octets):
+    """ Render octets as ASCII, with a '.' for every octet that isn't
+        printable, as in the right hand column of hexDump()
+    """
+    return bytes(octets).translate(DOTTED).decode('ascii')
+
+
+def hexDump(octets, width=16):
+    """ Format a whole datagram as lines of offset, hex and ASCII
+    """
+    octets = bytes(octets)
+    lines = []
+    for pos in range(0, len(octets), width):
+        chunk = octets[pos:pos + width]
+        lines.append('%04x  %-*s  |%s|' % (pos, width * 3 - 1, octetsToHex(chunk, ' '), chunk.translate(DOTTED).decode('ascii')))
+        pass
+    return '\n'.join(lines)
+
+
+def formatValue(value):
+    """ Render the value of a varbind.  OctetStrings that are text
+        come out as text, and the rest as hex.
+    """
+    if isinstance(value, rfc1155.OctetString) and not isinstance(value, rfc1155.IPAddress):
+        if isPrintable(value.value):
+            return value.value.decode('ascii')
+        return octetsToHex(value.value, ' ')
+    return str(value)
+
+
+def formatVarBind(varbind, showHex=False):
+    """ Format a varbind as 'oid = Type: value', with a second line of
+        hex for OctetStrings if showHex is True
+    """
+    value = varbind.objectValue
+    line = '%s = %s: %s' % (varbind.objectID, value.__class__.__name__, formatValue(value))
+    if showHex and isinstance(value, rfc1155.OctetString):
+        line = '%s\n   hex: %s' % (line, octetsToHex(value.value))
+    return line
+
+
+class WalkFormatter:
+    """ A walk callback that writes each varbind to a stream as it
+        arrives, so the output of a walk never has to be held in
+        memory.  Lines are passed to the stream's write() in batches
+        of up to batchSize, and whatever is left when the walk ends
+        is written by flush().
+    """
+
+    def __init__(self, stream=None, showHex=False, batchSize=64):
+        if stream is None:
+            stream = sys.stdout
+            pass
+        self.stream = stream
+        self.showHex = showHex
+        self.batchSize = batchSize
+        self.pending = []
+        self.count = 0
+
+    def __call__(self, manager, varbind):
+        self.pending.append(formatVarBind(varbind, self.showHex))
+        self.count += 1
+        if len(self.pending) >= self.batchSize:
+            self.flush()
+            pass
+        return
+
+    def flush(self):
+        if self.pending:
+            self.pending.append('')
+            self.stream.write('\n'.join(self.pending))
+            self.pending = []
+            pass
+        self.stream.flush()
+        return
@@ -0,0 +1,175 @@
+# $Id$
+# $Revision$
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Instrumentation of the codec.
+#
+# The codec itself carries no logging or counting.  enable() swaps
+# counting versions of the decode functions and of a few methods into
+# the codec, and disable() swaps the originals back, so when it's off
+# the codec runs exactly the code it would without this module.
+#
+# While it's on, counters holds the number of objects decoded and
+# encoded by type, and the octets they took, and every tracer added
+# with addTracer() is called as tracer(event, obj, octets) for each
+# of them.  Events are 'decode', 'decodeRaw', 'encode', 'encodeLength'
+# (for long form lengths only), 'decodeContents' and
+# 'encodeContentsInto'.
+
+import collections
+
+from . import rfc1155
+
+## Counts of codec events, keyed by 'event.TypeName', plus the total
+## octets 'octets.decoded' and 'octets.encoded'
+counters = collections.Counter()
+
+## Callbacks for each codec event
+tracers = []
+
+## The methods enable() replaces, as (class, name, event)
+METHODS = (
+    (rfc1155.Asn1Object, 'encode', 'encode'),
+    (rfc1155.Asn1Object, 'encodeLength', 'encodeLength'),
+    (rfc1155.Integer, 'decodeContents', 'decodeContents'),
+    (rfc1155.Sequence, 'encodeContentsInto', 'encodeContentsInto'),
+)
+
+## The original methods, while enabled
+originals = {}
+
+
+def isEnabled():
+    return rfc1155.decoderHook is not None
+
+
+def enable():
+    """ Start counting and tracing codec events
+    """
+    if isEnabled():
+        return
+
+    for (cls, name, event) in METHODS:
+        method = cls.__dict__[name]
+        originals[(cls, name)] = method
+        setattr(cls, name, wrapMethod(method, event))
+        pass
+
+    rfc1155.decoderHook = wrapDecoder
+    reregister()
+    return
+
+
+def disable():
+    """ Stop counting and tracing, putting the original codec back.
+        The counters are kept until reset().
+    """
+    if not isEnabled():
+        return
+
+    for ((cls, name), method) in originals.items():
+        setattr(cls, name, method)
+        pass
+    originals.clear()
+
+    rfc1155.decoderHook = None
+    reregister()
+    return
+
+
+def reregister():
+    """ Rebuild every decode function, so they pick up the hook, or
+        lose it
+    """
+    for tag in list(rfc1155.tagDecodeDict):
+        rfc1155.registerDecoder(tag)
+        pass
+    for codec in list(rfc1155.codecRegistries):
+        codec.build()
+        pass
+    return
+
+
+def reset():
+    counters.clear()
+    return
+
+
+def snapshot():
+    """ Return a copy of the counters
+    """
+    return dict(counters)
+
+
+def addTracer(tracer):
+    """ Call tracer(event, obj, octets) for every codec event while
+        instrumentation is enabled.  For decode events obj is the
+        type being decoded, for the others it's the object.  octets
+        is the encoding, or the contents, involved, where there is one.
+    """
+    tracers.append(tracer)
+    return
+
+
+def removeTracer(tracer):
+    tracers.remove(tracer)
+    return
+
+
+def trace(event, obj, octets):
+    for tracer in tracers:
+        tracer(event, obj, octets)
+        pass
+    return
+
+
+def wrapDecoder(tag, cls, decode, raw=False):
+    """ The decoderHook: wrap a decode function from registerDecoder()
+        or a CodecRegistry in one that counts and traces what it decodes
+    """
+    event = raw and 'decodeRaw' or 'decode'
+    key = '%s.%s' % (event, cls.__name__)
+
+    def countedDecode(stream, start, end):
+        counters[key] += 1
+        counters['octets.decoded'] += end - start
+        if tracers:
+            trace(event, cls, stream[start:end])
+        return decode(stream, start, end)
+    return countedDecode
+
+
+def wrapMethod(method, event):
+    """ Wrap a codec method in one that counts and traces its calls
+    """
+    if event == 'encode':
+        def countedMethod(self, *args):
+            result = method(self, *args)
+            counters['encode.%s' % self.__class__.__name__] += 1
+            counters['octets.encoded'] += len(result)
+            if tracers:
+                trace(event, self, result)
+            return result
+
+    elif event == 'encodeLength':
+        def countedMethod(self, length):
+            result = method(self, length)
+            if length >= 127:
+                counters['encodeLength.long'] += 1
+                if tracers:
+                    trace(event, self, result)
+                pass
+            return result
+
+    else:
+        def countedMethod(self, *args):
+            counters['%s.%s' % (event, self.__class__.__name__)] += 1
+            if tracers:
+                trace(event, self, None)
+            return method(self, *args)
+
+    countedMethod.__name__ = method.__name__
+    countedMethod.__doc__ = method.__doc__
+    return countedMethod
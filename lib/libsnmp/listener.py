@@ -0,0 +1,311 @@
+# $Id$
+# $Revision$
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# A trap listener that spreads trap decoding across processes.
+#
+# A TrapListener forks a number of workers, each a v2.SNMP with its
+# own socket bound to the same port with SO_REUSEPORT, so the kernel
+# shares the arriving traps out between them by source address.  Each
+# worker hands its traps to the trapCallback as a single v2.SNMP
+# would, and counts them into memory shared with the supervisor, which
+# reports how fast each worker is going and how many datagrams its
+# socket has dropped.
+#
+# SO_REUSEPORT and fork() are needed, so this works on Linux and most
+# other Unixes, but not Windows.  Drop counters come from
+# /proc/net/udp, so are only there on Linux.
+
+import logging
+import multiprocessing
+import os
+import socket
+import time
+
+from libsnmp import rfc1155
+from libsnmp import rfc1157
+from libsnmp import rfc1905
+from libsnmp import v2
+
+log = logging.getLogger('listener')
+
+## The counters each worker keeps in its slot of the shared array
+RECEIVED = 0
+TRAPS = 1
+ERRORS = 2
+INODE = 3
+FIELDS = 4
+
+## How long start() waits for the workers to bind
+STARTUP_TIMEOUT = 5.0
+
+
+class TrapWorker(v2.SNMP):
+    """ A v2.SNMP listening on a port it shares with the other
+        workers, counting what it receives into its slot of the
+        supervisor's counters
+    """
+
+    def __init__(self, interface, trapCallback, counters, slot, batchSize=None):
+        self.counters = counters
+        self.slot = slot * FIELDS
+        self.handler = trapCallback
+
+        v2.SNMP.__init__(self, interface, trapCallback=self.countTrap, batchSize=batchSize, reusePort=True)
+
+        # Tells the supervisor this worker is listening, and which
+        # socket is its own in /proc/net/udp
+        counters[self.slot + INODE] = os.fstat(self.manager.socket.fileno()).st_ino
+        return
+
+    def receiveData(self, manager, cb_ctx, data_src_tuple, exc_tuple):
+        self.counters[self.slot + RECEIVED] += 1
+        return v2.SNMP.receiveData(self, manager, cb_ctx, data_src_tuple, exc_tuple)
+
+    def countTrap(self, snmpClient, msg):
+        try:
+            self.handler(snmpClient, msg)
+        except Exception:
+            self.counters[self.slot + ERRORS] += 1
+            raise
+        self.counters[self.slot + TRAPS] += 1
+        return
+
+    def run(self):
+        """ Dispatch traps until the supervisor stops the worker
+        """
+        while 1:
+            self.poll()
+            pass
+
+    pass
+
+
+def runWorker(interface, trapCallback, counters, slot, batchSize, placeholder):
+    worker = TrapWorker(interface, trapCallback, counters, slot, batchSize)
+
+    # The fork's copy of the supervisor's socket on the port would
+    # take a share of the traps and never read them
+    if placeholder is not None:
+        placeholder.close()
+        pass
+    worker.run()
+    return
+
+
+class TrapListener:
+
+    def __init__(self, trapCallback, interface=('0.0.0.0', 162), workers=None, batchSize=32):
+        """ Listen for traps on interface with workers processes, by
+            default one for each CPU, each of which calls
+            trapCallback(snmpClient, msg) for the traps it receives.
+            Given a port of 0, the workers share a free port, which
+            is in interface once start() returns.
+        """
+        if not callable(trapCallback):
+            raise ValueError('Non-callable trap callback')
+        if not hasattr(socket, 'SO_REUSEPORT'):
+            raise NotImplementedError('TrapListener needs SO_REUSEPORT')
+
+        self.trapCallback = trapCallback
+        self.interface = interface
+        self.workers = workers or os.cpu_count() or 1
+        self.batchSize = batchSize
+
+        self.processes = []
+        self.counters = None
+
+        # The counters at the last stats(), to work out rates from
+        self.last = None
+        return
+
+    def start(self):
+        """ Fork the workers, returning once every one is listening
+        """
+        context = multiprocessing.get_context('fork')
+        self.counters = context.RawArray('Q', self.workers * FIELDS)
+
+        ## Hold a port of 0 open on a socket of our own until the
+        ## workers have bound the same one, then leave them to it
+        placeholder = None
+        if self.interface[1] == 0:
+            placeholder = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            placeholder.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            placeholder.bind(self.interface)
+            self.interface = placeholder.getsockname()
+            pass
+
+        try:
+            for slot in range(self.workers):
+                process = context.Process(target=runWorker, name='trap worker %d' % slot, daemon=True,
+                                          args=(self.interface, self.trapCallback, self.counters, slot,
+                                                self.batchSize, placeholder))
+                process.start()
+                self.processes.append(process)
+                pass
+            self.waitReady()
+        except:
+            self.stop()
+            raise
+        finally:
+            if placeholder is not None:
+                placeholder.close()
+                pass
+            pass
+
+        self.last = (time.monotonic(), self.snapshot())
+        log.info('%d trap workers listening on %s:%d' % ((self.workers,) + tuple(self.interface)))
+        return
+
+    def waitReady(self):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        for (slot, process) in enumerate(self.processes):
+            while not self.counters[slot * FIELDS + INODE]:
+                if not process.is_alive():
+                    raise RuntimeError('Trap worker %d exited with %s' % (slot, process.exitcode))
+                if time.monotonic() > deadline:
+                    raise RuntimeError('Trap worker %d did not start' % slot)
+                time.sleep(0.01)
+                pass
+            pass
+        return
+
+    def snapshot(self):
+        """ Return each worker's counters as a list of lists
+        """
+        counters = self.counters[:]
+        return [ counters[slot * FIELDS:(slot + 1) * FIELDS] for slot in range(self.workers) ]
+
+    def stats(self):
+        """ Return a dict of counters for each worker: how many
+            datagrams it has received, how many traps it has handed to
+            the callback and how many the callback raised on, its
+            traps per second since the last call, how many datagrams
+            its socket has dropped, or None where that isn't known,
+            and whether it's still alive
+        """
+        now = time.monotonic()
+        current = self.snapshot()
+        (then, previous) = self.last
+        self.last = (now, current)
+
+        elapsed = max(now - then, 1e-9)
+        drops = socketDrops()
+        stats = []
+        for (slot, process) in enumerate(self.processes):
+            counters = current[slot]
+            stats.append({
+                'pid': process.pid,
+                'alive': process.is_alive(),
+                'received': counters[RECEIVED],
+                'traps': counters[TRAPS],
+                'errors': counters[ERRORS],
+                'rate': (counters[TRAPS] - previous[slot][TRAPS]) / elapsed,
+                'drops': drops.get(counters[INODE]),
+            })
+            pass
+        return stats
+
+    def run(self, interval=5.0, report=None):
+        """ Start the workers, if they aren't yet, and call
+            report(stats) every interval seconds, by default logging
+            them, until interrupted
+        """
+        if not self.processes:
+            self.start()
+            pass
+
+        if report is None:
+            report = logStats
+            pass
+
+        try:
+            while 1:
+                time.sleep(interval)
+                report(self.stats())
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+            pass
+        return
+
+    def stop(self):
+        """ Stop the workers.  Their counters stay readable.
+        """
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+                pass
+            pass
+        for process in self.processes:
+            process.join()
+            pass
+        return
+
+    pass
+
+
+def logStats(stats):
+    for (slot, worker) in enumerate(stats):
+        log.info('worker %d pid %d: %d traps, %.1f/s, %d errors, %s drops%s' % (
+            slot, worker['pid'], worker['traps'], worker['rate'], worker['errors'], worker['drops'],
+            not worker['alive'] and ' (exited)' or ''))
+        pass
+    return
+
+
+def socketDrops():
+    """ Return a dict of the datagrams each UDP socket has dropped,
+        by inode, from /proc/net/udp and /proc/net/udp6, or an empty
+        dict where there are no such files
+    """
+    drops = {}
+    for path in ('/proc/net/udp', '/proc/net/udp6'):
+        try:
+            with open(path) as table:
+                lines = table.readlines()
+        except OSError:
+            continue
+
+        ## The columns are sl, local_address, rem_address, st,
+        ## tx_queue:rx_queue, tr:tm->when, retrnsmt, uid, timeout,
+        ## inode, ref, pointer and drops
+        for line in lines[1:]:
+            fields = line.split()
+            if len(fields) >= 13:
+                drops[int(fields[9])] = int(fields[12])
+                pass
+            pass
+        pass
+    return drops
+
+
+def sendTraps(remote, count, sources=16, community='public'):
+    """ Send count SNMPv2c traps to remote from sources sockets in
+        turn, so that SO_REUSEPORT spreads them across workers as
+        traps from that many agents would be, returning how many were
+        sent.  The specificTrap of each counts up from 0.
+    """
+    agentAddr = rfc1155.NetworkAddress('127.0.0.1')
+    varbind = rfc1157.VarBind(rfc1155.ObjectID('.1.3.6.1.4.5.6.7'), rfc1155.OctetString('test trap'))
+    sockets = [ socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for i in range(sources) ]
+    try:
+        for sock in sockets:
+            sock.bind(('127.0.0.1', 0))
+            pass
+        for i in range(count):
+            pdu = rfc1157.TrapPDU(rfc1155.ObjectID('.1.3.6.1.4'), agentAddr, rfc1157.GenericTrap(6),
+                                  rfc1155.Integer(i), rfc1155.TimeTicks(i),
+                                  rfc1157.VarBindList([varbind]))
+            sockets[i % sources].sendto(rfc1905.Message(community=community, data=pdu).encode(), remote)
+            pass
+    finally:
+        for sock in sockets:
+            sock.close()
+            pass
+        pass
+    return count
@@ -13,11 +13,10 @@
 # I've included here all the basic SNMPv1 types, since they are used
 # by SNMPv2 and v3.
 
-import copy
 import logging
-from functools import reduce
-
-from . import util
+import weakref
+from functools import lru_cache
+from types import MappingProxyType
 
 log = logging.getLogger('Asn1Object')
 
@@ -61,11 +60,250 @@ asnTagNumbers = {
 }
 
 
+##
+## BER decoding works on a single octet stream with an integer
+## cursor.  Each helper takes the position to start decoding from and
+## returns the decoded value along with the position of the first
+## octet after it, so decoding an object never copies the rest of the
+## stream following it.
+##
+def octetStream(stream):
+    """Check that stream is a bytes-like object and return it as a
+    memoryview, so that handing each object its contents is a view
+    onto the original buffer rather than a copy of it"""
+
+    if not isinstance(stream, (bytes, bytearray, memoryview)):
+        raise TypeError('stream should be a bytes-like object, not %s' % type(stream))
+
+    if type(stream) is not memoryview:
+        stream = memoryview(stream)
+    return stream
+
+
+def decodeTagAt(stream, pos):
+    """Decode a BER tag field starting at pos, returning the tag and
+    the position of the octet following it"""
+
+    tag = stream[pos]
+    pos += 1
+    if tag & 0x1F == 0x1F:
+
+        ## A large tag is encoded using concatenated 7-bit values
+        ## over the following octets, ignoring the initial 5 bits
+        ## in the first octet.  The 8th bit represents a
+        ## follow-on.
+
+        tag = 0
+        while 1:
+            byte = stream[pos]
+            tag = (tag << 7) | (byte & 0x7F)
+            pos += 1
+            if not byte & 0x80: break
+            pass
+        pass
+
+    return tag, pos
+
+
+def decodeLengthAt(stream, pos):
+    """Decode a BER length field starting at pos, returning the length
+    and the position of the first contents octet"""
+
+    length = stream[pos]
+    pos += 1
+    if length & 0x80:
+
+        ## Multi-Octet length encoding.  The first octet
+        ## represents the run-length (the number of octets used to
+        ## build the length)
+
+        run = length & 0x7F
+        length = 0
+        for i in range(run):
+            length = (length << 8) | stream[pos]
+            pos += 1
+            pass
+        pass
+    return length, pos
+
+
+def decodeHeaderAt(stream, pos, end):
+    """Decode the tag and length of the object starting at pos,
+    returning the tag along with the positions of the first and one
+    past the last contents octets.  end is the end of the enclosing
+    object, which the contents must not run past."""
+
+    (tag, pos) = decodeTagAt(stream, pos)
+    (length, pos) = decodeLengthAt(stream, pos)
+
+    contentsEnd = pos + length
+    if contentsEnd > end:
+        raise ValueError('Truncated ASN.1 object: need %d octets, have %d' % (length, end - pos))
+
+    return tag, pos, contentsEnd
+
+
+def decodeObjectAt(stream, pos, end, decoders=None):
+    """Decode the object starting at pos, returning it and the
+    position of the octet following it.  decoders is the decode
+    function table of a CodecRegistry, or None for tagDecoders."""
+
+    (tag, pos, contentsEnd) = decodeHeaderAt(stream, pos, end)
+
+    if decoders is None:
+        try:
+            decode = tagDecoders[tag]
+        except KeyError:
+            decode = registerDecoder(tag)
+    else:
+        try:
+            decode = decoders[tag]
+        except KeyError:
+            raise ValueError('Unknown ASN.1 Type %d' % (tag))
+
+    return decode(stream, pos, contentsEnd), contentsEnd
+
+
+## Set by the instrument module while instrumentation is on, to wrap
+## each decode function registerDecoder() and CodecRegistry install.
+## None costs nothing on the decode path itself.
+decoderHook = None
+
+
+def registerDecoder(tag, cls=None):
+    """Make cls the type that objects with identifier octet tag
+    decode into, returning its decode function.  Without a cls,
+    the type already in tagDecodeDict is used."""
+
+    if cls is None:
+        try:
+            cls = tagDecodeDict[tag]
+        except KeyError:
+            raise ValueError('Unknown ASN.1 Type %d' % (tag))
+        pass
+
+    decode = cls.decoder()
+    decodeRaw = cls.rawDecoder()
+    if decoderHook is not None:
+        decode = decoderHook(tag, cls, decode)
+        decodeRaw = decoderHook(tag, cls, decodeRaw, raw=True)
+        pass
+
+    tagDecodeDict[tag] = cls
+    tagDecoders[tag] = decode
+    tagRawDecoders[tag] = decodeRaw
+    return decode
+
+
+##
+## Integers are twos complement, big endian, in as few octets as
+## hold them, which is exactly what int.from_bytes and int.to_bytes
+## do.  test/test_svt_integer.py compares them with the byte at a
+## time codecs this module used to have.
+##
+
+## Most integers in a message, such as the error status and index,
+## fit in one octet, and looking those up beats calling from_bytes
+singleOctetValues = tuple(range(0x80)) + tuple(range(-0x80, 0))
+
+
+def decodeIntegerValue(octets):
+    """Decode the contents octets of a signed integer"""
+
+    if len(octets) == 1:
+        return singleOctetValues[octets[0]]
+    if not octets:
+        raise ValueError('Integer of zero length')
+    return int.from_bytes(octets, 'big', signed=True)
+
+
+def decodeUnsignedValue(octets, modulus):
+    """Decode the contents octets of one of the unsigned integer
+    types, whose values run from 0 to modulus - 1"""
+
+    value = decodeIntegerValue(octets)
+
+    ## Some agents encode Counters incorrectly (hello Solaris) as
+    ## a negative number.  I'm assuming most SNMP libraries don't
+    ## notice the problem because the are written in C and cast
+    ## the result to an unsigned int - problem solved (if
+    ## accidentally).  This ugly hack on their behalf flips the
+    ## value over to the positive world.
+
+    if value < 0:
+        value += modulus
+        pass
+    return value
+
+
+def integerLength(value):
+    """Return the number of contents octets encodeIntegerValue()
+    uses: one for every 8 bits of magnitude, plus room for the sign
+    bit.  Unsigned values get the leading zero octet this implies
+    whenever their top bit is set."""
+
+    if value < 0:
+        value = ~value
+    return value.bit_length() // 8 + 1
+
+
+def encodeIntegerValue(value):
+    """Encode an integer as contents octets"""
+
+    return value.to_bytes(integerLength(value), 'big', signed=True)
+
+
+def encodeUnsignedValue(value):
+    """Encode a non negative integer as contents octets.  The same
+    octets as encodeIntegerValue(), without the work of allowing for
+    a sign."""
+
+    return value.to_bytes(value.bit_length() // 8 + 1, 'big')
+
+
+def decodeObjects(stream, pos, end, decoders=None):
+    """Decode every object encoded in stream between pos and end,
+    returning them as a list.  Only the contents of each object are
+    handed on to its decodeContents() method."""
+
+    objects = []
+    while pos < end:
+        (obj, pos) = decodeObjectAt(stream, pos, end, decoders)
+        objects.append(obj)
+        pass
+
+    return objects
+
+
+def encodedLengthSize(length):
+    """Return the number of octets encodeLength() uses to encode a
+    contents length"""
+
+    if length < 127:
+        return 1
+    return 1 + (length.bit_length() + 7) // 8
+
+
+def toOctets(value):
+    """Convert value to the bytes used as the contents of an
+    OctetString.  A str is taken to hold one octet per character, as
+    it did before the codec worked in bytes."""
+
+    if isinstance(value, str):
+        return value.encode('latin-1')
+    if isinstance(value, int):
+        raise TypeError('OctetString value must be str or bytes, not int')
+    return bytes(value)
+
+
 class Asn1Object:
     """Base class for all Asn1Objects This is only intended to
     support a specific subset of ASN1 stuff as defined by the RFCs to
     keep things as simple as possible."""
 
+    ## No instance dict here, so subclasses can declare __slots__
+    __slots__ = ()
+
     ##
     ## The asnTag is a number used with BER to encode/decode the
     ## object.
@@ -76,49 +314,143 @@ class Asn1Object:
 
     value = None
 
+    ## The CodecRegistry decode() uses, or None for tagDecodeDict.
+    ## Messages and PDUs have the one of their SNMP version.
+    codec = None
+
     def __init__(self):
         return
 
     def encode(self):
 
-        """ encode() this Asn1Object using BER"""
+        """ encode() this Asn1Object using BER
+
+        Encoding takes two passes.  The first measures every object,
+        building a plan that holds the contents of each primitive
+        object and the contents length of each constructed one, in
+        the order they will be written.  The second writes the plan
+        into a buffer allocated at exactly the right size, so nothing
+        gets copied as the nesting unwinds."""
+
+        plan = []
+        buf = bytearray(self.measure(plan))
+        self.encodeInto(buf, 0, iter(plan))
+        return bytes(buf)
+
+    def encodedLength(self):
+
+        """Return the number of octets encode() would produce for this
+        object, without encoding it"""
+
+        length = self.contentsLength()
+        return self.headerLength(length) + length
+
+    def contentsLength(self):
+
+        """Return the length of the contents octets of this object.
+        Subclasses should override this with something cheaper than
+        encoding the contents where they can."""
+
+        return len(self.encodeContents())
+
+    def headerLength(self, length):
+
+        """Return the number of identifier and length octets needed in
+        front of contents of the given length"""
+
+        if self.asnTagNumber < 0x1F:
+            identifierLength = 1
+        else:
+            identifierLength = len(self.encodeIdentifier())
+            pass
+
+        if length < 127:
+            return identifierLength + 1
+        return identifierLength + encodedLengthSize(length)
+
+    def measure(self, plan):
+
+        """First pass of encode(): add this object to the plan and
+        return its encoded length"""
 
         contents = self.encodeContents()
+        plan.append(contents)
+        length = len(contents)
+        return self.headerLength(length) + length
 
-        resultlist = []
-        resultlist.append(self.encodeIdentifier())
-        resultlist.append(self.encodeLength(len(contents)))
-        resultlist.append(contents)
+    def encodeInto(self, buf, pos, plan):
 
-        result = ''.join(resultlist)
+        """Second pass of encode(): write the encoding of this object
+        into buf at pos, returning the position after it.  plan is an
+        iterator over the plan built by measure()."""
 
-        return result
+        contents = next(plan)
+        pos = self.encodeHeaderInto(buf, pos, len(contents))
+        end = pos + len(contents)
+        buf[pos:end] = contents
+        return end
+
+    def encodeHeaderInto(self, buf, pos, length):
+
+        """Write the identifier and length octets for contents of the
+        given length into buf at pos, returning the position of the
+        first contents octet"""
+
+        if self.asnTagNumber < 0x1F:
+            buf[pos] = self.asnTagClass | self.asnTagFormat | self.asnTagNumber
+            pos += 1
+        else:
+            identifier = self.encodeIdentifier()
+            end = pos + len(identifier)
+            buf[pos:end] = identifier
+            pos = end
+            pass
+
+        if length < 127:
+            buf[pos] = length
+            return pos + 1
+
+        lengthOctets = self.encodeLength(length)
+        end = pos + len(lengthOctets)
+        buf[pos:end] = lengthOctets
+        return end
 
     ##
     ##
-    def decodeTag(self, stream):
+    @classmethod
+    def decoder(cls, decoders=None):
 
-        """Decode a BER tag field, returning the tag and the remainder
-        of the stream"""
+        """Return the function that decodeObjectAt() calls to build
+        an object of this type from the contents between start and
+        end of a stream.  Types with a simple value override this
+        to build the object in one step, without running __init__
+        and then decodeContents() over the top of it.  Constructed
+        types decode what they contain with the decoders table of
+        the CodecRegistry building them, or tagDecoders for None."""
 
-        tag = ord(stream[0])
-        n = 1
-        if tag & 0x1F == 0x1F:
+        def decode(stream, start, end):
+            return cls().decodeContents(stream[start:end])
+        return decode
 
-            ## A large tag is encoded using concatenated 7-bit values
-            ## over the following octets, ignoring the initial 5 bits
-            ## in the first octet.  The 8th bit represents a
-            ## follow-on.
+    @classmethod
+    def rawDecoder(cls, decoders=None):
 
-            tag = 0
-            while 1:
-                byte = ord(stream[n])
-                tag = (tag << 7) | (byte & 0x7F)
-                n += 1
-                if not byte & 0x80: break
-                pass
-            pass
+        """Return a function like decoder() that returns the plain
+        Python value of the object: an int, bytes, a tuple of subids
+        or None.  By default it's the value of the decoded object."""
 
+        decode = cls.decoder(decoders)
+
+        def decodeRaw(stream, start, end):
+            return decode(stream, start, end).value
+        return decodeRaw
+
+    def decodeTag(self, stream):
+
+        """Decode a BER tag field, returning the tag and the remainder
+        of the stream"""
+
+        (tag, n) = decodeTagAt(stream, 0)
         return tag, stream[n:]
 
     ##
@@ -128,21 +460,7 @@ class Asn1Object:
         """Decode a BER length field, returing the length and the
         remainder of the stream"""
 
-        length = ord(stream[0])
-        n = 1
-        if length & 0x80:
-
-            ## Multi-Octet length encoding.  The first octet
-            ## represents the run-length (the number of octets used to
-            ## build the length)
-
-            run = length & 0x7F
-            length = 0
-            for i in range(run):
-                length = (length << 8) | ord(stream[n])
-                n += 1
-                pass
-            pass
+        (length, n) = decodeLengthAt(stream, 0)
         return length, stream[n:]
 
     ##
@@ -157,27 +475,11 @@ class Asn1Object:
         of that known object.  Attempts to decode() an unknown object
         type result in an error.  """
 
-        if type(stream) != str:
-            raise TypeError('stream should be of type StringType, not %s' % type(stream))
-
-        objects = []
-        while len(stream) > 0:
-
-            (tag, stream) = self.decodeTag(stream)
-            (length, stream) = self.decodeLength(stream)
-
-            objectData = stream[:length]
-            stream = stream[length:]
-
-            try:
-                decoder = tagDecodeDict[tag]()
-            except KeyError:
-                raise ValueError('Unknown ASN.1 Type %d' % (tag))
-
-            objects.append(decoder.decodeContents(objectData))
-            pass
-
-        return objects
+        stream = octetStream(stream)
+        codec = self.codec
+        if codec is None:
+            return decodeObjects(stream, 0, len(stream))
+        return decodeObjects(stream, 0, len(stream), codec.decoders)
 
     def encodeContents(self):
 
@@ -192,7 +494,7 @@ class Asn1Object:
         this object.  Section 6.3 of ITU-T-X.209 """
 
         if self.asnTagNumber < 0x1F:
-            result = chr(self.asnTagClass | self.asnTagFormat | self.asnTagNumber)
+            result = bytes((self.asnTagClass | self.asnTagFormat | self.asnTagNumber,))
 
         else:
 
@@ -201,17 +503,17 @@ class Asn1Object:
             ## all but the last octet. Bit 8 set to 0 signifies the
             ## last octet of the Identifier octets
 
-            # encode the first octet
-            resultlist = []
-            resultlist.append(chr(self.asnTagClass | self.asnTagFormat | 0x1F))
-
-            # encode each subsequent octet
+            result = bytearray()
             integer = self.asnTagNumber
-            while integer != -1:
-                resultlist.append(chr(integer & 0xFF))
-                integer = integer >> 8
+            result.append(integer & 0x7F)
+            integer >>= 7
+            while integer > 0:
+                result.append(0x80 | (integer & 0x7F))
+                integer >>= 7
                 pass
-            result = ''.join(resultlist)
+            result.append(self.asnTagClass | self.asnTagFormat | 0x1F)
+            result.reverse()
+            result = bytes(result)
             pass
 
         return result
@@ -223,7 +525,7 @@ class Asn1Object:
         ITU-T-X.209 """
 
         if length < 127:
-            result = chr(length & 0xff)
+            result = bytes((length,))
             pass
 
         else:
@@ -234,28 +536,16 @@ class Asn1Object:
             # used to encode the length Each subsequent octet uses all
             # 8 bits to encode the length
 
-            if __debug__: log.debug('Long length encoding required for length of %d' % length)
-
-            resultlist = []
-            numOctets = 0
-            while length > 0:
-                resultlist.insert(0, chr(length & 0xff))
-                length = length >> 8
-                numOctets += 1
-                pass
+            numOctets = (length.bit_length() + 7) // 8
 
             # Add a 1 to the front of the octet
-            if __debug__: log.debug('long length encoding of: %d octets' % numOctets)
-            numOctets = numOctets | 0x80
-            resultlist.insert(0, chr(numOctets & 0xff))
-
-            result = ''.join(resultlist)
+            result = bytes((numOctets | 0x80,)) + length.to_bytes(numOctets, 'big')
             pass
 
         return result
 
     def encodeEndOfContents(self):
-        return '\000\000'
+        return b'\000\000'
 
     ##
     ## 
@@ -288,6 +578,8 @@ class Asn1Object:
 class Integer(Asn1Object):
     """An ASN.1 Integer type"""
 
+    __slots__ = ('value',)
+
     asnTagClass = asnTagClasses['UNIVERSAL']
     asnTagNumber = asnTagNumbers['Integer']
 
@@ -357,198 +649,335 @@ class Integer(Asn1Object):
         """
         return self.value.__hash__()
 
+    def contentsLength(self):
+        return integerLength(self.value)
+
     def encodeContents(self):
+        return encodeIntegerValue(self.value)
 
-        ## We handle two special cases otherwise we handle positive
-        ## and negative numbers independently
+    def decodeContents(self, stream):
+        """ Decode some input octet stream into an ASN.1 integer.
+            Types with a MINVAL of 0 are unsigned.
+        """
+        if self.MINVAL < 0:
+            self.value = decodeIntegerValue(stream)
+        else:
+            self.value = decodeUnsignedValue(stream, self.MAXVAL + 1)
+            pass
 
-        integer = self.value
+        return self
 
-        if integer == 0:
-            return '\000'
+    @classmethod
+    def decoder(cls, decoders=None):
+        new = cls.__new__
+        decodeValue = cls.rawDecoder()
+
+        def decode(stream, start, end):
+            obj = new(cls)
+            obj.value = decodeValue(stream, start, end)
+            return obj
+        return decode
+
+    @classmethod
+    def rawDecoder(cls, decoders=None):
+        if cls.MINVAL < 0:
+            def decodeRaw(stream, start, end):
+                return decodeIntegerValue(stream[start:end])
+        else:
+            modulus = cls.MAXVAL + 1
 
-        elif integer == -1:
-            return '\377'
+            def decodeRaw(stream, start, end):
+                return decodeUnsignedValue(stream[start:end], modulus)
+        return decodeRaw
 
-        elif integer > 0:
-            result = []
-            while integer != 0:
-                result.insert(0, integer & 0xff)
-                integer >>= 8
-                pass
+    ##
+    ##
+    def toObjectID(self):
+        return ObjectID([self.value])
 
-            if result[0] & 0x80:
-                result.insert(0, 0)
-                pass
+    pass
 
-            return ''.join(map(chr, result))
 
-        else:
-            result = []
-            while integer != -1:
-                result.insert(0, integer & 0xff)
-                integer >>= 8
-                pass
+class OctetString(Asn1Object):
+    """An ASN.1 Octet String type"""
 
-            if result[0] & 0x80 != 0x80:
-                result.insert(0, 0)
-                pass
+    __slots__ = ('value',)
 
-            return ''.join(map(chr, result))
+    asnTagClass = asnTagClasses['UNIVERSAL']
+    asnTagNumber = asnTagNumbers['OctetString']
 
-        pass
+    def __init__(self, value=b''):
+        Asn1Object.__init__(self)
+        self.value = toOctets(value)
+        return
 
-    def decodeContents(self, stream):
-        """ Decode some input octet stream into a signed ASN.1 integer
-        """
-        ##
-        ## This method wins because it's consistently the fastest
-        ##
+    def __str__(self):
+        return self.value.decode('latin-1')
 
-        input = list(map(ord, stream))
+    def contentsLength(self):
+        return len(self.value)
 
-        if __debug__: log.debug('Decoding %s' % util.octetsToHex(stream))
+    def encodeContents(self):
+        """An OctetString is already encoded. Whee!"""
 
-        self.value = 0
-        byte = input[0]
-        if (byte & 0x80) == 0x80:
-            negbit = 0x80
-            self.value = byte & 0x7f
+        return self.value
 
-            for i in range(1, len(input)):
-                negbit <<= 8
-                self.value = (self.value << 8) | input[i]
-                pass
+    def decodeContents(self, stream):
+        """An OctetString is already decoded. Whee!  """
 
-            self.value = self.value - negbit
+        self.value = bytes(stream)
+        return self
 
-        else:
-            self.value = int(byte)
-            for i in range(1, len(input)):
-                self.value = (self.value << 8) | input[i]
-                pass
-            pass
+    @classmethod
+    def decoder(cls, decoders=None):
+        new = cls.__new__
 
-        if __debug__: log.debug('decoded as: %d' % self.value)
+        def decode(stream, start, end):
+            obj = new(cls)
+            obj.value = bytes(stream[start:end])
+            return obj
+        return decode
 
-        return self
+    @classmethod
+    def rawDecoder(cls, decoders=None):
+        def decodeRaw(stream, start, end):
+            return bytes(stream[start:end])
+        return decodeRaw
 
-    def decodeTwosInteger1(self, stream):
+    def __hex__(self):
+        return ''.join(['%.2X' % x for x in self.value])
 
-        """ One algorithm for decoding twos complement Integers """
+    def __oct__(self):
+        return ''.join(['%3o' % x for x in self.value])
 
-        ##
-        ## Original pysnmp algorithm
-        ##
-        bytes = list(map(ord, stream))
-        if bytes[0] & 0x80:
-            bytes.insert(0, -1)
-            pass
+    def toObjectID(self):
+        return ObjectID(tuple(self.value))
 
-        result = reduce(lambda x, y: x << 8 | y, bytes, 0)
+    pass
 
-        return result
 
-    def decodeTwosInteger2(self, stream):
+##
+## A poller sees the same few thousand OIDs on every cycle, so the
+## conversions between dotted strings, subids and BER octets go
+## through bounded LRU caches.  setObjectIDCacheSize() resizes them
+## (0 turns caching off) and objectIDCacheInfo() reports hits and
+## misses for sizing.
+##
+OBJECTID_CACHE_SIZE = 4096
 
-        """A second algorithm for decoding twos complement Integers
-        Coded from scratch by jpw """
 
-        val = 0
-        byte = ord(stream[0])
-        if (byte & 0x80) == 0x80:
-            negbit = 0x80
-            val = byte & 0x7f
+def parseSubIDs(value):
+    """ Parse a dotted OID string into a tuple of subids
+    """
+    subids = []
+    for subid in value.strip('.').split('.'):
+        number = int(subid)
+        if number < 0 or number > 0x7FFFFFFF:
+            raise ValueError("SubID out of range")
+        subids.append(number)
+        pass
+    return tuple(subids)
 
-            for i in range(len(stream) - 1):
-                byte = ord(stream[i + 1])
-                negbit <<= 8
-                val = (val << 8) | byte
-                pass
 
-            val = val - negbit
+def encodeSubIDs(subids):
+    """ Encode a tuple of subids as the contents octets of an ObjectID
+    """
+    result = bytearray()
+
+    # Do the bit with the first 2 subids
+    # section 22.4 of X.209
+    subid1 = (subids[0] * 40) + subids[1]
 
+    for subid in (subid1,) + subids[2:]:
+        if subid < 128:
+            result.append(subid)
         else:
-            val = byte
-            for i in range(len(stream) - 1):
-                byte = ord(stream[i + 1])
-                val = (val << 8) | byte
+            position = len(result)
+            result.append(subid & 0x7f)
+
+            subid = subid >> 7
+            while subid > 0:
+                result.insert(position, 0x80 | (subid & 0x7f))
+                subid = subid >> 7
                 pass
             pass
-        return val
+        pass
 
-    def decodeTwosInteger3(self, stream):
+    return bytes(result)
 
-        """ A third algorithm for decoding twos complement Integers
-        Coded from scratch by jpw """
 
-        val = 0
-        bytes = list(map(ord, stream))
+def decodeSubIDs(octets):
+    """ Decode the contents octets of an ObjectID into a tuple of subids
+    """
+    value = []
 
-        if bytes[0] & 0x80:
-            bytes[0] = bytes[0] & 0x7f  # invert bit 8
-            negbit = 0x80
-            for i in bytes:
-                negbit <<= 8
-                val = (val << 8) | i
-                pass
-            val = val - (negbit >> 8)
+    if len(octets) == 0:
+        raise ValueError('stream of zero length in ObjectID')
 
-        else:
-            for i in bytes:
-                val = (val << 8) | i
-                pass
-            pass
+    ##
+    ## Do the funky decode of the first octet
+    ##
+
+    if octets[0] < 128:
+        value.append(int(octets[0] / 40))
+        value.append(int(octets[0] % 40))
+
+    else:
+
+        ## I haven't bothered putting in the convoluted logic here
+        ## because the highest likely assignment for the first
+        ## octet is 83 according to Annex B of X.208 Those X.209
+        ## does give as an example 2.100.3, which is kinda stupid.
+        ## Actually, a lot of the space-saving encodings, like
+        ## this first octet, are a real PITA later on.  So yeah,
+        ## stuff it, we'll just raise an exception.
 
-        return val
+        raise NotImplementedError('First octet is > 128! Unsupported oid detected')
 
     ##
+    ## Decode the rest of the octets
     ##
-    def toObjectID(self):
-        return ObjectID([self.value])
 
-    pass
+    n = 1
 
+    while n < len(octets):
+        subid = octets[n]
+        n += 1
+        ##
+        ## If bit 8 is not set, this is the last octet of this subid
+        ## If bit 8 is set, the subid spans this octet and the ones
+        ## afterwards, up until bit 8 isn't set.
+        ##
+        if subid & 0x80 == 0x80:
+            val = subid & 0x7f
+            while (subid & 0x80) == 0x80:
+                subid = octets[n]
+                n += 1
+                val = (val << 7) | (subid & 0x7f)
+                pass
+            value.append(val)
+        else:
+            value.append(subid)
+            pass
+        pass
 
-class OctetString(Asn1Object):
-    """An ASN.1 Octet String type"""
+    return tuple(value)
 
-    asnTagClass = asnTagClasses['UNIVERSAL']
-    asnTagNumber = asnTagNumbers['OctetString']
 
-    def __init__(self, value=''):
-        Asn1Object.__init__(self)
-        self.value = copy.copy(value)
-        return
+def setObjectIDCacheSize(size=OBJECTID_CACHE_SIZE):
+    """ Replace the ObjectID caches with empty ones holding up to
+        size entries each
+    """
+    global cachedParseSubIDs, cachedEncodeSubIDs, cachedDecodeSubIDs
 
-    def __str__(self):
-        return self.value
+    cache = lru_cache(maxsize=size)
+    cachedParseSubIDs = cache(parseSubIDs)
+    cachedEncodeSubIDs = cache(encodeSubIDs)
+    cachedDecodeSubIDs = cache(decodeSubIDs)
+    return
 
-    def encodeContents(self):
-        """An OctetString is already encoded. Whee!"""
 
-        return self.value
+def objectIDCacheInfo():
+    """ Return the hits, misses, maxsize and currsize of each
+        ObjectID cache, keyed by 'parse', 'encode' and 'decode'
+    """
+    return {
+        'parse': cachedParseSubIDs.cache_info(),
+        'encode': cachedEncodeSubIDs.cache_info(),
+        'decode': cachedDecodeSubIDs.cache_info(),
+    }
 
-    def decodeContents(self, stream):
-        """An OctetString is already decoded. Whee!  """
 
-        self.value = stream
-        return self
+setObjectIDCacheSize()
 
-    def __hex__(self):
-        return ''.join(['%.2X' % ord(x) for x in self.value])
 
-    def __oct__(self):
-        return ''.join(['%3o' % ord(x) for x in self.value])
+##
+## ObjectIDs compared in their encoded form, the contents octets,
+## so a walk can tell where it is without decoding every name.  The
+## subids are encoded base 128, most significant group first, with
+## bit 8 set on all but the last octet of each, so an encoded OID
+## starts with the encoding of any OID that is a prefix of it, and
+## only OIDs that are a prefix of it.
+##
 
-    def toObjectID(self):
-        return ObjectID([ord(x) for x in self.value])
+def isEncodedPrefix(prefix, octets):
+    """Return True if the encoded ObjectID prefix is a prefix of the
+    encoded ObjectID octets, or the same as it"""
 
-    pass
+    return octets[:len(prefix)] == prefix
+
+
+def compareEncodedOIDs(a, b):
+    """Compare two encoded ObjectIDs, returning -1, 0 or 1 as a sorts
+    before, the same as or after b, the order of their subids.
+
+    Comparing the octets themselves isn't enough, as a subid with a
+    longer encoding is always the larger, whatever its first octet.
+    So the comparison looks for the first octet that differs, then
+    compares the lengths of the subids it falls in before the octets."""
+
+    lengthA = len(a)
+    lengthB = len(b)
+    length = min(lengthA, lengthB)
+    if a[:length] == b[:length]:
+        return (lengthA > lengthB) - (lengthA < lengthB)
+
+    ## Home in on the first difference, halving the range that holds
+    ## it with each comparison of slices
+    low = 0
+    high = length
+    while high - low > 1:
+        middle = (low + high) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle
+            pass
+        pass
+
+    ## Back up to the first octet of the subid the difference is in
+    start = low
+    while start and a[start - 1] & 0x80:
+        start -= 1
+        pass
+
+    endA = encodedSubIDEnd(a, start)
+    endB = encodedSubIDEnd(b, start)
+    if endA != endB:
+        return -1 if endA < endB else 1
+    return -1 if a[low] < b[low] else 1
+
+
+def encodedSubIDEnd(octets, pos):
+    """Return the position after the last octet of the subid
+    encoded at pos"""
+
+    end = len(octets)
+    while pos < end and octets[pos] & 0x80:
+        pos += 1
+        pass
+    if pos == end:
+        raise ValueError('Truncated ObjectID subid')
+    return pos + 1
+
+
+def isPastSubtree(root, octets):
+    """Return True if the encoded ObjectID octets sorts after every
+    ObjectID beneath the encoded root, which is where a walk of root
+    ends"""
+
+    return not isEncodedPrefix(root, octets) and compareEncodedOIDs(octets, root) > 0
 
 
 class ObjectID(Asn1Object):
-    """An ASN.1 Object Identifier type """
+    """An ASN.1 Object Identifier type
+
+    ObjectIDs are immutable.  The subids are held in a tuple, so an
+    ObjectID can be hashed, used as a dict key and sorted.  An
+    ObjectID made from another shares its tuple of subids, where a
+    slice copies the subids it takes into a new one."""
+
+    __slots__ = ('value', '_hash')
 
     asnTagClass = asnTagClasses['UNIVERSAL']
     asnTagFormat = asnTagFormats['PRIMITIVE']
@@ -560,32 +989,26 @@ class ObjectID(Asn1Object):
         or list"""
 
         Asn1Object.__init__(self)
+        self._hash = None
 
-        if type(value) == str:
+        if type(value) == tuple:
+            self.value = value
 
-            value = value.strip('.')
-            subidlist = value.split('.')
-            self.value = []
+        elif type(value) == str:
+            self.value = cachedParseSubIDs(value)
 
-            for subid in subidlist:
-                number = int(subid)
-                if number < 0 or number > 0x7FFFFFFF:
-                    raise ValueError("SubID out of range")
-                self.value.append(number)
-                pass
-            pass
-
-        elif type(value) == list or value is None:
-            self.value = copy.copy(value)
+        elif type(value) == list:
+            self.value = tuple(value)
 
-        elif type(value) == tuple:
-            self.value = list(value)
+        elif value is None:
+            self.value = ()
 
         elif type(value) == int:
-            self.value = [value]
+            self.value = (value,)
 
         elif isinstance(value, ObjectID):
-            self.value = value.value[:]
+            self.value = value.value
+            self._hash = value._hash
 
         else:
             raise TypeError('unknown type passed as OID')
@@ -594,102 +1017,109 @@ class ObjectID(Asn1Object):
 
     def __str__(self):
 
-        if self.value is not None:
+        if self.value:
             # Prepend a leading '.' to the OID string
             return '.' + '.'.join([str(x) for x in self.value])
         else:
             return ''
         pass
 
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, str(self))
+
     def __len__(self):
 
         """Return the length of the value field"""
 
-        if self.value is None:
-            return 0
-        else:
-            return len(self.value)
-        pass
+        return len(self.value)
+
+    def __iter__(self):
+        return iter(self.value)
 
     def __getitem__(self, key):
-        if isinstance(key, int):
-            return self.value.__getitem__(key)
-        else:
-            return ObjectID(self.value.__getitem__(key))
-        pass
+        if isinstance(key, slice):
+            return self.__class__(self.value[key])
+        return self.value[key]
 
-    def __delitem__(self, key):
-        self.value.__delitem__(key)
-        return
+    def __add__(self, other):
+
+        """Return a new ObjectID with the subids of other, which
+        may be an ObjectID, tuple, list or a single subid, appended"""
+
+        if isinstance(other, ObjectID):
+            return self.__class__(self.value + other.value)
+        elif type(other) == int:
+            return self.__class__(self.value + (other,))
+        elif type(other) in (tuple, list):
+            return self.__class__(self.value + tuple(other))
+        return NotImplemented
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = hash(self.value)
+            pass
+        return self._hash
+
+    ##
+    ## ObjectIDs are ordered lexicographically by subid, so a prefix
+    ## sorts before everything beneath it, as in a getNext walk.
+    ##
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, ObjectID):
+            return False
+        return self.value == other.value
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __lt__(self, other):
+        if not isinstance(other, ObjectID):
+            return NotImplemented
+        return self.value < other.value
+
+    def __le__(self, other):
+        if not isinstance(other, ObjectID):
+            return NotImplemented
+        return self.value <= other.value
+
+    def __gt__(self, other):
+        if not isinstance(other, ObjectID):
+            return NotImplemented
+        return self.value > other.value
+
+    def __ge__(self, other):
+        if not isinstance(other, ObjectID):
+            return NotImplemented
+        return self.value >= other.value
 
     def copy(self):
         """
         Return a copy of this object as a new object
         """
-        return ObjectID(self.value)
-
-    def append(self, subid):
-        if type(subid) == int:
-            self.value.append(subid)
-        else:
-            raise TypeError
-        return
-
-    def extend(self, other):
-        if isinstance(other, self.__class__):
-            self.value.extend(other.value)
-        else:
-            self.value.extend(other)
-            pass
-        return None
+        return self.__class__(self)
 
     def isPrefixOf(self, other):
 
         """
         Compares this ObjectID with another ObjectID and returns
-        non-None if this ObjectID is a prefix of the other one.
+        True if this ObjectID is a prefix of the other one.
         """
 
-        if not isinstance(other, self.__class__):
+        if not isinstance(other, ObjectID):
             raise TypeError('Attempt to compare ObjectID with non-ObjectID: %s' % other.__repr__())
-        if len(other) < len(self):
-            return False
-        for i in range(len(self)):
-            if self.value[i] != other.value[i]:
-                return False
-            pass
-        return True
+        length = len(self.value)
+        return len(other.value) >= length and other.value[:length] == self.value
+
+    def contentsLength(self):
+        return len(cachedEncodeSubIDs(self.value))
 
     def encodeContents(self):
 
         """encode() an objectID into an octet stream """
 
-        result = []
-        idlist = self.value[:]
-
-        # Do the bit with the first 2 subids
-        # section 22.4 of X.209
-        idlist.reverse()
-        subid1 = (idlist.pop() * 40) + idlist.pop()
-        idlist.reverse()
-        idlist.insert(0, subid1)
-
-        for subid in idlist:
-            if subid < 128:
-                result.append(chr(subid & 0x7f))
-            else:
-                position = len(result)
-                result.append(chr(subid & 0x7f))
-
-                subid = subid >> 7
-                while subid > 0:
-                    result.insert(position, chr(0x80 | (subid & 0x7f)))
-                    subid = subid >> 7
-                    pass
-                pass
-            pass
-
-        return ''.join(result)
+        return cachedEncodeSubIDs(self.value)
 
     ##
     ##
@@ -697,64 +1127,36 @@ class ObjectID(Asn1Object):
 
         """decode() a stream into an ObjectID()"""
 
-        self.value = []
-
-        bytes = list(map(ord, stream))
-
         if len(stream) == 0:
             raise ValueError('stream of zero length in %s' % self.__class__.__name__)
 
-        ##
-        ## Do the funky decode of the first octet
-        ##
-
-        if bytes[0] < 128:
-            self.value.append(int(bytes[0] / 40))
-            self.value.append(int(bytes[0] % 40))
-
-        else:
-
-            ## I haven't bothered putting in the convoluted logic here
-            ## because the highest likely assignment for the first
-            ## octet is 83 according to Annex B of X.208 Those X.209
-            ## does give as an example 2.100.3, which is kinda stupid.
-            ## Actually, a lot of the space-saving encodings, like
-            ## this first octet, are a real PITA later on.  So yeah,
-            ## stuff it, we'll just raise an exception.
-
-            raise NotImplementedError('First octet is > 128! Unsupported oid detected')
-
-        ##
-        ## Decode the rest of the octets
-        ##
-
-        n = 1
-
-        while n < len(bytes):
-            subid = bytes[n]
-            n += 1
-            ##
-            ## If bit 8 is not set, this is the last octet of this subid
-            ## If bit 8 is set, the subid spans this octet and the ones
-            ## afterwards, up until bit 8 isn't set.
-            ##
-            if subid & 0x80 == 0x80:
-                val = subid & 0x7f
-                while (subid & 0x80) == 0x80:
-                    subid = bytes[n]
-                    n += 1
-                    val = (val << 7) | (subid & 0x7f)
-                    pass
-                self.value.append(val)
-            else:
-                self.value.append(subid)
-                pass
-            pass
-
+        self.value = cachedDecodeSubIDs(bytes(stream))
+        self._hash = None
         return self
 
+    @classmethod
+    def decoder(cls, decoders=None):
+        new = cls.__new__
+
+        def decode(stream, start, end):
+            if start == end:
+                raise ValueError('stream of zero length in %s' % cls.__name__)
+            obj = new(cls)
+            obj.value = cachedDecodeSubIDs(bytes(stream[start:end]))
+            obj._hash = None
+            return obj
+        return decode
+
+    @classmethod
+    def rawDecoder(cls, decoders=None):
+        def decodeRaw(stream, start, end):
+            if start == end:
+                raise ValueError('stream of zero length in %s' % cls.__name__)
+            return cachedDecodeSubIDs(bytes(stream[start:end]))
+        return decodeRaw
+
     def toObjectID(self):
-        return ObjectID(copy.copy(self.value))
+        return self
 
     pass
 
@@ -762,6 +1164,8 @@ class ObjectID(Asn1Object):
 class Null(Asn1Object):
     """An ASN.1 Object Identifier type"""
 
+    __slots__ = ()
+
     asnTagClass = asnTagClasses['UNIVERSAL']
     asnTagFormat = asnTagFormats['PRIMITIVE']
     asnTagNumber = asnTagNumbers['Null']
@@ -769,14 +1173,35 @@ class Null(Asn1Object):
     def __str__(self):
         return '<Null>'
 
+    def contentsLength(self):
+        return 0
+
     def encodeContents(self):
-        return ''
+        return b''
 
     def decodeContents(self, stream):
         if len(stream) != 0:
             raise ValueError('Input stream too long for %s' % self.__class__.__name__)
         return self
 
+    @classmethod
+    def decoder(cls, decoders=None):
+        new = cls.__new__
+
+        def decode(stream, start, end):
+            if start != end:
+                raise ValueError('Input stream too long for %s' % cls.__name__)
+            return new(cls)
+        return decode
+
+    @classmethod
+    def rawDecoder(cls, decoders=None):
+        def decodeRaw(stream, start, end):
+            if start != end:
+                raise ValueError('Input stream too long for %s' % cls.__name__)
+            return None
+        return decodeRaw
+
     pass
 
 
@@ -787,12 +1212,12 @@ class Sequence(Asn1Object):
     name being an object Type and the value being an instance of an
     Asn1Object of that Type."""
 
+    __slots__ = ('value',)
+
     asnTagClass = asnTagClasses['UNIVERSAL']
     asnTagFormat = asnTagFormats['CONSTRUCTED']
     asnTagNumber = asnTagNumbers['Sequence']
 
-    value = []
-
     def __init__(self, value=None):
         Asn1Object.__init__(self)
         if value is None:
@@ -829,15 +1254,68 @@ class Sequence(Asn1Object):
         """ To encode a Sequence, we simply encode() each sub-object
         in turn."""
 
-        if __debug__: log.debug('Encoding sequence contents...')
-        resultlist = []
+        plan = []
+        buf = bytearray(self.measureContents(plan))
+        self.encodeContentsInto(buf, 0, iter(plan))
+        return bytes(buf)
+
+    def contentsLength(self):
+        length = 0
         for elem in self.value:
-            resultlist.append(elem.encode() if type(elem) is not str else elem)
+            if isinstance(elem, (bytes, bytearray, memoryview)):
+                length += len(elem)
+            else:
+                length += elem.encodedLength()
+                pass
             pass
+        return length
 
-        result = ''.join(resultlist)
+    def measure(self, plan):
 
-        return result
+        """Record the contents length of this Sequence in the plan
+        ahead of the entries for its sub-objects, which is the order
+        encodeInto() needs them in."""
+
+        index = len(plan)
+        plan.append(0)
+        length = self.measureContents(plan)
+        plan[index] = length
+        return self.headerLength(length) + length
+
+    def measureContents(self, plan):
+
+        """Add each sub-object to the plan, returning their total
+        encoded length.  An element that is already a bytes-like
+        object is taken to be encoded already and is copied in as it
+        is."""
+
+        length = 0
+        for elem in self.value:
+            if isinstance(elem, (bytes, bytearray, memoryview)):
+                plan.append(elem)
+                length += len(elem)
+            else:
+                length += elem.measure(plan)
+                pass
+            pass
+        return length
+
+    def encodeInto(self, buf, pos, plan):
+        pos = self.encodeHeaderInto(buf, pos, next(plan))
+        return self.encodeContentsInto(buf, pos, plan)
+
+    def encodeContentsInto(self, buf, pos, plan):
+        for elem in self.value:
+            if isinstance(elem, (bytes, bytearray, memoryview)):
+                elem = next(plan)
+                end = pos + len(elem)
+                buf[pos:end] = elem
+                pos = end
+            else:
+                pos = elem.encodeInto(buf, pos, plan)
+                pass
+            pass
+        return pos
 
     def decodeContents(self, stream):
 
@@ -849,6 +1327,22 @@ class Sequence(Asn1Object):
         # return Sequence(objectList)
         return self
 
+    @classmethod
+    def decoder(cls, decoders=None):
+
+        ## Subclasses that build themselves in decodeContents(), such
+        ## as the PDUs, keep doing so
+        if cls.decodeContents is not Sequence.decodeContents:
+            return Asn1Object.decoder.__func__(cls, decoders)
+
+        new = cls.__new__
+
+        def decode(stream, start, end):
+            obj = new(cls)
+            obj.value = decodeObjects(stream, start, end, decoders)
+            return obj
+        return decode
+
     pass
 
 
@@ -857,6 +1351,8 @@ class SequenceOf(Sequence):
     constraint on the kind of objects it can contain.  It is variable
     in length."""
 
+    __slots__ = ('componentType',)
+
     asnTagClass = asnTagClasses['UNIVERSAL']
     asnTagFormat = asnTagFormats['CONSTRUCTED']
     asnTagNumber = asnTagNumbers['Sequence']
@@ -891,30 +1387,27 @@ class IPAddress(OctetString):
     32-bit internet address as an OctetString of length 4, in network
     byte order.  """
 
+    __slots__ = ()
+
     asnTagClass = asnTagClasses['APPLICATION']
     asnTagFormat = asnTagFormats['PRIMITIVE']
     asnTagNumber = asnTagNumbers['IPAddress']
 
     def __init__(self, value=None):
-        OctetString.__init__(self, value)
+        OctetString.__init__(self)
 
         if type(value) == str:
-            self.value = ''
             listform = value.split('.')
 
             if len(listform) != 4:
                 raise ValueError('IPAddress must be of length 4')
 
-            for item in listform:
-                self.value += chr(int(item))
-                pass
+            self.value = bytes([int(item) for item in listform])
             pass
-        elif type(value) == list:
+        elif type(value) in (list, tuple, bytes, bytearray):
             if len(value) != 4:
                 raise ValueError('IPAddress must be of length 4')
-            pass
-        else:
-            self.value = ''
+            self.value = bytes(value)
             pass
         return
 
@@ -922,20 +1415,20 @@ class IPAddress(OctetString):
 
         """An IPAddress is already decoded. Whee!"""
 
-        self.value = stream
+        self.value = bytes(stream)
         return self
 
     def __str__(self):
         result = []
         for item in self.value:
-            result.append('%d' % ord(item))
+            result.append('%d' % item)
             pass
         return '.'.join(result)
 
     ##
     ##
     def toObjectID(self):
-        return ObjectID([ord(x) for x in self.value])
+        return ObjectID(tuple(self.value))
 
     pass
 
@@ -945,6 +1438,8 @@ class NetworkAddress(IPAddress):
         internet
     """
 
+    __slots__ = ()
+
     name = 'internet'
     pass
 
@@ -954,6 +1449,8 @@ class Counter(Integer):
         value of 2^32-1 where it wraps back to zero.
     """
 
+    __slots__ = ()
+
     asnTagClass = asnTagClasses['APPLICATION']
     asnTagFormat = asnTagFormats['PRIMITIVE']
     asnTagNumber = asnTagNumbers['Counter']
@@ -967,28 +1464,22 @@ class Counter(Integer):
             condition.
         """
 
-        if self.value + val > self.MAXVAL:
-            self.value = val - (self.MAXVAL - self.value)
-        else:
-            self.value += val
-            pass
-        return
+        self.value = (self.value + int(val)) % (self.MAXVAL + 1)
+        return self
 
-    def decodeContents(self, stream):
+    def delta(self, previous):
 
-        result = Integer.decodeContents(self, stream)
+        """ Return how far the counter has moved on since an earlier
+            reading of it, allowing for it having wrapped once.
+        """
 
-        ## Some agents encode Counters incorrectly (hello Solaris) as
-        ## a negative number.  I'm assuming most SNMP libraries don't
-        ## notice the problem because the are written in C and cast
-        ## the result to an unsigned int - problem solved (if
-        ## accidentally).  This ugly hack on their behalf flips the
-        ## value over to the positive world.
+        return (self.value - int(previous)) % (self.MAXVAL + 1)
 
-        if self.value < 0:
-            self.value += 0x100000000
-            pass
-        return self
+    def contentsLength(self):
+        return self.value.bit_length() // 8 + 1
+
+    def encodeContents(self):
+        return encodeUnsignedValue(self.value)
 
     pass
 
@@ -998,6 +1489,8 @@ class Guage(Integer):
         decrease. It latches at a maximum value.
     """
 
+    __slots__ = ()
+
     asnTagClass = asnTagClasses['APPLICATION']
     asnTagFormat = asnTagFormats['PRIMITIVE']
     asnTagNumber = asnTagNumbers['Guage']
@@ -1035,6 +1528,8 @@ class TimeTicks(Integer):
         epoch, specified at object creation time
     """
 
+    __slots__ = ('epoch',)
+
     asnTagClass = asnTagClasses['APPLICATION']
     asnTagFormat = asnTagFormats['PRIMITIVE']
     asnTagNumber = asnTagNumbers['TimeTicks']
@@ -1042,15 +1537,24 @@ class TimeTicks(Integer):
     MINVAL = 0
     MAXVAL = 4294967295
 
-    epoch = None
-
     def __init__(self, value=0, epoch=None):
         Integer.__init__(self, value)
-        if epoch:
-            self.epoch = epoch
-            pass
+        self.epoch = epoch
         return
 
+    @classmethod
+    def decoder(cls, decoders=None):
+        new = cls.__new__
+
+        decodeValue = cls.rawDecoder()
+
+        def decode(stream, start, end):
+            obj = new(cls)
+            obj.value = decodeValue(stream, start, end)
+            obj.epoch = None
+            return obj
+        return decode
+
     pass
 
     def _todo__str__(self):
@@ -1069,9 +1573,107 @@ class Opaque(OctetString):
     do any decoding of this object because we don't have to, and that
     makes this all much quicker.  """
 
+    __slots__ = ()
+
     pass
 
 
+class BatchEncoder:
+    """Encodes many objects, usually Messages, into one scratch
+    buffer that is kept from one batch to the next.  Not thread safe:
+    give each thread its own."""
+
+    ## Smallest scratch buffer to allocate
+    MIN_SIZE = 65536
+
+    def __init__(self, size=MIN_SIZE):
+        self.buf = bytearray(size)
+        self.plan = []
+        return
+
+    def acquire(self):
+        """Return the scratch buffer for a new batch.  The one from
+        the last batch is reused unless memoryviews of it are still
+        alive, since writing over it would change octets under
+        whoever holds them."""
+
+        buf = self.buf
+        try:
+            ## A bytearray can't change size while it has views
+            buf.append(0)
+            del buf[-1]
+        except BufferError:
+            buf = self.buf = bytearray(len(buf))
+            pass
+        return buf
+
+    def encodeMany(self, objects):
+        """Encode every object in objects, returning a memoryview of
+        the encoding of each, in order.  Items that are already bytes,
+        such as a rendered RequestTemplate, are copied in as they
+        are.  The views stay valid for as long as they are held."""
+
+        (buf, ends) = self.encodeEnds(objects)
+        view = memoryview(buf)
+        views = []
+        pos = 0
+        for end in ends:
+            views.append(view[pos:end])
+            pos = end
+            pass
+        return views
+
+    def encodeEnds(self, objects):
+        """As encodeMany(), but return the scratch buffer and the
+        offset of the end of each encoding in it.  A memoryview costs
+        more than a short request, so a sender that only needs each
+        encoding for as long as it takes to send it can slice them out
+        one at a time.  The buffer is only good until the next batch."""
+
+        buf = self.acquire()
+        plan = self.plan
+        ends = []
+        pos = 0
+        try:
+            for obj in objects:
+                if isinstance(obj, (bytes, bytearray, memoryview)):
+                    end = pos + len(obj)
+                    if end > len(buf):
+                        buf.extend(bytes(max(end, 2 * len(buf)) - len(buf)))
+                        pass
+                    buf[pos:end] = obj
+                else:
+                    ## The two passes of encode(), straight into the
+                    ## buffer, which grows if the batch outgrows it
+                    end = pos + obj.measure(plan)
+                    if end > len(buf):
+                        buf.extend(bytes(max(end, 2 * len(buf)) - len(buf)))
+                        pass
+                    obj.encodeInto(buf, pos, iter(plan))
+                    del plan[:]
+                    pass
+                ends.append(end)
+                pos = end
+                pass
+        finally:
+            del plan[:]
+            pass
+        return buf, ends
+
+    pass
+
+
+def encodeMany(objects, encoder=None):
+    """Encode a batch of objects into one buffer, returning a
+    memoryview of each encoding.  Without an encoder, a fresh
+    BatchEncoder is used, so nothing is shared between calls."""
+
+    if encoder is None:
+        encoder = BatchEncoder(0)
+        pass
+    return encoder.encodeMany(objects)
+
+
 class DecodeError(Exception):
     def __init__(self, args=None):
         self.args = args
@@ -1080,10 +1682,80 @@ class DecodeError(Exception):
     pass
 
 
-##
-## Lookup table for object decoding
-##
-tagDecodeDict = {
+## Every CodecRegistry, so the instrument module can rebuild their
+## decode functions when it's turned on or off
+codecRegistries = weakref.WeakSet()
+
+
+class CodecRegistry:
+    """The types a version of SNMP decodes each identifier octet
+    into, with the decode function of each, built once.
+
+    SNMPv1 and SNMPv2c give some identifier octets different types:
+    0x02 is an Integer or an Integer32, 0xa2 a v1 or a v2 Response.
+    Each version has its own registry, so what a message decodes
+    into depends on its version, and not on which modules happen to
+    have been imported.  A registry isn't changed once built;
+    derive() makes a new one with some types replaced."""
+
+    def __init__(self, name, types):
+        self.name = name
+        self.types = MappingProxyType(dict(types))
+        self.build()
+        codecRegistries.add(self)
+        return
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.name)
+
+    def build(self):
+        """Build the decode functions.  Constructed types are handed
+        the table they're being added to, so what they contain is
+        decoded with the same registry."""
+
+        decoders = {}
+        rawDecoders = {}
+        for (tag, cls) in self.types.items():
+            decode = cls.decoder(decoders)
+            decodeRaw = cls.rawDecoder(decoders)
+            if decoderHook is not None:
+                decode = decoderHook(tag, cls, decode)
+                decodeRaw = decoderHook(tag, cls, decodeRaw, raw=True)
+                pass
+            decoders[tag] = decode
+            rawDecoders[tag] = decodeRaw
+            pass
+
+        ## Plain dicts, as decoding looks a function up in them for
+        ## every object.  Don't change them, derive() a new registry.
+        self.decoders = decoders
+        self.rawDecoders = rawDecoders
+        return
+
+    def derive(self, name, types):
+        """Return a new registry with the types of this one, plus or
+        replaced by types"""
+
+        merged = dict(self.types)
+        merged.update(types)
+        return self.__class__(name, merged)
+
+    def decodeObjectAt(self, stream, pos, end):
+        return decodeObjectAt(stream, pos, end, self.decoders)
+
+    def decode(self, stream):
+        """Decode an octet stream into a list of Asn1Objects, as
+        Asn1Object.decode() does with tagDecodeDict"""
+
+        stream = octetStream(stream)
+        return decodeObjects(stream, 0, len(stream), self.decoders)
+
+    pass
+
+
+## The SNMPv1 SMI types.  rfc1902 derives the SNMPv2 SMI from it, and
+## rfc1157 and rfc1905 add the PDUs of each version.
+codec = CodecRegistry('SMIv1', {
 
     0x02: Integer,
     0x04: OctetString,
@@ -1099,4 +1771,21 @@ tagDecodeDict = {
     0x43: TimeTicks,
     0x44: Opaque,
 
-}
+})
+
+##
+## Lookup table for object decoding by Asn1Object.decode(), which
+## starts out as the SNMPv1 SMI types.  Nothing in libsnmp changes it:
+## messages decode with the registry of their version.
+##
+tagDecodeDict = dict(codec.types)
+
+##
+## The decode function for each identifier octet.  Use
+## registerDecoder() to change what a tag decodes into, so these
+## stay in step with tagDecodeDict.
+##
+tagDecoders = dict((tag, cls.decoder()) for (tag, cls) in tagDecodeDict.items())
+
+## The same, for functions that return plain Python values
+tagRawDecoders = dict((tag, cls.rawDecoder()) for (tag, cls) in tagDecodeDict.items())
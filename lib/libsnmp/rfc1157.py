@@ -8,18 +8,19 @@ import logging
 
 log = logging.getLogger('rfc1157')
 
+from . import rfc1155
 from .rfc1155 import *
 
-asnTagNumbers['Get'] = 0x00
-asnTagNumbers['GetNext'] = 0x01
-asnTagNumbers['Response'] = 0x02
-asnTagNumbers['Set'] = 0x03
-asnTagNumbers['Trap'] = 0x04
+# The PDU tag numbers, added to a copy of the rfc1155 numbers so that
+# importing this module leaves those alone
+asnTagNumbers = dict(asnTagNumbers, Get=0x00, GetNext=0x01, Response=0x02, Set=0x03, Trap=0x04)
 
 
 class ErrorStatus(Integer):
     """ Error Status
     """
+    __slots__ = ()
+
     # define a dictionary of error codes
     errString = {
         0: 'No Error',
@@ -59,6 +60,7 @@ class VarBind(Sequence):
     """ Variable Binding
         This binds a name to an object
     """
+    __slots__ = ()
 
     def __init__(self, name=None, value=None):
         if name:
@@ -68,14 +70,32 @@ class VarBind(Sequence):
             if not isinstance(value, Asn1Object):
                 raise ValueError('name must be an Asn1Object')
 
-        self.objectID = name
-        self.objectValue = value
-        Sequence.__init__(self, [self.objectID, self.objectValue])
+        Sequence.__init__(self, (name, value))
+
+    ## The name and value are only held in the Sequence value, a
+    ## tuple, so a VarBind costs no more than the pair itself.
+
+    def getObjectID(self):
+        return self.value[0]
+
+    def setObjectID(self, name):
+        self.value = (name, self.value[1])
+
+    objectID = property(getObjectID, setObjectID)
+
+    def getObjectValue(self):
+        return self.value[1]
+
+    def setObjectValue(self, value):
+        self.value = (self.value[0], value)
+
+    objectValue = property(getObjectValue, setObjectValue)
 
 
 class VarBindList(SequenceOf):
     """ A Sequence of VarBinds
     """
+    __slots__ = ()
 
     def __init__(self, value=[]):
         SequenceOf.__init__(self, VarBind, value)
@@ -84,6 +104,82 @@ class VarBindList(SequenceOf):
     pass
 
 
+class LazyVarBindList(VarBindList):
+    """ A VarBindList that keeps the encoded varbinds of a received
+        message and only decodes each VarBind the first time it is
+        accessed. Callbacks that only look at the PDU header fields,
+        or the first varbind, don't pay to decode the rest.
+    """
+
+    def __init__(self, stream, start, end, decoders=None):
+        self.componentType = VarBind
+        self.stream = stream
+        self.start = start
+        self.end = end
+        self.decoders = decoders or Message.codec.decoders
+
+        # Positions of each encoded VarBind, found on first access
+        self.offsets = None
+        self.items = None
+
+    def scan(self):
+        """ Find where each VarBind starts and ends, skipping over the
+            contents without decoding them
+        """
+        offsets = list(iterVarBindOffsets(self.stream, self.start, self.end))
+
+        self.offsets = offsets
+        self.items = [None] * len(offsets)
+
+    def decodeItem(self, index):
+        (name, value) = decodeVarBindOffsets(self.stream, self.offsets[index], self.decoders)
+
+        varbind = VarBind(name, value)
+        self.items[index] = varbind
+        return varbind
+
+    def getValue(self):
+        """ Decode everything, for callers that want the whole list
+        """
+        if self.items is None:
+            self.scan()
+
+        items = self.items
+        for index in range(len(items)):
+            if items[index] is None:
+                self.decodeItem(index)
+        return items
+
+    def setValue(self, value):
+        self.items = value
+        self.offsets = None
+
+    value = property(getValue, setValue)
+
+    def __len__(self):
+        if self.items is None:
+            self.scan()
+        return len(self.items)
+
+    def __getitem__(self, index):
+        if self.items is None:
+            self.scan()
+
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self.items)))]
+
+        varbind = self.items[index]
+        if varbind is None:
+            if index < 0:
+                index += len(self.items)
+            varbind = self.decodeItem(index)
+        return varbind
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
 class Message(Sequence):
     """ A Message is the base comms type for all SNMP messages
     """
@@ -100,15 +196,28 @@ class Message(Sequence):
         result += '%s]' % self.data
         return result
 
-    def encodeContents(self):
+    def measureContents(self, plan):
         self.value = []
         self.value.append(self.version)
         self.value.append(self.community)
         self.value.append(self.data)
-        return Sequence.encodeContents(self)
+        return Sequence.measureContents(self, plan)
+
+    def contentsLength(self):
+        self.value = [self.version, self.community, self.data]
+        return Sequence.contentsLength(self)
+
+    def decode(self, stream, lazy=False):
+        """ Decode a message from stream.
+            If lazy is True, only the message and PDU header fields
+            are decoded now, and the varBindList of a PDU is a
+            LazyVarBindList that decodes each VarBind when it is
+            first accessed.
+        """
+        if lazy:
+            return self.decodeLazy(stream)
 
-    def decode(self, stream):
-        objectList = Sequence().decode(stream)
+        objectList = self.codec.decode(stream)
 
         # Should return a single Sequence
         if len(objectList) != 1:
@@ -124,6 +233,313 @@ class Message(Sequence):
 
         return self
 
+    def decodeLazy(self, stream):
+        # The varbinds are decoded from the stream later on, so hold
+        # on to an immutable copy of it
+        if type(stream) is not bytes:
+            stream = bytes(octetStream(stream))
+        stream = memoryview(stream)
+
+        (tag, pos, end) = decodeHeaderAt(stream, 0, len(stream))
+        if tag != 0x30 or end != len(stream):
+            raise MessageError('Malformed Message: not a single Sequence')
+
+        codec = self.codec
+        decoders = codec.decoders
+        (self.version, pos) = decodeObjectAt(stream, pos, end, decoders)
+        (self.community, pos) = decodeObjectAt(stream, pos, end, decoders)
+
+        (tag, start, pduEnd) = decodeHeaderAt(stream, pos, end)
+        if pduEnd != end:
+            raise MessageError('Malformed Message: Incorrect sequence length')
+
+        try:
+            pduClass = codec.types[tag]
+        except KeyError:
+            raise ValueError('Unknown ASN.1 Type %d' % (tag))
+
+        if not issubclass(pduClass, PDU):
+            # Only the common PDU layout is decoded lazily
+            self.data = decoders[tag](stream, start, pduEnd)
+            return self
+
+        (requestID, pos) = decodeObjectAt(stream, start, pduEnd, decoders)
+        (errorStatus, pos) = decodeObjectAt(stream, pos, pduEnd, decoders)
+        (errorIndex, pos) = decodeObjectAt(stream, pos, pduEnd, decoders)
+
+        (tag, start, end) = decodeHeaderAt(stream, pos, pduEnd)
+        if tag != 0x30 or end != pduEnd:
+            raise PDUError('Malformed PDU: Incorrect length')
+
+        pdu = pduClass(int(requestID), int(errorStatus), int(errorIndex))
+        pdu.varBindList = LazyVarBindList(stream, start, end, decoders)
+        pdu.value[3] = pdu.varBindList
+
+        self.data = pdu
+        return self
+
+    def decodeRaw(self, stream):
+        """ Decode only the varbinds of a message from stream, as a
+            list of (subids, value, tag) tuples.  No Asn1Objects are
+            built: subids is a tuple of ints, value is an int, bytes,
+            a tuple of subids or None, and tag is the identifier
+            octet of the value, which the types of the codec map to
+            the type decode() would have built.  The PDU header fields can be
+            had cheaply with decode(stream, lazy=True).
+        """
+        stream = octetStream(stream)
+        (pduTag, start, end) = locateVarBindList(stream)
+
+        rawDecoders = self.codec.rawDecoders
+        decodeSubIDs = rawDecoders[0x06]
+        result = []
+        for (nameStart, nameEnd, tag, valueStart, valueEnd) in iterVarBindOffsets(stream, start, end):
+            try:
+                decode = rawDecoders[tag]
+            except KeyError:
+                raise ValueError('Unknown ASN.1 Type %d' % (tag))
+
+            result.append((decodeSubIDs(stream, nameStart, nameEnd), decode(stream, valueStart, valueEnd), tag))
+            pass
+
+        return result
+
+
+class RequestTemplate:
+    """ A request Message that has been encoded once, with a fixed
+        width slot for the requestID. Each datagram for a new
+        requestID is made by patching the slot in a copy of the
+        encoding, rather than building and encoding the Message again.
+
+        Every requestID from REQUEST_ID_MIN to REQUEST_ID_MAX has a
+        four octet encoding, so the slot is only valid for IDs in
+        that range.
+    """
+    REQUEST_ID_MIN = 0x00800000
+    REQUEST_ID_MAX = 0x7FFFFFFF
+
+    def __init__(self, message):
+        pdu = message.data
+        requestID = pdu.value[0]
+
+        # Encode the message with a placeholder requestID that
+        # needs the full width of the slot
+        pdu.value[0] = Integer(self.REQUEST_ID_MIN)
+        try:
+            octets = message.encode()
+        finally:
+            pdu.value[0] = requestID
+
+        stream = memoryview(octets)
+        (tag, pos, end) = decodeHeaderAt(stream, 0, len(stream))
+        for i in range(2):
+            (tag, start, pos) = decodeHeaderAt(stream, pos, end)
+        (tag, pos, end) = decodeHeaderAt(stream, pos, end)
+        (tag, start, end) = decodeHeaderAt(stream, pos, end)
+
+        if tag != 0x02 or end - start != 4:
+            raise MessageError('Cannot find requestID slot in %s' % pdu.__class__.__name__)
+
+        self.message = message
+        self.prefix = octets[:start]
+        self.suffix = octets[end:]
+
+    def render(self, requestID):
+        """ Return the encoded message with requestID in the slot
+        """
+        if not self.REQUEST_ID_MIN <= requestID <= self.REQUEST_ID_MAX:
+            raise ValueError('requestID %d does not fit the template slot' % requestID)
+
+        return b''.join((self.prefix, requestID.to_bytes(4, 'big'), self.suffix))
+
+    def __len__(self):
+        return len(self.prefix) + 4 + len(self.suffix)
+
+
+def iterVarBinds(stream, codec=None):
+    """ Generate the (name, value) pair of each varbind in an encoded
+        message, one at a time, without building the VarBindList.
+        Works for any PDU type, as the varbinds are always its last
+        field. Only the current varbind is held in memory, so a walk
+        of a large table can be fed straight into storage.
+        The values are decoded with codec, by default the SNMPv1 one.
+    """
+    if codec is None:
+        codec = Message.codec
+    decoders = codec.decoders
+
+    stream = octetStream(stream)
+    (tag, start, end) = locateVarBindList(stream)
+
+    for offsets in iterVarBindOffsets(stream, start, end):
+        yield decodeVarBindOffsets(stream, offsets, decoders)
+
+
+def locatePDU(stream):
+    """ Read the header of an encoded message, returning (version,
+        community, pduTag, start, end), where community is bytes and
+        start and end bound the PDU contents.  Raises MessageError or
+        ValueError if the header is malformed.
+    """
+    try:
+        (tag, pos, end) = decodeHeaderAt(stream, 0, len(stream))
+        if tag != 0x30 or end != len(stream):
+            raise MessageError('Malformed Message: not a single Sequence')
+
+        (tag, start, pos) = decodeHeaderAt(stream, pos, end)
+        if tag != 0x02:
+            raise MessageError('Malformed Message: version is not an Integer')
+        version = decodeIntegerValue(stream[start:pos])
+
+        (tag, start, pos) = decodeHeaderAt(stream, pos, end)
+        if tag != 0x04:
+            raise MessageError('Malformed Message: community is not an OctetString')
+        community = bytes(stream[start:pos])
+
+        (pduTag, pos, pduEnd) = decodeHeaderAt(stream, pos, end)
+        if pduEnd != end:
+            raise MessageError('Malformed Message: Incorrect sequence length')
+
+    except IndexError:
+        raise MessageError('Malformed Message: Truncated header')
+
+    return version, community, pduTag, pos, pduEnd
+
+
+def locateFields(stream):
+    """ Find the fields of the PDU in an encoded message, returning
+        the PDU tag and a list of the (tag, start, end) of each field
+    """
+    (version, community, pduTag, pos, end) = locatePDU(stream)
+
+    fields = []
+    try:
+        while pos < end:
+            (tag, start, pos) = decodeHeaderAt(stream, pos, end)
+            fields.append((tag, start, pos))
+            pass
+    except IndexError:
+        raise PDUError('Malformed PDU: Truncated header')
+
+    return pduTag, fields
+
+
+def locateVarBindList(stream):
+    """ Find the varBindList in an encoded message, returning the
+        PDU tag along with the start and end of the varBindList
+        contents
+    """
+    (pduTag, fields) = locateFields(stream)
+
+    # The varBindList is the last field of every PDU
+    if not fields or fields[-1][0] != 0x30:
+        raise PDUError('Malformed PDU: no varBindList')
+    return (pduTag,) + fields[-1][1:]
+
+
+def locateResponse(stream):
+    """ Find the error status, error index and varBindList of an
+        encoded Response, returning (errorStatus, errorIndex, start,
+        end), where start and end bound the varBindList contents
+    """
+    (pduTag, fields) = locateFields(stream)
+
+    if len(fields) != 4 or fields[1][0] != 0x02 or fields[2][0] != 0x02 or fields[3][0] != 0x30:
+        raise PDUError('Malformed PDU: Incorrect fields')
+
+    errorStatus = decodeIntegerValue(stream[fields[1][1]:fields[1][2]])
+    errorIndex = decodeIntegerValue(stream[fields[2][1]:fields[2][2]])
+    return errorStatus, errorIndex, fields[3][1], fields[3][2]
+
+
+def iterVarBindOffsets(stream, start, end):
+    """ Generate the positions of each varbind in the varBindList
+        contents between start and end, as (nameStart, nameEnd,
+        valueTag, valueStart, valueEnd).  The name octets can be
+        checked with the encoded ObjectID functions of rfc1155 before
+        deciding whether to decode the varbind with
+        decodeVarBindOffsets().
+    """
+
+    ## Nearly every header in a varbind is a single octet tag and
+    ## a short form length, so those are decoded in line here,
+    ## only calling decodeHeaderAt() for anything longer.
+
+    pos = start
+    try:
+        while pos < end:
+            length = stream[pos + 1]
+            if stream[pos] != 0x30 or length & 0x80:
+                (tag, start, pos) = decodeHeaderAt(stream, pos, end)
+                if tag != 0x30:
+                    raise PDUError('Malformed VarBind: Unexpected tag %d' % tag)
+            else:
+                start = pos + 2
+                pos = start + length
+                if pos > end:
+                    raise ValueError('Truncated ASN.1 object: need %d octets, have %d' % (length, end - start))
+
+            length = stream[start + 1]
+            if stream[start] != 0x06 or length & 0x80:
+                (tag, nameStart, nameEnd) = decodeHeaderAt(stream, start, pos)
+                if tag != 0x06:
+                    raise PDUError('Malformed VarBind: name is not an ObjectID')
+            else:
+                nameStart = start + 2
+                nameEnd = nameStart + length
+            if nameEnd >= pos:
+                raise PDUError('Malformed VarBind: Incorrect length')
+
+            tag = stream[nameEnd]
+            length = stream[nameEnd + 1]
+            if tag & 0x1F == 0x1F or length & 0x80:
+                (tag, valueStart, valueEnd) = decodeHeaderAt(stream, nameEnd, pos)
+            else:
+                valueStart = nameEnd + 2
+                valueEnd = valueStart + length
+            if valueEnd != pos:
+                raise PDUError('Malformed VarBind: Incorrect length')
+
+            yield nameStart, nameEnd, tag, valueStart, valueEnd
+    except IndexError:
+        raise PDUError('Malformed VarBind: Truncated header')
+
+
+def decodeVarBindOffsets(stream, offsets, decoders):
+    """ Decode the name and value of a varbind at the offsets
+        iterVarBindOffsets() found, with the decoders of a
+        CodecRegistry
+    """
+    (nameStart, nameEnd, tag, valueStart, valueEnd) = offsets
+    try:
+        decode = decoders[tag]
+    except KeyError:
+        raise ValueError('Unknown ASN.1 Type %d' % (tag))
+    return decoders[0x06](stream, nameStart, nameEnd), decode(stream, valueStart, valueEnd)
+
+
+def peekHeader(stream):
+    """ Read the header of an encoded message without decoding the
+        rest of it, returning (version, community, pduTag, requestID).
+        community is bytes.  requestID is None for an SNMPv1 Trap,
+        which doesn't have one.  Raises MessageError, PDUError or
+        ValueError if the header is malformed.
+    """
+    stream = octetStream(stream)
+    (version, community, pduTag, pos, end) = locatePDU(stream)
+
+    if pduTag == 0xa4:
+        return version, community, pduTag, None
+
+    try:
+        (tag, start, pos) = decodeHeaderAt(stream, pos, end)
+    except IndexError:
+        raise MessageError('Malformed Message: Truncated header')
+    if tag != 0x02:
+        raise PDUError('Malformed PDU: requestID is not an Integer')
+
+    return version, community, pduTag, decodeIntegerValue(stream[start:pos])
+
 
 class MessageError(Exception):
     def __init__(self, args=None):
@@ -153,16 +569,28 @@ class PDU(Sequence):
     def decodeContents(self, stream):
         """ Decode into a Get PDU Object
         """
-        objectList = Sequence.decodeContents(self, stream)
-        if len(self.value) != 4:
-            raise PDUError('Malformed PDU: Incorrect length %d' % len(self.value))
+        return self.fromObjects(Sequence.decodeContents(self, stream).value)
+
+    @classmethod
+    def decoder(cls, decoders=None):
+        def decode(stream, start, end):
+            return cls.fromObjects(decodeObjects(stream, start, end, decoders))
+        return decode
+
+    @classmethod
+    def fromObjects(cls, objectList):
+        """ Build a PDU from the list of objects its contents decode
+            into
+        """
+        if len(objectList) != 4:
+            raise PDUError('Malformed PDU: Incorrect length %d' % len(objectList))
 
         # Build things with the correct type
         myVarList = VarBindList()
         for item in objectList[3]:
             myVarList.append(VarBind(item[0], item[1]))
 
-        return self.__class__(int(objectList[0]), int(objectList[1]), int(objectList[2]), myVarList)
+        return cls(int(objectList[0]), int(objectList[1]), int(objectList[2]), myVarList)
 
 
 class PDUError(Exception):
@@ -185,7 +613,7 @@ class GetNext(PDU):
 class Response(PDU):
     """ A Response PDU
     """
-    asnTagNumber = asnTagNumbers['Get']
+    asnTagNumber = asnTagNumbers['Response']
 
 
 class Set(PDU):
@@ -198,6 +626,8 @@ class GenericTrap(Integer):
     """
     Generic Trap type
     """
+    __slots__ = ()
+
     genericTraps = {
         0: 'coldStart',
         1: 'warmStart',
@@ -255,23 +685,44 @@ class TrapPDU(Sequence):
     def decodeContents(self, stream):
         """ Decode into a Get PDU Object
         """
-        objectList = Sequence.decodeContents(self, stream)
-
-        if len(self.value) != 6:
-            raise PDUError('Malformed TrapPDU: Incorrect length %d' % len(self.value))
+        return self.fromObjects(Sequence.decodeContents(self, stream).value)
+
+    @classmethod
+    def decoder(cls, decoders=None):
+        def decode(stream, start, end):
+            return cls.fromObjects(decodeObjects(stream, start, end, decoders))
+        return decode
+
+    @classmethod
+    def fromObjects(cls, objectList):
+        """ Build a TrapPDU from the list of objects its contents
+            decode into
+        """
+        if len(objectList) != 6:
+            raise PDUError('Malformed TrapPDU: Incorrect length %d' % len(objectList))
 
         # Build things with the correct type
         myVarList = VarBindList()
         for item in objectList[5]:
             myVarList.append(VarBind(item[0], item[1]))
 
-        return self.__class__(objectList[0], objectList[1], GenericTrap(int(objectList[2])), objectList[3],
-                              objectList[4], myVarList)
-
-
-# Add some new decode types
-tagDecodeDict[0xa0] = Get
-tagDecodeDict[0xa1] = GetNext
-tagDecodeDict[0xa2] = Response
-tagDecodeDict[0xa3] = Set
-tagDecodeDict[0xa4] = TrapPDU
+        return cls(objectList[0], objectList[1], GenericTrap(int(objectList[2])), objectList[3],
+                   objectList[4], myVarList)
+
+
+## SNMPv1 messages decode with the SNMPv1 SMI types and PDUs
+codec = rfc1155.codec.derive('v1', {
+    0xa0: Get,
+    0xa1: GetNext,
+    0xa2: Response,
+    0xa3: Set,
+    0xa4: TrapPDU,
+})
+
+## Decoding any of these, or what they contain, uses the types of
+## this version
+Message.codec = codec
+VarBind.codec = codec
+VarBindList.codec = codec
+PDU.codec = codec
+TrapPDU.codec = codec
@@ -6,6 +6,7 @@
 #
 # SNMPv2 stuff from RFC 1902
 
+from . import rfc1155
 from .rfc1155 import *
 
 log = logging.getLogger('rfc1902')
@@ -20,13 +21,15 @@ log = logging.getLogger('rfc1902')
 
 log.setLevel(logging.INFO)
 
-# Add a new TagNumber for encoding purposes
-asnTagNumbers['Counter64'] = 0x06
+# Add a new TagNumber for encoding purposes, to a copy of the
+# SNMPv1 numbers rather than to them
+asnTagNumbers = dict(asnTagNumbers, Counter64=0x06)
 
 
 class Integer32(Integer):
     """ A 32 bit integer
     """
+    __slots__ = ()
     MINVAL = -2147483648
     MAXVAL = 2147483648
 
@@ -34,40 +37,84 @@ class Integer32(Integer):
 class Counter32(Counter):
     """ A 32 bit counter
     """
-    pass
+    __slots__ = ()
 
 
 class Guage32(Guage):
     """ A 32 bit Guage
     """
-    pass
+    __slots__ = ()
 
 
 class Counter64(Counter):
     """ A 64 bit counter
     """
+    __slots__ = ()
     MINVAL = 0
     MAXVAL = 18446744073709551615
 
-    asnTagClass = asnTagNumbers['Counter64']
+    asnTagClass = asnTagClasses['APPLICATION']
+    asnTagNumber = asnTagNumbers['Counter64']
+
+    @classmethod
+    def rawDecoder(cls, decoders=None):
+        fromBytes = int.from_bytes
+
+        ## decodeCounter64Value() in line for the two encodings that
+        ## almost every value arrives in
+        def decodeRaw(stream, start, end):
+            length = end - start
+            if 0 < length < 9 and stream[start] < 0x80:
+                return fromBytes(stream[start:end], 'big')
+            if length == 9 and not stream[start]:
+                return fromBytes(stream[start + 1:end], 'big')
+            return decodeCounter64Value(stream[start:end])
+        return decodeRaw
+
+    def decodeContents(self, stream):
+        self.value = decodeCounter64Value(stream)
+        return self
+
+
+def decodeCounter64Value(octets):
+    """ Decode the contents octets of a Counter64.  Values with the
+        top bit set, which busy 64 bit counters spend half their lives
+        at, come with a leading zero octet, so the other eight convert
+        straight to an unsigned number.
+    """
+    if len(octets) == 9:
+        if octets[0]:
+            raise ValueError('Counter64 value of 9 octets is out of range')
+        return int.from_bytes(octets[1:], 'big')
+    return decodeUnsignedValue(octets, Counter64.MAXVAL + 1)
 
 
 class OctetString(OctetString):
     """ An SNMP v2 OctetString must be between
         0 and 65535 bytes in length
     """
+    __slots__ = ()
 
-    def __init__(self, value=''):
+    def __init__(self, value=b''):
         if len(value) > 65535:
             raise ValueError('OctetString must be shorter than 65535 bytes')
 
-        OctetString.__init__(self, value)
-
-
-## Modify tag decode lookup table to use SNMPv2 classes
-## instead of the old SNMPv1 classes. Little actual difference
-## apart from the class names.
-tagDecodeDict[0x02] = Integer32
-tagDecodeDict[0x41] = Counter32
-tagDecodeDict[0x42] = Guage32
-tagDecodeDict[0x46] = Counter64
+        rfc1155.OctetString.__init__(self, value)
+
+
+## The SNMPv2 SMI uses SNMPv2 classes instead of the old SNMPv1
+## classes. Little actual difference apart from the class names,
+## and Counter64.
+codec = rfc1155.codec.derive('SMIv2', {
+    0x02: Integer32,
+    0x41: Counter32,
+    0x42: Guage32,
+    0x46: Counter64,
+})
+
+## Decoding one of these uses the SNMPv2 SMI types
+Integer32.codec = codec
+Counter32.codec = codec
+Guage32.codec = codec
+Counter64.codec = codec
+OctetString.codec = codec
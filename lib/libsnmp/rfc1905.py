@@ -7,14 +7,14 @@
 # SNMPv2 protocol parts
 
 from . import rfc1157
+from . import rfc1902
 from .rfc1902 import *
 
 log = logging.getLogger('rfc1905')
 
-asnTagNumbers['GetBulk'] = 0x05
-asnTagNumbers['Inform'] = 0x06
-asnTagNumbers['TrapV2'] = 0x07
-asnTagNumbers['Report'] = 0x08
+# The PDU tag numbers.  SNMPv2 drops the SNMPv1 Trap.
+asnTagNumbers = dict(asnTagNumbers, Get=0x00, GetNext=0x01, Response=0x02, Set=0x03,
+                     GetBulk=0x05, Inform=0x06, TrapV2=0x07, Report=0x08)
 
 max_bindings = 2147483647
 
@@ -22,24 +22,33 @@ max_bindings = 2147483647
 class VarBind(rfc1157.VarBind):
     """ VarBind redefined here to place it in the same namespace
     """
-    pass
+    __slots__ = ()
 
 
 ## We need to add some special types because ucd-snmp uses
 ## context specific values for the CHOICE within a VarBind
 class NoSuchObject(rfc1157.Null):
+    __slots__ = ()
+    asnTagClass = asnTagClasses['CONTEXT']
+    asnTagNumber = 0x00
 
     def __str__(self):
         return ('No Such Object')
 
 
 class NoSuchInstance(rfc1157.Null):
+    __slots__ = ()
+    asnTagClass = asnTagClasses['CONTEXT']
+    asnTagNumber = 0x01
 
     def __str__(self):
         return ('No Such Instance')
 
 
 class EndOfMibView(rfc1157.Null):
+    __slots__ = ()
+    asnTagClass = asnTagClasses['CONTEXT']
+    asnTagNumber = 0x02
 
     def __str__(self):
         return ('EndOfMibView')
@@ -48,6 +57,7 @@ class EndOfMibView(rfc1157.Null):
 class VarBindList(rfc1157.VarBindList):
     """ An SNMPv2 VarBindList has a maximum size of max_bindings
     """
+    __slots__ = ()
 
     def __init__(self, value=[]):
         if len(value) > max_bindings:
@@ -64,37 +74,40 @@ class Message(rfc1157.Message):
 class ErrorStatus(rfc1157.ErrorStatus):
     """ An SNMPv2 Error status
     """
-
-    def __init__(self, value):
-        rfc1157.ErrorStatus.__init__(self, value)
-        # add to the SNMPv1 error strings
-        self.errString[6] = 'Access is not permitted'
-        self.errString[7] = 'Type is incorrect'
-        self.errString[8] = 'Length is incorrect'
-        self.errString[9] = 'Encoding is incorrect'
-        self.errString[10] = 'Value is incorrect'
-        self.errString[11] = 'No creation'
-        self.errString[12] = 'Value is inconsistent'
-        self.errString[13] = 'Resourse Unavailable'
-        self.errString[14] = 'Commit Failed'
-        self.errString[15] = 'Undo Failed'
-        self.errString[16] = 'Authorization Error'
-        self.errString[17] = 'Not Writable'
-        self.errString[18] = 'Inconsistent Name'
-
-        self.errNum[6] = 'noAccess'
-        self.errNum[7] = 'wrongType'
-        self.errNum[8] = 'wrongLength'
-        self.errNum[9] = 'wrongEncoding'
-        self.errNum[10] = 'wrongValue'
-        self.errNum[11] = 'noCreation'
-        self.errNum[12] = 'inconsistentValue'
-        self.errNum[13] = 'resourceUnavailable'
-        self.errNum[14] = 'commitFailed'
-        self.errNum[15] = 'undoFailed'
-        self.errNum[16] = 'authorizationError'
-        self.errNum[17] = 'notWritable'
-        self.errNum[18] = 'inconsistentName'
+    __slots__ = ()
+
+    # add to the SNMPv1 error strings
+    errString = dict(rfc1157.ErrorStatus.errString)
+    errString.update({
+        6: 'Access is not permitted',
+        7: 'Type is incorrect',
+        8: 'Length is incorrect',
+        9: 'Encoding is incorrect',
+        10: 'Value is incorrect',
+        11: 'No creation',
+        12: 'Value is inconsistent',
+        13: 'Resourse Unavailable',
+        14: 'Commit Failed',
+        15: 'Undo Failed',
+        16: 'Authorization Error',
+        17: 'Not Writable',
+        18: 'Inconsistent Name',
+    })
+
+    errNum = dict(rfc1157.ErrorStatus.errNum,
+                  noAccess=6,
+                  wrongType=7,
+                  wrongLength=8,
+                  wrongEncoding=9,
+                  wrongValue=10,
+                  noCreation=11,
+                  inconsistentValue=12,
+                  resourceUnavailable=13,
+                  commitFailed=14,
+                  undoFailed=15,
+                  authorizationError=16,
+                  notWritable=17,
+                  inconsistentName=18)
 
 
 class PDU(rfc1157.PDU):
@@ -164,16 +177,28 @@ class BulkPDU(Sequence):
     def decodeContents(self, stream):
         """ Decode into a BulkPDU object
         """
-        objectList = Sequence.decodeContents(self, stream)
-        if len(self.value) != 4:
-            raise PDUError('Malformed BulkPDU: Incorrect length %d' % len(self.value))
+        return self.fromObjects(Sequence.decodeContents(self, stream).value)
+
+    @classmethod
+    def decoder(cls, decoders=None):
+        def decode(stream, start, end):
+            return cls.fromObjects(decodeObjects(stream, start, end, decoders))
+        return decode
+
+    @classmethod
+    def fromObjects(cls, objectList):
+        """ Build a BulkPDU from the list of objects its contents
+            decode into
+        """
+        if len(objectList) != 4:
+            raise PDUError('Malformed BulkPDU: Incorrect length %d' % len(objectList))
 
         # Build things with the correct types
         myVarList = []
         for item in objectList[3]:
             myVarList.append(VarBind(item[0], item[1]))
 
-        return self.__class__(int(objectList[0]), int(objectList[1]), int(objectList[2]), myVarList)
+        return cls(int(objectList[0]), int(objectList[1]), int(objectList[2]), myVarList)
 
 
 class Get(PDU):
@@ -229,15 +254,35 @@ class PDUError(Exception):
         self.args = args
 
 
-## Add some new decode types
-
-tagDecodeDict[0xa2] = Response
-tagDecodeDict[0xa5] = GetBulk
-tagDecodeDict[0xa6] = Inform
-tagDecodeDict[0xa7] = TrapV2
-tagDecodeDict[0xa8] = Report
-
-## ucd-snmp returns context-specific values at time
-tagDecodeDict[0x80] = NoSuchObject
-tagDecodeDict[0x81] = NoSuchInstance
-tagDecodeDict[0x82] = EndOfMibView
+def iterVarBinds(stream):
+    """ rfc1157.iterVarBinds(), decoding the values as SNMPv2 types
+    """
+    return rfc1157.iterVarBinds(stream, codec)
+
+
+## SNMPv2c messages decode with the SNMPv2 SMI types and PDUs, and
+## the context specific values ucd-snmp returns at times.  The SNMPv1
+## Trap is kept, as v2.SNMP.createTrap() sends it in SNMPv2c messages.
+codec = rfc1902.codec.derive('v2c', {
+    0xa0: Get,
+    0xa1: GetNext,
+    0xa2: Response,
+    0xa3: Set,
+    0xa4: rfc1157.TrapPDU,
+    0xa5: GetBulk,
+    0xa6: Inform,
+    0xa7: TrapV2,
+    0xa8: Report,
+
+    0x80: NoSuchObject,
+    0x81: NoSuchInstance,
+    0x82: EndOfMibView,
+})
+
+## Decoding any of these, or what they contain, uses the types of
+## this version
+Message.codec = codec
+VarBind.codec = codec
+VarBindList.codec = codec
+PDU.codec = codec
+BulkPDU.codec = codec
@@ -4,15 +4,122 @@
 #    libsnmp - a Python SNMP library
 #    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
 
+import ctypes
+import errno
 import logging
 import socket
+import struct
+import sys
 
 log = logging.getLogger('v1.SNMP')
 
 
+##
+## Batched datagram I/O.  On Linux, recvmmsg() and sendmmsg() move up
+## to a batch of datagrams per system call, and are called through
+## ctypes.  Elsewhere readMany() and sendMany() fall back to a loop
+## of recvfrom() and sendto() calls.
+##
+
+class iovec(ctypes.Structure):
+    _fields_ = [
+        ('iov_base', ctypes.c_void_p),
+        ('iov_len', ctypes.c_size_t),
+    ]
+
+
+class msghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_name', ctypes.c_void_p),
+        ('msg_namelen', ctypes.c_uint32),
+        ('msg_iov', ctypes.POINTER(iovec)),
+        ('msg_iovlen', ctypes.c_size_t),
+        ('msg_control', ctypes.c_void_p),
+        ('msg_controllen', ctypes.c_size_t),
+        ('msg_flags', ctypes.c_int),
+    ]
+
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [
+        ('msg_hdr', msghdr),
+        ('msg_len', ctypes.c_uint),
+    ]
+
+
+def loadMmsg():
+    """ Return the recvmmsg and sendmmsg functions of the C library,
+        or None where there aren't any
+    """
+    if not sys.platform.startswith('linux'):
+        return None, None
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        recvmmsg = libc.recvmmsg
+        sendmmsg = libc.sendmmsg
+    except (OSError, AttributeError):
+        return None, None
+
+    recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    recvmmsg.restype = ctypes.c_int
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+    return recvmmsg, sendmmsg
+
+
+(recvmmsg, sendmmsg) = loadMmsg()
+
+## Room for any socket address, as a struct sockaddr_storage
+SOCKADDR_SIZE = 128
+
+MMSGHDR_SIZE = ctypes.sizeof(mmsghdr)
+IOVEC_SIZE = ctypes.sizeof(iovec)
+
+## The fields recvmmsg() writes for each datagram, its address
+## length, flags and length, picked out of the array of mmsghdrs
+NAMELEN_OFFSET = msghdr.msg_namelen.offset
+FLAGS_OFFSET = msghdr.msg_flags.offset
+LEN_OFFSET = mmsghdr.msg_len.offset
+receivedHeader = struct.Struct('=%dxI%dxi%dxI%dx' % (
+    NAMELEN_OFFSET, FLAGS_OFFSET - NAMELEN_OFFSET - 4, LEN_OFFSET - FLAGS_OFFSET - 4, MMSGHDR_SIZE - LEN_OFFSET - 4))
+
+packIovec = struct.Struct('PN').pack_into
+packName = struct.Struct('PI').pack_into
+
+## As plain ints, the socket module's flags being slow to test
+MSG_DONTWAIT = int(getattr(socket, 'MSG_DONTWAIT', 0))
+MSG_TRUNC = int(getattr(socket, 'MSG_TRUNC', 0x20))
+
+
+def decodeSockaddr(name):
+    """ Turn a struct sockaddr into the address tuple recvfrom()
+        would return
+    """
+    family = int.from_bytes(name[0:2], sys.byteorder)
+    port = int.from_bytes(name[2:4], 'big')
+    if family == socket.AF_INET:
+        return socket.inet_ntop(socket.AF_INET, name[4:8]), port
+    elif family == socket.AF_INET6:
+        return (socket.inet_ntop(socket.AF_INET6, name[8:24]), port,
+                int.from_bytes(name[4:8], 'big'), int.from_bytes(name[24:28], sys.byteorder))
+    raise ValueError('Unknown address family %d' % family)
+
+
+def encodeSockaddr(dst):
+    """ Turn a (host, port) tuple into a struct sockaddr_in
+    """
+    (host, port) = dst[:2]
+    try:
+        address = socket.inet_aton(host)
+    except OSError:
+        address = socket.inet_aton(socket.gethostbyname(host))
+        pass
+    return struct.pack('=H', socket.AF_INET) + struct.pack('!H', port) + address + bytes(8)
+
+
 class manager:
 
-    def __init__(self, dest, interface=('0.0.0.0', 0), socksize=0x10000):
+    def __init__(self, dest, interface=('0.0.0.0', 0), socksize=0x10000, batchSize=32, reusePort=False):
 
         self.dest = dest
         self.interface = interface
@@ -20,6 +127,21 @@ class manager:
         self.socksize = socksize
         self.request_id = 1
 
+        # Share the port with other sockets that set SO_REUSEPORT,
+        # the kernel spreading datagrams between them
+        self.reusePort = reusePort
+
+        # Most datagrams readMany() and sendMany() move per call
+        self.batchSize = batchSize
+
+        # The recvmmsg() and sendmmsg() buffers, made on first use,
+        # the encoded address of each destination sent to, and the
+        # decoded address of each source received from
+        self.recvState = None
+        self.sendState = None
+        self.addresses = {}
+        self.sources = {}
+
         return
 
     def __del__(self):
@@ -32,6 +154,9 @@ class manager:
     def open(self):
 
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if self.reusePort:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+            pass
         self.socket.bind(self.interface)
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.socksize)
 
@@ -52,6 +177,181 @@ class manager:
 
         return (message, src)
 
+    def readMany(self, count=None):
+        """ Read up to count datagrams, by default batchSize, that have
+            already arrived, without blocking, returning a list of
+            (message, src)
+        """
+        if not self.socket:
+            raise ValueError('Socket not initialized')
+
+        if count is None:
+            count = self.batchSize
+            pass
+
+        if recvmmsg is not None:
+            return self.recvmmsg(count)
+
+        result = []
+        try:
+            while len(result) < count:
+                result.append(self.socket.recvfrom(self.socksize, MSG_DONTWAIT))
+                pass
+        except BlockingIOError:
+            pass
+        return result
+
+    def recvmmsg(self, count):
+        state = self.recvState
+        if state is None or state[0] < count:
+            state = self.recvState = self.recvBuffers(max(count, self.batchSize))
+            pass
+        (slots, msgs, blank, data, names, iovecs) = state
+
+        # Every header back as it was before the last call changed it
+        ctypes.memmove(msgs, blank, count * MMSGHDR_SIZE)
+        received = recvmmsg(self.socket.fileno(), msgs, count, MSG_DONTWAIT, None)
+        if received < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                return []
+            raise OSError(err, 'recvmmsg: %s' % errno.errorcode.get(err, err))
+
+        headers = ctypes.string_at(msgs, received * MMSGHDR_SIZE)
+        names = ctypes.string_at(names, received * SOCKADDR_SIZE)
+        sources = self.sources
+        size = self.socksize
+        result = []
+        for (i, (namelen, flags, length)) in enumerate(receivedHeader.iter_unpack(headers)):
+            if flags & MSG_TRUNC:
+                log.info('Dropping a datagram longer than %d octets' % size)
+                continue
+            pos = i * SOCKADDR_SIZE
+            name = names[pos:pos + namelen]
+            src = sources.get(name)
+            if src is None:
+                if len(sources) > 4096:
+                    sources.clear()
+                    pass
+                src = sources[name] = decodeSockaddr(name)
+                pass
+            start = i * size
+            result.append((data[start:start + length].tobytes(), src))
+            pass
+        return result
+
+    def recvBuffers(self, count):
+        """ Make a buffer of socksize octets, and room for its source
+            address, for each of count datagrams, and the headers that
+            point at them
+        """
+        size = self.socksize
+        buf = ctypes.create_string_buffer(count * size)
+        names = ctypes.create_string_buffer(count * SOCKADDR_SIZE)
+        iovecs = (iovec * count)()
+        msgs = (mmsghdr * count)()
+
+        for i in range(count):
+            iovecs[i].iov_base = ctypes.addressof(buf) + i * size
+            iovecs[i].iov_len = size
+            hdr = msgs[i].msg_hdr
+            hdr.msg_name = ctypes.addressof(names) + i * SOCKADDR_SIZE
+            hdr.msg_namelen = SOCKADDR_SIZE
+            hdr.msg_iov = ctypes.pointer(iovecs[i])
+            hdr.msg_iovlen = 1
+            pass
+
+        # msgs holds the addresses of buf, names and iovecs, not the
+        # objects, so they're kept with it
+        return count, msgs, bytes(msgs), memoryview(buf).cast('B'), names, iovecs
+
+    def sendMany(self, datagrams):
+        """ Send each (request, dst) in datagrams, batchSize at a time,
+            returning how many were sent.  Sending stops once the
+            socket's send buffer is full, leaving the rest for the
+            caller to send again when the socket is writable.
+        """
+        if not self.socket:
+            self.open()
+            pass
+
+        if sendmmsg is None:
+            sent = 0
+            try:
+                for (request, dst) in datagrams:
+                    self.socket.sendto(request, dst)
+                    sent += 1
+                    pass
+            except BlockingIOError:
+                pass
+            return sent
+
+        sent = 0
+        batchSize = self.batchSize
+        for start in range(0, len(datagrams), batchSize):
+            batch = datagrams[start:start + batchSize]
+            done = self.sendmmsg(batch)
+            sent += done
+            if done < len(batch):
+                break
+            pass
+        return sent
+
+    def sendmmsg(self, batch):
+        state = self.sendState
+        if state is None or state[0] < len(batch):
+            state = self.sendState = self.sendBuffers(max(len(batch), self.batchSize))
+            pass
+        (slots, msgs, msgsView, iovecsView, iovecs) = state
+
+        # One copy of every request, so one object to point into
+        requests = [ request for (request, dst) in batch ]
+        data = b''.join(requests)
+        address = ctypes.cast(ctypes.c_char_p(data), ctypes.c_void_p).value
+
+        # Cleared before rather than during the batch, which points
+        # at the addresses it holds
+        addresses = self.addresses
+        if len(addresses) > 4096:
+            addresses.clear()
+            pass
+        for (i, request) in enumerate(requests):
+            length = len(request)
+            packIovec(iovecsView, i * IOVEC_SIZE, address, length)
+            address += length
+
+            dst = batch[i][1]
+            name = addresses.get(dst)
+            if name is None:
+                sockaddr = ctypes.create_string_buffer(encodeSockaddr(dst), 16)
+                name = addresses[dst] = (ctypes.addressof(sockaddr), sockaddr)
+                pass
+            packName(msgsView, i * MMSGHDR_SIZE, name[0], 16)
+            pass
+
+        sent = sendmmsg(self.socket.fileno(), msgs, len(batch), 0)
+        if sent < 0:
+            err = ctypes.get_errno()
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return 0
+            raise OSError(err, 'sendmmsg: %s' % errno.errorcode.get(err, err))
+        return sent
+
+    def sendBuffers(self, count):
+        """ Make the headers sendmmsg() reads for count datagrams
+        """
+        iovecs = (iovec * count)()
+        msgs = (mmsghdr * count)()
+        for i in range(count):
+            hdr = msgs[i].msg_hdr
+            hdr.msg_iov = ctypes.pointer(iovecs[i])
+            hdr.msg_iovlen = 1
+            pass
+
+        msgsView = memoryview((ctypes.c_char * ctypes.sizeof(msgs)).from_buffer(msgs)).cast('B')
+        iovecsView = memoryview((ctypes.c_char * ctypes.sizeof(iovecs)).from_buffer(iovecs)).cast('B')
+        return count, msgs, msgsView, iovecsView, iovecs
+
     def close(self):
         if self.socket:
             self.socket.close()
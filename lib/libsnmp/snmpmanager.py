@@ -8,10 +8,13 @@
 ## An snmpmanager understands SNMPv1 and SNMPv2c messages
 ## and so it can encode and decode both.
 
+import asyncio
 import logging
 import queue
+import time
 
-from libsnmp import asynrole
+from libsnmp import aiorole
+from libsnmp import rfc1155
 from libsnmp import rfc1157
 from libsnmp import rfc1905
 from libsnmp import v1
@@ -34,23 +37,58 @@ typeValDict = {
 }
 
 
-class snmpManager(asynrole.Manager):
+class snmpManager(aiorole.Manager):
     nextRequestID = 0  # global counter of requestIDs
 
-    def __init__(self, queueEmpty=None, trapCallback=None, interface=('0.0.0.0', 0), timeout=0.25):
+    def __init__(self, queueEmpty=None, trapCallback=None, interface=('0.0.0.0', 0), timeout=0.25, lazyDecode=False,
+                 loop=None, batchSize=None, reusePort=False, sendRate=None, sendBurst=None):
         """ Create a new snmpManager bound to interface
             queueEmpty is a callback of what to do if I run out
             of stuff to do. Default is to wait for more stuff.
+            If lazyDecode is True, the varbinds of received messages
+            are only decoded when a callback accesses them.
+            Given an asyncio loop, received messages are dispatched
+            by it, and serve() sends the queued requests, instead of
+            run() doing both.
+            With a batchSize, datagrams are read and sent that many
+            at a time, in one system call where the platform allows.
+            With reusePort, the socket shares its port with others
+            that set SO_REUSEPORT.
+            Queued requests, and those get(), getNext() and set()
+            send, are all sent as soon as they're made, unless
+            sendRate limits them to that many a second, in bursts of
+            up to sendBurst.
         """
         self.queueEmpty = queueEmpty
+        self.lazyDecode = lazyDecode
         self.outbound = queue.Queue()
         self.callbacks = {}
 
+        self.rateLimit = None
+        if sendRate:
+            self.rateLimit = RateLimit(sendRate, sendBurst)
+            pass
+
+        # Callbacks that take the received datagram as it is, without
+        # it being decoded first, as a walk does
+        self.rawCallbacks = {}
+
+        # Scratch buffer for encoding requests in batches
+        self.batchEncoder = rfc1155.BatchEncoder()
+
+        # The Message class, and so the codec, each version of
+        # received message is decoded with
+        self.messageTypes = {
+            0: rfc1157.Message,
+            1: rfc1905.Message,
+        }
+
         # What to do if we get a trap
         self.trapCallback = trapCallback
 
-        # initialise as an asynrole manager
-        asynrole.Manager.__init__(self, (self.receiveData, None), interface=interface, timeout=timeout)
+        # initialise as an aiorole manager
+        aiorole.Manager.__init__(self, (self.receiveData, None), interface=interface, timeout=timeout, loop=loop,
+                                 batchSize=batchSize, reusePort=reusePort)
 
         try:
             # figure out the current system uptime
@@ -123,6 +161,23 @@ class snmpManager(asynrole.Manager):
 
         return message
 
+    def createGetRequestTemplate(self, oidlist, community='public', version=2):
+        """ Creates a RequestTemplate for a Get of every oid in
+            oidlist, which snmpGetTemplate() can then send over
+            and over without encoding it again.
+        """
+        if version == 1:
+            module = rfc1157
+        elif version == 2:
+            module = rfc1905
+        else:
+            raise ValueError('Unknown version %d' % version)
+
+        varbinds = [module.VarBind(module.ObjectID(oid), module.Null()) for oid in oidlist]
+        pdu = module.Get(0, varBindList=module.VarBindList(varbinds))
+        message = module.Message(community=community, data=pdu)
+        return rfc1157.RequestTemplate(message)
+
     def createGetNextRequestMessage(self, varbindlist, community='public', version=2):
         """ Creates a message object from a pdu and a
             community string.
@@ -141,14 +196,14 @@ class snmpManager(asynrole.Manager):
         """
         if version == 1:
             objID = rfc1157.ObjectID(oid)
-            val = rfc1157.tagDecodeDict[valtype](value)
+            val = rfc1157.codec.types[valtype](value)
             varbindlist = rfc1157.VarBindList([rfc1157.VarBind(objID, val)])
             pdu = self.createSetRequestPDU(varbindlist, 1)
             message = rfc1157.Message(community=community, data=pdu)
 
         elif version == 2:
             objID = rfc1905.ObjectID(oid)
-            val = rfc1905.tagDecodeDict[valtype](value)
+            val = rfc1905.codec.types[valtype](value)
             varbindlist = rfc1905.VarBindList([rfc1905.VarBind(objID, val)])
             pdu = self.createSetRequestPDU(varbindlist, 1)
             message = rfc1905.Message(community=community, data=pdu)
@@ -204,14 +259,28 @@ class snmpManager(asynrole.Manager):
         """
         msg = self.createGetRequestMessage(oid, community, version)
 
-        # add this message to the outbound queue as a tuple
-        self.outbound.put((msg, remote))
         # Add the callback to my dictionary with the requestID
         # as the key for later retrieval
         self.callbacks[msg.data.requestID] = callback
+        # add this message to the outbound queue
+        self.queueRequest(msg, remote)
 
         return msg.data.requestID
 
+    def snmpGetTemplate(self, template, remote, callback):
+        """ snmpGetTemplate issues the request encoded in template
+            to remote with a new requestID
+        """
+        # The counter is mapped into the requestIDs the template's
+        # four octets can hold, however far it has counted
+        span = template.REQUEST_ID_MAX - template.REQUEST_ID_MIN + 1
+        reqID = template.REQUEST_ID_MIN + self.assignRequestID() % span
+
+        # The outbound queue takes the encoded message as it is
+        self.callbacks[reqID] = callback
+        self.queueRequest(template.render(reqID), remote)
+        return reqID
+
     def snmpGetNext(self, varbindlist, remote, callback, community='public', version=2):
         """ snmpGetNext issues an SNMP Get Next Request to remote for
             the varbindlist that is passed in. It is assumed that you
@@ -220,11 +289,11 @@ class snmpManager(asynrole.Manager):
         """
         msg = self.createGetNextRequestMessage(varbindlist, community, version)
 
-        # add this message to the outbound queue as a tuple
-        self.outbound.put((msg, remote))
         # Add the callback to my dictionary with the requestID
         # as the key for later retrieval
         self.callbacks[msg.data.requestID] = callback
+        # add this message to the outbound queue
+        self.queueRequest(msg, remote)
         return msg.data.requestID
 
     def snmpSet(self, oid, valtype, value, remote, callback, community='public', version=2):
@@ -233,23 +302,125 @@ class snmpManager(asynrole.Manager):
         a combination of oid and value in order to set a variable.
         Depending on the version, this will be built into the appropriate
         varbindlist for message creation.
-        valtype should be a tagDecodeDict key
+        valtype should be an identifier octet in the codec of the version
         """
         msg = self.createSetRequestMessage(oid, valtype, value, community, version)
 
-        # add this message to the outbound queue as a tuple
-        self.outbound.put((msg, remote))
         # Add the callback to my dictionary with the requestID
         # as the key for later retrieval
         self.callbacks[msg.data.requestID] = callback
+        # add this message to the outbound queue
+        self.queueRequest(msg, remote)
         return msg.data.requestID
 
+    def snmpWalk(self, oid, remote, callback, community='public', version=2, whenDone=None):
+        """ snmpWalk walks the subtree beneath oid on remote with
+            GetNext requests, calling callback(manager, varbind) for
+            each varbind in the subtree.  If there is nothing beneath
+            oid, oid itself is fetched with a Get, as net-snmp's
+            snmpwalk does, so walking a scalar calls callback with its
+            value.  When the walk ends, at the end of the subtree or on
+            an error, whenDone(manager, walk) is called.  Returns the
+            Walk.
+        """
+        walk = Walk(oid, remote, callback, community, version, whenDone)
+        walk.next(self, walk.root)
+        return walk
+
+    ##
+    ## Coroutine versions of the requests above.  Each is sent as soon
+    ## as it's made, rather than queued, and returns the response
+    ## Message, so they compose with asyncio.gather(), wait_for() and
+    ## cancellation.  They run on the loop the manager was given.
+    ##
+    async def get(self, oids, remote, community='public', version=2, timeout=None):
+        """ Get an oid, or a list of them, from remote
+        """
+        pdu = self.createGetRequestPDU(self.createVarBindList(oids, version), version)
+        msg = self.versionModule(version).Message(community=community, data=pdu)
+        return await self.request(msg, remote, timeout)
+
+    async def getNext(self, oids, remote, community='public', version=2, timeout=None):
+        """ Get the objects following an oid, or a list of them, or
+            the names in a varbindlist, from remote
+        """
+        if not isinstance(oids, rfc1157.VarBindList):
+            oids = self.createVarBindList(oids, version)
+            pass
+        msg = self.createGetNextRequestMessage(oids, community, version)
+        return await self.request(msg, remote, timeout)
+
+    async def set(self, oid, valtype, value, remote, community='public', version=2, timeout=None):
+        """ Set oid on remote to value, of the type valtype decodes
+            into, as snmpSet() does
+        """
+        msg = self.createSetRequestMessage(oid, valtype, value, community, version)
+        return await self.request(msg, remote, timeout)
+
+    async def request(self, msg, remote, timeout=None):
+        """ Send the request msg to remote, once the rate limit
+            allows, returning the response Message once it arrives.
+            Raises asyncio.TimeoutError if it hasn't after timeout
+            seconds.  A request that times out, or is cancelled, is
+            forgotten, so a late response is dropped without being
+            decoded.
+        """
+        if self.rateLimit is not None:
+            await self.throttle()
+            pass
+
+        future = self.loop.create_future()
+        requestID = int(msg.data.requestID)
+
+        def resolve(manager, response):
+            if not future.done():
+                future.set_result(response)
+                pass
+            return
+
+        self.callbacks[requestID] = resolve
+        try:
+            self.send(self.encodeRequest(msg), remote)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.callbacks.pop(requestID, None)
+            pass
+
+    async def throttle(self):
+        """ Wait until the rate limit allows another request, taking
+            it from the allowance queued requests are sent from too
+        """
+        while not self.rateLimit.allowance():
+            await asyncio.sleep(self.rateLimit.delay())
+            pass
+        self.rateLimit.spend(1)
+        return
+
+    def versionModule(self, version):
+        """ The module with the message types of version
+        """
+        if version == 1:
+            return rfc1157
+        elif version == 2:
+            return rfc1905
+        raise ValueError('Unknown version %d' % version)
+
+    def createVarBindList(self, oids, version=2):
+        """ A varbindlist of Nulls, as requests send, for an oid or a
+            list of them
+        """
+        module = self.versionModule(version)
+        if isinstance(oids, (str, rfc1155.ObjectID)):
+            oids = [oids]
+            pass
+        return module.VarBindList([module.VarBind(module.ObjectID(oid), module.Null()) for oid in oids])
+
     def snmpTrap(self, remote, trapPDU, community='public', version=2):
         """ Queue up a trap for sending
         """
         msg = self.createTrapMessage(trapPDU, community, version)
 
-        self.outbound.put((msg, remote))
+        self.queueRequest(msg, remote)
 
     def receiveData(self, manager, cb_ctx, data_src_tuple, exc_tuple):
         """ This method should be called when data is received
@@ -260,12 +431,29 @@ class snmpManager(asynrole.Manager):
         if exc_type is not None:
             raise exc_type(exc_value)
 
+        # Look at the header first, so that only messages someone is
+        # waiting for get decoded
+        try:
+            header = rfc1157.peekHeader(data)
+        except (rfc1157.MessageError, rfc1157.PDUError, ValueError) as exc:
+            log.info('Dropping malformed message from %s: %s' % (src, exc))
+            return
+
+        if not self.wantMessage(header):
+            if __debug__: log.debug('Dropping unsolicited message from %s, requestID %s' % (src, header[3]))
+            return
+
+        rawCallback = self.rawCallbacks.pop(header[3], None)
+        if rawCallback is not None:
+            rawCallback(self, data)
+            return
+
         # perform the action on the message by calling the
         # callback from my list of callbacks, passing it the
         # message and a reference to myself
 
-        # Decode the data into a message
-        msg = rfc1905.Message().decode(data)
+        # Decode the data into a message of its version
+        msg = self.messageTypes[header[0]]().decode(data, lazy=self.lazyDecode)
 
         # Decode it based on what version of message it is
         if msg.version == 0:
@@ -281,6 +469,23 @@ class snmpManager(asynrole.Manager):
             log.error('version is a %s' % msg.version())
             raise ValueError('Unknown message version %d detected' % msg.version)
 
+    def wantMessage(self, header):
+        """ Decide from the (version, community, pduTag, requestID)
+            returned by rfc1157.peekHeader() whether a message is
+            worth decoding: a trap when there is a trapCallback, or
+            anything else with a requestID that has a callback
+            waiting.  Late and duplicate responses have had their
+            callback removed already.
+        """
+        (version, community, pduTag, requestID) = header
+        if version not in (0, 1):
+            return False
+
+        if pduTag in (0xa4, 0xa7):
+            return self.trapCallback is not None
+
+        return requestID in self.callbacks or requestID in self.rawCallbacks
+
     def handleV1Message(self, msg):
         """ Handle reception of an SNMP version 1 message 
         """
@@ -300,15 +505,20 @@ class snmpManager(asynrole.Manager):
     def handleV2Message(self, msg):
         """ Handle reception of an SNMP version 2c message
         """
-        if isinstance(msg.data, rfc1905.PDU):
+        ## A TrapV2 is laid out like any other PDU, so check for it first
+        if isinstance(msg.data, rfc1905.TrapV2):
+            self.trapCallback(self, msg)
+
+        ## v2.SNMP.createTrap() sends SNMPv1 Traps in SNMPv2c messages
+        elif isinstance(msg.data, rfc1157.TrapPDU):
+            self.trapCallback(self, msg)
+
+        elif isinstance(msg.data, rfc1905.PDU):
             self.callbacks[msg.data.requestID](self, msg)
 
             ## remove the callback from my list once it's done
             del self.callbacks[msg.data.requestID]
 
-        elif isinstance(msg.data, rfc1905.TrapPDU):
-            self.trapCallback(self, msg)
-
         else:
             log.info('Unknown SNMPv2 Message type received')
         pass
@@ -325,21 +535,130 @@ class snmpManager(asynrole.Manager):
         and send pending requests
         """
         while 1:
-            try:
-                # check for inbound messages
-                self.poll()
+            # check for inbound messages, for as long as there's
+            # nothing to send
+            self.poll(self.sendDelay())
+
+            self.flushOutbound()
+            pass
+
+    async def serve(self):
+        """ Send the requests queued on outbound as they're queued,
+            as a task on the loop the manager was given
+        """
+        while True:
+            self.flushOutbound()
+
+            await self.idle(self.sendDelay())
+            pass
+
+    def queueRequest(self, msg, remote):
+        """ Queue a message, or an encoded request, to be sent to
+            remote, waking run() or serve() to send it
+        """
+        self.outbound.put((msg, remote))
+        self.notify()
+        return
+
+    def flushOutbound(self):
+        """ Send up to a batch of the queued requests, as many as the
+            rate limit allows, leaving the rest for the next pass, or
+            if there are none, call queueEmpty.  Nothing is sent while
+            the socket's send buffer is full.
+        """
+        if self.sendBlocked:
+            return
+
+        count = self.manager.batchSize
+        if self.rateLimit is not None:
+            count = min(count, self.rateLimit.allowance())
+            pass
+        requests = self.takeOutbound(count)
+
+        if requests:
+            sent = self.sendMany(requests)
+            if self.rateLimit is not None:
+                self.rateLimit.spend(sent)
+                pass
+        elif self.queueEmpty and self.outbound.empty():
+            self.queueEmpty(self)
+            pass
+        return
+
+    def sendDelay(self):
+        """ How long to wait for responses before sending again: not
+            at all if requests are queued, unless the rate limit says
+            otherwise, and timeout seconds if none are or the send
+            buffer is full, it waking poll() once it has room
+        """
+        if self.outbound.empty() or self.sendBlocked:
+            return self.timeout
+        if self.rateLimit is None:
+            return 0
+        return min(self.timeout, self.rateLimit.delay())
+
+    def takeOutbound(self, count=None):
+        """ Take up to count requests off the outbound queue, or all
+            of them, without waiting for more
+        """
+        requests = []
+        try:
+            while count is None or len(requests) < count:
+                requests.append(self.outbound.get(0))
+                pass
+        except queue.Empty:
+            pass
+        return requests
 
-                # send any pending outbound messages
-                request = self.outbound.get(0)
-                self.send(request[0].encode(), request[1])
+    def requeue(self, requests):
+        """ Put requests taken off the outbound queue back at the
+            front of it, in the same order
+        """
+        with self.outbound.mutex:
+            self.outbound.queue.extendleft(reversed(requests))
+            pass
+        return
+
+    def encodeRequest(self, msg):
+        """ Encode a queued message, unless it was queued already
+            encoded, as a rendered RequestTemplate is
+        """
+        if isinstance(msg, (bytes, bytearray)):
+            return msg
+        return msg.encode()
+
+    def encodeMany(self, messages):
+        """ Encode a batch of messages, or already encoded requests,
+            into one shared buffer, returning a memoryview of each.
+            The buffer is reused by the next batch once the views of
+            this one are no longer held.
+        """
+        return self.batchEncoder.encodeMany(messages)
 
-            except queue.Empty:
-                if self.queueEmpty:
-                    self.queueEmpty(self)
+    def sendMany(self, requests):
+        """ Encode and send a batch of (message, remote) requests,
+            as taken from the outbound queue, returning how many were
+            sent.  Those the socket had no room for go back on the
+            queue.
+        """
+        (buf, ends) = self.batchEncoder.encodeEnds([request[0] for request in requests])
+        with memoryview(buf) as view:
+            datagrams = []
+            pos = 0
+            for (end, request) in zip(ends, requests):
+                datagrams.append((view[pos:end], request[1]))
+                pos = end
                 pass
+            sent = self.sendDatagrams(datagrams)
+            for (datagram, remote) in datagrams:
+                datagram.release()
+                pass
+            pass
 
-            except:
-                raise
+        if sent < len(requests):
+            self.requeue(requests[sent:])
+            pass
+        return sent
 
     def getSysUptime(self):
         """ This is a pain because of system dependence
@@ -366,3 +685,173 @@ class snmpManager(asynrole.Manager):
         values if you're calling snmpSet programmatically.
         """
         return typeValDict[typestring]
+
+
+class RateLimit:
+    """ A token bucket, allowing rate requests a second on average,
+        in bursts of up to burst, by default a second's worth
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = burst or max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.stamp = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return
+
+    def allowance(self):
+        """ How many requests may be sent now
+        """
+        self.refill()
+        return int(self.tokens)
+
+    def spend(self, count):
+        self.tokens -= count
+        return
+
+    def delay(self):
+        """ How long until another request may be sent
+        """
+        self.refill()
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    pass
+
+
+class Walk:
+    """ The state of a walk started by snmpManager.snmpWalk().
+
+        Each response is checked on the encoded names of its
+        varbinds: only the ones beneath the root get decoded and
+        handed to the callback, and the first one past the end of the
+        subtree ends the walk without being decoded at all.  A walk
+        that finds nothing beneath the root ends with a Get of the
+        root, which may be a scalar.
+    """
+
+    def __init__(self, oid, remote, callback, community='public', version=2, whenDone=None):
+        self.root = rfc1155.ObjectID(oid)
+        self.rootOctets = rfc1155.cachedEncodeSubIDs(self.root.value)
+        self.remote = remote
+        self.callback = callback
+        self.community = community
+        self.version = version
+        self.whenDone = whenDone
+
+        # Encoded name of the last varbind, to check the agent is
+        # moving forwards
+        self.lastOctets = self.rootOctets
+
+        self.count = 0
+        self.finished = False
+        self.error = None
+
+    def next(self, manager, oid):
+        """ Queue the GetNext for the varbind after oid
+        """
+        module = self.version == 1 and rfc1157 or rfc1905
+        varbindlist = module.VarBindList([module.VarBind(oid, module.Null())])
+        msg = manager.createGetNextRequestMessage(varbindlist, self.community, self.version)
+
+        manager.rawCallbacks[int(msg.data.requestID)] = self.response
+        manager.queueRequest(msg, self.remote)
+        return
+
+    def response(self, manager, data):
+        """ Handle the encoded response to a GetNext
+        """
+        stream = rfc1155.octetStream(data)
+        (errorStatus, errorIndex, start, end) = rfc1157.locateResponse(stream)
+
+        ## An SNMPv1 agent says noSuchName past the end of its MIB
+        if errorStatus == 2 and self.version == 1:
+            return self.end(manager)
+        elif errorStatus != 0:
+            return self.finish(manager, 'Error status %d at index %d' % (errorStatus, errorIndex))
+
+        decoders = (self.version == 1 and rfc1157 or rfc1905).codec.decoders
+        name = None
+        for offsets in rfc1157.iterVarBindOffsets(stream, start, end):
+            (nameStart, nameEnd, valueTag, valueStart, valueEnd) = offsets
+            octets = stream[nameStart:nameEnd]
+            if not rfc1155.isEncodedPrefix(self.rootOctets, octets):
+                if rfc1155.isPastSubtree(self.rootOctets, octets):
+                    return self.end(manager)
+                return self.finish(manager, 'OID not increasing')
+
+            ## noSuchObject, noSuchInstance and endOfMibView
+            if valueTag in (0x80, 0x81, 0x82):
+                return self.end(manager)
+
+            if rfc1155.compareEncodedOIDs(octets, self.lastOctets) <= 0:
+                return self.finish(manager, 'OID not increasing')
+            self.lastOctets = octets
+
+            (name, value) = rfc1157.decodeVarBindOffsets(stream, offsets, decoders)
+            self.count += 1
+            self.callback(manager, rfc1157.VarBind(name, value))
+            pass
+
+        if name is None:
+            return self.finish(manager, 'Empty response')
+
+        self.next(manager, name)
+        return
+
+    def end(self, manager):
+        """ The walk has run past the subtree.  If it found nothing
+            in it, Get the root itself.
+        """
+        if self.count:
+            return self.finish(manager)
+
+        msg = manager.createGetRequestMessage(self.root, self.community, self.version)
+        manager.rawCallbacks[int(msg.data.requestID)] = self.rootResponse
+        manager.queueRequest(msg, self.remote)
+        return
+
+    def rootResponse(self, manager, data):
+        """ Handle the encoded response to the Get of the root
+        """
+        stream = rfc1155.octetStream(data)
+        (errorStatus, errorIndex, start, end) = rfc1157.locateResponse(stream)
+
+        ## An SNMPv1 agent says noSuchName for an object it hasn't got
+        if errorStatus == 2 and self.version == 1:
+            return self.finish(manager)
+        elif errorStatus != 0:
+            return self.finish(manager, 'Error status %d at index %d' % (errorStatus, errorIndex))
+
+        decoders = (self.version == 1 and rfc1157 or rfc1905).codec.decoders
+        for offsets in rfc1157.iterVarBindOffsets(stream, start, end):
+            (nameStart, nameEnd, valueTag, valueStart, valueEnd) = offsets
+
+            ## noSuchObject, noSuchInstance and endOfMibView, or a name
+            ## the agent should not have answered with
+            if valueTag in (0x80, 0x81, 0x82) or stream[nameStart:nameEnd] != self.rootOctets:
+                continue
+
+            (name, value) = rfc1157.decodeVarBindOffsets(stream, offsets, decoders)
+            self.count += 1
+            self.callback(manager, rfc1157.VarBind(name, value))
+            pass
+
+        return self.finish(manager)
+
+    def finish(self, manager, error=None):
+        if error is not None:
+            log.info('Walk of %s ended: %s' % (self.root, error))
+            pass
+        self.error = error
+        self.finished = True
+        if self.whenDone is not None:
+            self.whenDone(manager, self)
+            pass
+        return
@@ -9,22 +9,24 @@
 import queue
 import time
 
-from libsnmp import asynrole
+from libsnmp import aiorole
 from libsnmp.rfc1157 import *
 
 log = logging.getLogger('v1.SNMP')
 log.setLevel(logging.INFO)
 
 
-class SNMP(asynrole.Manager):
+class SNMP(aiorole.Manager):
     nextRequestID = 0  # global counter of requestIDs
 
-    def __init__(self, interface=('0.0.0.0', 0), queueEmpty=None, trapCallback=None, timeout=0.25):
+    def __init__(self, interface=('0.0.0.0', 0), queueEmpty=None, trapCallback=None, timeout=0.25, loop=None,
+                 batchSize=None, reusePort=False):
         """ Create a new SNMPv1 object bound to localaddr
             where localaddr is an address tuple of the form
             ('server', port)
             queueEmpty is a callback of what to do if I run out
             of stuff to do. Default is to wait for more stuff.
+            batchSize and reusePort are passed on to aiorole.Manager.
         """
         self.queueEmpty = queueEmpty
         self.outbound = queue.Queue()
@@ -33,8 +35,9 @@ class SNMP(asynrole.Manager):
         # What to do if we get a trap
         self.trapCallback = trapCallback
 
-        # initialise as an asynrole manager
-        asynrole.Manager.__init__(self, (self.receiveData, None), interface=interface, timeout=timeout)
+        # initialise as an aiorole manager
+        aiorole.Manager.__init__(self, (self.receiveData, None), interface=interface, timeout=timeout, loop=loop,
+                                 batchSize=batchSize, reusePort=reusePort)
 
         try:
             # figure out the current system uptime
@@ -8,47 +8,17 @@ import sys
 import logging
 
 from libsnmp import snmpmanager
-from libsnmp import util
+from libsnmp import formatting
 
 
 log = logging.getLogger(__name__)
 
-def checkResponse(snmpClient, msg):
-    """ Quick and dirty print of what the message contains
-    """
-    pdu = msg.data
-
-    if int(pdu.errorStatus) != 0:
-        print('Error: %s' % pdu.errorStatus)
-    else:
-        unwrapVarBinds(pdu.varBindList)
-
-        myClient.snmpGetNext(pdu.varBindList, remotesite, checkResponse, community=args[1])
-
-
-def unwrapVarBinds(varBindList):
-    """ Display a set of varbinds
-    """
-    #    print '%s' % varBindList
-    #    print '%s' % varBindList[0].objectID
-    #    print '%s' % varBindList[0].objectValue.value
-
-    print('%s = %s: %s' % (
-    varBindList[0].objectID, varBindList[0].objectValue.__class__.__name__, varBindList[0].objectValue))
-    if varBindList[0].objectValue.__class__.__name__ == 'OctetString':
-        print("   hex: %s" % util.octetsToHex(varBindList[0].objectValue.value))
-
-    if varBindList[0].objectValue.__class__.__name__ == 'NoSuchObject':
-        log.error("No such object!")
-        sys.exit(0)
-
-    if varBindList[0].objectValue.__class__.__name__ == 'EndOfMibView':
-        log.info("End of MIB View")
-        sys.exit(0)
-
-
 # What to do when we finish
-def whenDone(snmpClient):
+def whenDone(snmpClient, walk):
+    printVarBind.flush()
+    if walk.error is not None:
+        log.error('Walk failed: %s' % walk.error)
+        sys.exit(1)
     sys.exit(0)
 
 
@@ -57,14 +27,17 @@ def whenDone(snmpClient):
 # Read command line
 options, args = getopt.getopt(sys.argv[1:], '', [])
 
+# Print each varbind as the walk finds it
+printVarBind = formatting.WalkFormatter(sys.stdout, showHex=True)
+
 # Probably replace with something that assigns a random port
-myClient = snmpmanager.snmpManager(whenDone)
+myClient = snmpmanager.snmpManager()
 
 if len(args) != 3:
-    print("Usage: snmpget.py <server> <community> <oid>")
+    print("Usage: snmpwalk.py <server> <community> <oid>")
     sys.exit(1)
 else:
     remotesite = (args[0], 161)
-    myClient.snmpGet(args[2], remotesite, checkResponse, community=args[1])
+    myClient.snmpWalk(args[2], remotesite, printVarBind, community=args[1], whenDone=whenDone)
 
 myClient.run()
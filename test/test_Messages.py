@@ -32,6 +32,7 @@ from libsnmp import util
 from libsnmp import debug
 from libsnmp import rfc1155
 from libsnmp import rfc1157
+from libsnmp import rfc1905
 
 class MessagesTest(unittest.TestCase):
 
@@ -60,6 +61,72 @@ class MessagesTest(unittest.TestCase):
 
         self.log.debug('decoded message: %s' % msg)
 
+    def test_versionCodecs(self):
+        """ Test each version of message decodes into its own types,
+            whatever has been imported
+        """
+        varbinds = [ rfc1157.VarBind( rfc1155.ObjectID('.1.3.6.1.2.1.2.2.1.3.1'), rfc1155.Integer(6) ) ]
+        pdu = rfc1157.Response(7, varBindList=rfc1157.VarBindList(varbinds))
+        octets = rfc1157.Message(data=pdu).encode()
+
+        msg = rfc1157.Message().decode(octets)
+        self.assertIs(type(msg.data), rfc1157.Response)
+        self.assertIs(type(msg.data.varBindList[0].objectValue), rfc1155.Integer)
+
+        # the same octets, read as SNMPv2c
+        msg = rfc1905.Message().decode(octets)
+        self.assertIs(type(msg.data), rfc1905.Response)
+        self.assertIs(type(msg.data.varBindList[0].objectValue), rfc1905.Integer32)
+
+        lazy = rfc1905.Message().decode(octets, lazy=True)
+        self.assertIs(type(lazy.data.varBindList[0].objectValue), rfc1905.Integer32)
+
+        # nothing was added to the table Asn1Object.decode() uses
+        self.assertIs(rfc1155.tagDecodeDict[0x02], rfc1155.Integer)
+        self.assertFalse(0xa2 in rfc1155.tagDecodeDict)
+        self.assertFalse('Get' in rfc1155.asnTagNumbers)
+
+        # and SNMPv2 types are unknown to SNMPv1
+        self.assertIs(rfc1905.codec.types[0x82], rfc1905.EndOfMibView)
+        self.assertFalse(0x82 in rfc1157.codec.types)
+        self.assertRaises(ValueError, rfc1157.codec.decode, rfc1905.EndOfMibView().encode())
+
+    def test_v1TrapInV2cMessage(self):
+        """ Test the SNMPv1 Trap v2.SNMP sends in SNMPv2c messages
+            decodes
+        """
+        varbinds = [ rfc1157.VarBind( rfc1155.ObjectID('.1.3.6.1.4.5.6.7'), rfc1155.OctetString('hello') ) ]
+        pdu = rfc1157.TrapPDU(rfc1155.ObjectID('.1.3.6.1.4'), rfc1155.NetworkAddress('127.0.0.1'),
+                              rfc1157.GenericTrap(6), rfc1155.Integer(3), rfc1155.TimeTicks(100),
+                              rfc1157.VarBindList(varbinds))
+        msg = rfc1905.Message().decode(rfc1905.Message(data=pdu).encode())
+        self.assertIsInstance(msg.data, rfc1157.TrapPDU)
+        self.assertEqual(msg.data.specificTrap.value, 3)
+        self.assertEqual(msg.data.varBindList[0].objectValue.value, b'hello')
+
+    def test_codecRegistry(self):
+        """ Test registries are fixed once built, and derive() leaves
+            the original alone
+        """
+        codec = rfc1157.codec
+        def replace():
+            codec.types[0x02] = rfc1905.Integer32
+        self.assertRaises(TypeError, replace)
+
+        derived = codec.derive('test', {0x02: rfc1905.Integer32})
+        self.assertIs(derived.types[0x02], rfc1905.Integer32)
+        self.assertIs(codec.types[0x02], rfc1155.Integer)
+        self.assertIs(type(derived.decode(b'\002\001\005')[0]), rfc1905.Integer32)
+        self.assertIs(type(codec.decode(b'\002\001\005')[0]), rfc1155.Integer)
+
+    def test_errorStatus(self):
+        """ Test SNMPv2 error strings don't leak into SNMPv1
+        """
+        self.assertEqual(str(rfc1905.ErrorStatus(17)), '17: Not Writable')
+        self.assertEqual(rfc1905.ErrorStatus.errNum['notWritable'], 17)
+        self.assertFalse(17 in rfc1157.ErrorStatus.errString)
+        self.assertFalse('notWritable' in rfc1157.ErrorStatus.errNum)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,187 @@
+import asyncio
+import socket
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from libsnmp import role
+from libsnmp.aiorole import Manager
+
+
+class TestManager(unittest.TestCase):
+
+    def setUp(self):
+        self.received = []
+        self.cb_ctx = MagicMock()
+        self.interface = ('127.0.0.1', 0)
+        self.timeout = 0.25
+
+        self.manager = Manager((self.cb_fun, self.cb_ctx), interface=self.interface, timeout=self.timeout)
+        self.address = self.manager.transport.get_extra_info('sockname')
+
+        self.sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sender.bind(('127.0.0.1', 0))
+        self.sender.settimeout(2)
+
+    def tearDown(self):
+        self.manager.close()
+        self.sender.close()
+
+    def cb_fun(self, manager, cb_ctx, data_src_tuple, exc_tuple):
+        self.received.append((manager, cb_ctx, data_src_tuple, exc_tuple))
+
+    def test_init_valid_parameters(self):
+        self.assertEqual(self.manager.cb_ctx, self.cb_ctx)
+        self.assertEqual(self.manager.timeout, self.timeout)
+        self.assertIsInstance(self.manager.manager, role.manager)
+
+    def test_init_invalid_callback_function(self):
+        with self.assertRaises(ValueError):
+            Manager((None, self.cb_ctx), interface=self.interface)
+
+    def test_send(self):
+        self.manager.send(b'request', self.sender.getsockname())
+        self.assertEqual(self.sender.recvfrom(65536), (b'request', self.address))
+
+    def test_poll_dispatches_on_arrival(self):
+        self.sender.sendto(b'response', self.address)
+        start = time.monotonic()
+        self.manager.poll()
+        self.assertLess(time.monotonic() - start, self.timeout)
+        self.assertEqual(self.received, [(self.manager, self.cb_ctx, (b'response', self.sender.getsockname()),
+                                          (None, None, None))])
+
+    def test_poll_timeout(self):
+        start = time.monotonic()
+        self.manager.poll()
+        self.assertGreaterEqual(time.monotonic() - start, self.timeout * 0.9)
+        self.assertEqual(self.received, [])
+
+    def test_poll_raises_callback_errors(self):
+        self.manager.cb_fun = MagicMock(side_effect=RuntimeError('broken'))
+        self.sender.sendto(b'response', self.address)
+        with self.assertRaises(RuntimeError):
+            self.manager.poll()
+
+        # ValueErrors are handed back to the callback first, as asynrole does
+        calls = []
+
+        def cb_fun(manager, cb_ctx, data_src_tuple, exc_tuple):
+            calls.append(exc_tuple[0])
+            if exc_tuple[0] is None:
+                raise ValueError('malformed')
+
+        self.manager.cb_fun = cb_fun
+        self.sender.sendto(b'response', self.address)
+        self.manager.poll()
+        self.assertEqual(calls, [None, ValueError])
+
+    def test_shared_loop(self):
+        """ Test managers made on a running loop dispatch as datagrams
+            arrive, without poll()
+        """
+        async def exchange():
+            loop = asyncio.get_running_loop()
+            done = loop.create_future()
+            ctx = object()
+            replies = []
+
+            def reply(manager, cb_ctx, data_src_tuple, exc_tuple):
+                replies.append(data_src_tuple[0])
+                if len(replies) == 2:
+                    done.set_result(cb_ctx)
+
+            managers = [Manager((reply, ctx), interface=self.interface, loop=loop) for i in range(2)]
+            try:
+                # sent before the endpoints are made, and received after
+                for manager in managers:
+                    manager.send(b'ping', manager.manager.socket.getsockname())
+                    pass
+                self.assertIs(await asyncio.wait_for(done, 2), ctx)
+                self.assertTrue(all(manager.transport for manager in managers))
+            finally:
+                for manager in managers:
+                    manager.close()
+            return replies
+
+        self.assertEqual(asyncio.run(exchange()), [b'ping', b'ping'])
+
+    def test_close(self):
+        loop = self.manager.loop
+        self.manager.close()
+        self.assertTrue(loop.is_closed())
+        self.assertIsNone(self.manager.transport)
+        self.manager.close()
+
+
+class TestBatchedManager(unittest.TestCase):
+    """ Test the batched mode, through recvmmsg() and sendmmsg() where
+        there are, and through the loop that stands in for them
+    """
+
+    def setUp(self):
+        self.received = []
+        self.manager = Manager((self.cb_fun, None), interface=('127.0.0.1', 0), timeout=0.25, batchSize=4)
+        self.address = self.manager.manager.socket.getsockname()
+
+        self.peer = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.peer.bind(('127.0.0.1', 0))
+        self.peer.settimeout(2)
+
+    def tearDown(self):
+        self.manager.close()
+        self.peer.close()
+
+    def cb_fun(self, manager, cb_ctx, data_src_tuple, exc_tuple):
+        self.received.append(data_src_tuple)
+
+    def exchange(self):
+        datagrams = [ (b'request %d' % i, self.peer.getsockname()) for i in range(10) ]
+        self.manager.sendDatagrams(datagrams)
+        self.assertEqual([ self.peer.recvfrom(65536) for i in range(10) ],
+                         [ (request, self.address) for (request, dst) in datagrams ])
+
+        for i in range(6):
+            self.peer.sendto(b'response %d' % i, self.address)
+            pass
+        time.sleep(0.05)
+
+        # no more than a batch at a time
+        self.assertEqual(len(self.manager.manager.readMany(2)), 2)
+        while len(self.received) < 4:
+            self.manager.poll()
+            pass
+        self.assertEqual(self.received, [ (b'response %d' % i, self.peer.getsockname()) for i in range(2, 6) ])
+        self.assertEqual(self.manager.manager.readMany(), [])
+
+    @unittest.skipIf(role.recvmmsg is None, 'No recvmmsg() here')
+    def test_mmsg(self):
+        self.exchange()
+
+    def test_fallback(self):
+        with patch.object(role, 'recvmmsg', None), patch.object(role, 'sendmmsg', None):
+            self.exchange()
+
+    @unittest.skipIf(role.sendmmsg is None, 'No sendmmsg() here')
+    def test_sendBuffers(self):
+        """ Test writable, read only and bytes requests all send
+        """
+        data = bytearray(b'abcdef')
+        datagrams = [ (memoryview(data)[2:4], self.peer.getsockname()),
+                      (memoryview(b'xyz'), self.peer.getsockname()),
+                      (b'', self.peer.getsockname()) ]
+        self.assertEqual(self.manager.manager.sendMany(datagrams), 3)
+        self.assertEqual([ self.peer.recvfrom(65536)[0] for i in range(3) ], [b'cd', b'xyz', b''])
+
+        # nothing but the test's own view still holds the buffer
+        datagrams[0][0].release()
+        data.extend(b'g')
+
+    def test_close(self):
+        self.manager.close()
+        self.assertIsNone(self.manager.manager.socket)
+        self.assertTrue(self.manager.loop.is_closed())
+
+
+if __name__ == '__main__':
+    unittest.main()
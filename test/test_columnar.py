@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# $Id$
+# $Revision$
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Unit tests for the NumPy columnar decoder
+
+import unittest
+
+import sys
+sys.path.append('../lib')
+
+from libsnmp import rfc1155
+from libsnmp import rfc1902
+from libsnmp import rfc1905
+from libsnmp import columnar
+
+ifInOctets = '.1.3.6.1.2.1.2.2.1.10'
+ifHCInOctets = '.1.3.6.1.2.1.31.1.1.1.6'
+
+
+def encodeResponse(varbinds):
+    pdu = rfc1905.Response(1, varBindList=rfc1905.VarBindList(varbinds))
+    return rfc1905.Message(data=pdu).encode()
+
+
+def varbind(oid, value):
+    return rfc1905.VarBind(rfc1155.ObjectID(oid), value)
+
+
+class ColumnarTest(unittest.TestCase):
+
+    @unittest.skipIf(columnar.numpy is None, 'NumPy is not installed')
+    def test_counterColumn(self):
+        """ Test decoding a Counter32 column from several responses
+        """
+        counts = [0, 1, 127, 128, 255, 256, 0x7fffffff, 0x80000000, 0xffffffff]
+        varbinds = [ varbind('%s.%d' % (ifInOctets, index + 1), rfc1902.Counter32(count))
+                     for index, count in enumerate(counts) ]
+
+        # the next column, where a walk overshoots, and the end of the MIB
+        varbinds.append(varbind('.1.3.6.1.2.1.2.2.1.11.1', rfc1902.Counter32(5)))
+        varbinds.append(varbind('%s.100' % ifInOctets, rfc1905.EndOfMibView()))
+
+        responses = [encodeResponse(varbinds[:4]), encodeResponse(varbinds[4:])]
+        (suffixes, values) = columnar.decodeNumericColumn(responses, ifInOctets)
+
+        self.assertEqual(values.dtype, columnar.numpy.uint64)
+        self.assertEqual(values.tolist(), counts)
+        self.assertEqual(suffixes.dtype, columnar.numpy.uint32)
+        self.assertEqual(suffixes.tolist(), [ [index + 1] for index in range(len(counts)) ])
+
+    @unittest.skipIf(columnar.numpy is None, 'NumPy is not installed')
+    def test_counter64Column(self):
+        """ Test 64 bit counters keep every bit
+        """
+        counts = [0, 0xffffffff, 0x100000000, 0x7fffffffffffffff, 0xffffffffffffffff]
+
+        varbinds = [ varbind('%s.%d' % (ifHCInOctets, index + 1), rfc1902.Counter64(count))
+                     for index, count in enumerate(counts) ]
+        responses = [encodeResponse(varbinds)]
+
+        (suffixes, values) = columnar.decodeNumericColumn(responses, ifHCInOctets)
+        self.assertEqual(values.tolist(), counts)
+        self.assertEqual(suffixes[:, 0].tolist(), [1, 2, 3, 4, 5])
+
+    @unittest.skipIf(columnar.numpy is None, 'NumPy is not installed')
+    def test_integerColumn(self):
+        """ Test Integers decode into a signed array, and suffixes of
+            different lengths into an array of tuples
+        """
+        numbers = [0, -1, 127, -128, 128, -129, 2147483647, -2147483648]
+        varbinds = [ varbind('.1.3.6.1.4.1.9.%d.1' % index + '.1' * index, rfc1902.Integer32(number))
+                     for index, number in enumerate(numbers) ]
+
+        (suffixes, values) = columnar.decodeNumericColumn(encodeResponse(varbinds), '.1.3.6.1.4.1.9')
+        self.assertEqual(values.dtype, columnar.numpy.int64)
+        self.assertEqual(values.tolist(), numbers)
+        self.assertEqual(suffixes[3], (3, 1, 1, 1, 1))
+
+    @unittest.skipIf(columnar.numpy is None, 'NumPy is not installed')
+    def test_negativeCounter(self):
+        """ Test Counters some agents encode as negative read as
+            unsigned 32 bit numbers, as they do in a Counter
+        """
+        octets = encodeResponse([varbind('%s.1' % ifInOctets, rfc1902.Integer32(-2))])
+        octets = octets[:-3] + b'\101' + octets[-2:]
+
+        (suffixes, values) = columnar.decodeNumericColumn(octets, ifInOctets)
+        expected = rfc1155.Asn1Object().decode(b'\101\001\376')[0].value
+        self.assertEqual(values.tolist(), [expected])
+
+    @unittest.skipIf(columnar.numpy is None, 'NumPy is not installed')
+    def test_emptyColumn(self):
+        """ Test a walk that found nothing
+        """
+        octets = encodeResponse([varbind('%s.1' % ifInOctets, rfc1905.NoSuchObject())])
+        (suffixes, values) = columnar.decodeNumericColumn(octets, ifInOctets)
+        self.assertEqual(len(values), 0)
+        self.assertEqual(len(suffixes), 0)
+
+    @unittest.skipIf(columnar.numpy is None, 'NumPy is not installed')
+    def test_shortName(self):
+        """ Test a name shorter than the prefix is skipped, even when
+            the octets after it match the rest of the prefix
+        """
+        octets = encodeResponse([varbind('.1.3.6.1', rfc1902.Integer32(5)),
+                                 varbind('.1.3.6.1.2.7', rfc1902.Integer32(6))])
+        (suffixes, values) = columnar.decodeNumericColumn(octets, '.1.3.6.1.2')
+        self.assertEqual(values.tolist(), [6])
+        self.assertEqual(suffixes.tolist(), [[7]])
+
+    @unittest.skipIf(columnar.numpy is not None, 'NumPy is installed')
+    def test_withoutNumpy(self):
+        """ Test the columnar decoder says why it can't work
+        """
+        octets = encodeResponse([varbind('%s.1' % ifInOctets, rfc1902.Counter32(1))])
+        self.assertRaises(ImportError, columnar.decodeNumericColumn, octets, ifInOctets)
+
+
+if __name__ == '__main__':
+    unittest.main()
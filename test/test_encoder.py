@@ -31,45 +31,47 @@ sys.path.append('../lib')
 from libsnmp import util
 from libsnmp import debug
 from libsnmp import rfc1155
+from libsnmp import rfc1902
 
 # Some integer encodings to check
 test_integers = {
-    0:          '\000',
-    5:          '\005',
-    15:         '\017',
-    73:         '\111',
-    128:        '\000\200',
-    -127:        '\201',
-    -128:        '\200',
-    124787:     '\001\347\163',
-    -1:         '\377',
-    -267:       '\376\365',
-    -5848548:   '\246\302\034'
+    0:          b'\000',
+    5:          b'\005',
+    15:         b'\017',
+    73:         b'\111',
+    128:        b'\000\200',
+    -127:        b'\201',
+    -128:        b'\200',
+    124787:     b'\001\347\163',
+    -1:         b'\377',
+    -129:       b'\377\177',
+    -267:       b'\376\365',
+    -5848548:   b'\246\302\034'
 }
 
 # octetstrings are simple, since they stay as they are
 test_octetstrings = [
-    'fred',
-    'the small frog sat in the well',
-    '43 403i 594 5908kjljdfj weljf',
-    'This is a unicode string',
-    'This is another unicode string',
+    b'fred',
+    b'the small frog sat in the well',
+    b'43 403i 594 5908kjljdfj weljf',
+    b'This is a unicode string',
+    b'This is another unicode string',
 ]
 
 test_objectids = {
-    '.1.2.4.5.6':                    '\052\004\005\006',
-    '1.2.4.5.6':                     '\052\004\005\006',    
-    '.2.3.3':                        '\123\003',
-    '.0.2.8.5':                      '\002\010\005',
-    '0.2.8.5':                       '\002\010\005',    
-    '.1.2.65.7.3394.23.5.115.46':    '\052\101\007\232\102\027\005\163\056'
+    '.1.2.4.5.6':                    b'\052\004\005\006',
+    '1.2.4.5.6':                     b'\052\004\005\006',    
+    '.2.3.3':                        b'\123\003',
+    '.0.2.8.5':                      b'\002\010\005',
+    '0.2.8.5':                       b'\002\010\005',    
+    '.1.2.65.7.3394.23.5.115.46':    b'\052\101\007\232\102\027\005\163\056'
 }
 
 test_sequences = {
-    '\002\001\016':         [ rfc1155.Integer(14), ],
-    '\002\002\006\321':         [ rfc1155.Integer(1745), ],
-    '\002\001\077\005\000':         [ rfc1155.Integer(63), rfc1155.Null() ], 
-    '\006\006\051\006\005\054\003\005\004\004\142\154\141\150\002\003\001\202\037':         [ rfc1155.ObjectID('.1.1.6.5.44.3.5'), rfc1155.OctetString('blah'), rfc1155.Integer(98847) ]
+    b'\002\001\016':         [ rfc1155.Integer(14), ],
+    b'\002\002\006\321':         [ rfc1155.Integer(1745), ],
+    b'\002\001\077\005\000':         [ rfc1155.Integer(63), rfc1155.Null() ], 
+    b'\006\006\051\006\005\054\003\005\004\004\142\154\141\150\002\003\001\202\037':         [ rfc1155.ObjectID('.1.1.6.5.44.3.5'), rfc1155.OctetString('blah'), rfc1155.Integer(98847) ]
 
 }
 
@@ -87,22 +89,22 @@ test_ipaddresses = {
 
 test_octets = {
     # A fully encoded integer
-    '\002\001\005':         [5, ],
+    b'\002\001\005':         [5, ],
     # Another fully encoded integer
-    '\002\003\001\347\163': [124787, ],
+    b'\002\003\001\347\163': [124787, ],
     # three integers
-    '\002\003\246\302\034\002\003\001\347\163\002\001\337': [-5848548, 124787, -1],
+    b'\002\003\246\302\034\002\003\001\347\163\002\001\337': [-5848548, 124787, -1],
 
     # a simple octet string
-    '\004\036the small frog sat in the well':   ['the small frog sat in the well'],
+    b'\004\036the small frog sat in the well':   [b'the small frog sat in the well'],
 
     # some object IDs
-    '\006\002\123\003':                 [ [2, 3, 3], ],
-    '\006\004\052\004\005\006':         [ [1, 2, 4, 5, 6], ],
-    '\006\011\052\101\007\232\102\027\005\163\056':     [ [1, 2, 65, 7, 3394, 23, 5, 115, 46], ],
+    b'\006\002\123\003':                 [ [2, 3, 3], ],
+    b'\006\004\052\004\005\006':         [ [1, 2, 4, 5, 6], ],
+    b'\006\011\052\101\007\232\102\027\005\163\056':     [ [1, 2, 65, 7, 3394, 23, 5, 115, 46], ],
 
     # A Null
-    '\005\000':         [ None, ],
+    b'\005\000':         [ None, ],
 
 }
 
@@ -138,6 +140,69 @@ class EncoderTest(unittest.TestCase):
 #            self.log.debug('Got value [%s]: %s' % ( object, object.value) )
             self.assertEqual(item, object.value)
 
+    def test_integerCodec(self):
+        """ Test the integer codec at every width, signed and unsigned
+        """
+        for width in range(1, 10):
+            top = 1 << (8 * width - 1)
+            for value in (top - 1, -top, top // 2, -top // 2 - 1):
+                octets = rfc1155.encodeIntegerValue(value)
+                self.assertEqual(len(octets), width)
+                self.assertEqual(rfc1155.integerLength(value), width)
+                self.assertEqual(rfc1155.decodeIntegerValue(memoryview(octets)), value)
+                pass
+            pass
+
+        self.assertRaises(ValueError, rfc1155.decodeIntegerValue, b'')
+        self.assertRaises(ValueError, rfc1155.Asn1Object().decode, b'\002\000')
+
+        # Unsigned types wrap negative encodings into their range
+        self.assertEqual(rfc1155.decodeUnsignedValue(b'\377', 1 << 32), 0xffffffff)
+        self.assertEqual(rfc1155.decodeUnsignedValue(b'\000\377', 1 << 32), 0xff)
+        for cls in (rfc1155.Counter, rfc1155.Guage, rfc1155.TimeTicks):
+            tag = cls.asnTagClass | cls.asnTagNumber
+            obj = rfc1155.Asn1Object().decode(bytes([tag]) + b'\004\376\377\377\377')[0]
+            self.assertEqual(obj.value, 0xfeffffff)
+            self.assertEqual(cls().decodeContents(b'\200').value, 0xffffff80)
+            pass
+
+    def test_counter64EncodeDecode(self):
+        """ Test Counter64 values round trip under the 0x46 identifier
+        """
+        top = rfc1902.Counter64.MAXVAL
+        for value in (0, 1, 0xffffffff, 0x100000000, (1 << 63) - 1, 1 << 63, top - 1, top):
+            octets = rfc1902.Counter64(value).encode()
+            self.assertEqual(octets[0], 0x46)
+            self.assertEqual(octets[1], len(octets) - 2)
+            self.assertEqual(octets[2:], rfc1155.encodeIntegerValue(value))
+
+            obj = rfc1902.codec.decode(octets)[0]
+            self.assertTrue(isinstance(obj, rfc1902.Counter64))
+            self.assertEqual(obj.value, value)
+            self.assertEqual(rfc1902.Counter64().decodeContents(octets[2:]).value, value)
+            pass
+
+        self.assertEqual(rfc1902.Counter64(top).encode(), b'\106\011\000' + b'\377' * 8)
+        self.assertRaises(ValueError, rfc1902.Counter64, top + 1)
+
+        # a value encoded as negative wraps at 2^64, and one too wide is refused
+        self.assertEqual(rfc1902.codec.decode(b'\106\001\377')[0].value, top)
+        self.assertRaises(ValueError, rfc1902.codec.decode, b'\106\011\001' + b'\000' * 8)
+
+    def test_counterWrap(self):
+        """ Test Counters wrap at their own width
+        """
+        counter = rfc1902.Counter64(rfc1902.Counter64.MAXVAL - 1)
+        counter += 3
+        self.assertEqual(counter.value, 1)
+        self.assertEqual(rfc1902.Counter64(5).delta(rfc1902.Counter64.MAXVAL), 6)
+        self.assertEqual(rfc1902.Counter64(1 << 40).delta(1 << 33), (1 << 40) - (1 << 33))
+
+        counter = rfc1902.Counter32(0xfffffffe)
+        counter += 3
+        self.assertEqual(counter.value, 1)
+        self.assertEqual(rfc1902.Counter32(5).delta(0xffffffff), 6)
+
     def test_octetStringEncode(self):
         """ Test encode of OctetString type
         """
@@ -192,7 +257,7 @@ class EncoderTest(unittest.TestCase):
         
         myobj = rfc1155.Null()
         octets = myobj.encodeContents()
-        self.assertEqual(octets, '')
+        self.assertEqual(octets, b'')
         return
     
     def test_nullEncodeDecode(self):
@@ -268,6 +333,121 @@ class EncoderTest(unittest.TestCase):
 #            for object in objectList:
 #                self.log.debug('object: %s, value: %s' % ( object.__class__.__name__, object) )
 
+    def test_decodeAtOffsets(self):
+        """ Test cursor based tag and length decoding
+        """
+        octets = b'\002\001\005\004\201\200' + b'x' * 128
+        self.assertEqual(rfc1155.decodeTagAt(octets, 0), (0x02, 1))
+        self.assertEqual(rfc1155.decodeLengthAt(octets, 1), (1, 2))
+        self.assertEqual(rfc1155.decodeTagAt(octets, 3), (0x04, 4))
+        self.assertEqual(rfc1155.decodeLengthAt(octets, 4), (128, 6))
+
+        objectList = rfc1155.decodeObjects(octets, 3, len(octets))
+        self.assertEqual(len(objectList), 1)
+        self.assertEqual(objectList[0].value, b'x' * 128)
+
+    def test_decodeTruncated(self):
+        """ Test decoding of an object that runs past the end of the stream
+        """
+        decoder = rfc1155.Asn1Object()
+        self.assertRaises(ValueError, decoder.decode, b'\004\005abc')
+
+    def test_tagDecoders(self):
+        """ Test the decode functions build the same objects as
+            decodeContents() does
+        """
+        objects = [ rfc1155.Integer(item) for item in test_integers.keys() ]
+        objects += [ rfc1155.OctetString(item) for item in test_octetstrings ]
+        objects += [ rfc1155.ObjectID(item) for item in test_objectids.keys() ]
+        objects += [ rfc1155.Sequence(item) for item in test_sequences.values() ]
+        objects += [ rfc1155.Null(), rfc1155.IPAddress('10.0.0.1'), rfc1155.Counter(3000000000),
+                     rfc1155.Guage(5), rfc1155.TimeTicks(100), rfc1155.Opaque(b'blah') ]
+
+        for obj in objects:
+            stream = memoryview(obj.encode())
+            (tag, start, end) = rfc1155.decodeHeaderAt(stream, 0, len(stream))
+            result = rfc1155.tagDecoders[tag](stream, start, end)
+            expected = rfc1155.tagDecodeDict[tag]().decodeContents(stream[start:end])
+
+            self.assertIs(result.__class__, expected.__class__)
+            self.assertEqual(result, expected)
+            pass
+
+        # Counters some agents encode as negative are flipped positive
+        self.assertEqual(rfc1155.Asn1Object().decode(b'\101\001\377')[0].value, 4294967295)
+
+    def test_registerDecoder(self):
+        """ Test changing the type a tag decodes into
+        """
+        class Gauge(rfc1155.Guage):
+            __slots__ = ()
+
+        original = rfc1155.tagDecodeDict[0x42]
+        try:
+            rfc1155.registerDecoder(0x42, Gauge)
+            self.assertIs(rfc1155.tagDecodeDict[0x42], Gauge)
+            self.assertIsInstance(rfc1155.Asn1Object().decode(b'\102\001\005')[0], Gauge)
+        finally:
+            rfc1155.registerDecoder(0x42, original)
+            pass
+
+        self.assertRaises(ValueError, rfc1155.Asn1Object().decode, b'\177\001\005')
+
+    def test_batchEncoder(self):
+        """ Test encoding many objects into one reused buffer
+        """
+        objects = [rfc1155.Integer(-300), rfc1155.OctetString('x' * 200), b'\005\000',
+                   rfc1155.Sequence([rfc1155.ObjectID('.1.3.6.1.2.1.1.1.0'), rfc1155.Null()])]
+        expected = [obj if isinstance(obj, bytes) else obj.encode() for obj in objects]
+
+        encoder = rfc1155.BatchEncoder(16)
+        views = encoder.encodeMany(objects)
+        self.assertEqual([bytes(view) for view in views], expected)
+        self.assertTrue(all(view.obj is views[0].obj for view in views))
+
+        # While the views are held, the next batch gets a new buffer
+        first = encoder.buf
+        again = encoder.encodeMany(iter(objects))
+        self.assertIsNot(encoder.buf, first)
+        self.assertEqual([bytes(view) for view in views], expected)
+
+        # Once they are released, the buffer is reused
+        del views, again
+        second = encoder.buf
+        views = encoder.encodeMany(objects[:1])
+        self.assertIs(encoder.buf, second)
+        self.assertEqual(bytes(views[0]), expected[0])
+
+        self.assertEqual(rfc1155.encodeMany([]), [])
+
+    def test_encodedLength(self):
+        """ Test encodedLength() agrees with encode()
+        """
+        objects = [ rfc1155.Integer(item) for item in test_integers.keys() ]
+        objects += [ rfc1155.OctetString(item) for item in test_octetstrings ]
+        objects += [ rfc1155.ObjectID(item) for item in test_objectids.keys() ]
+        objects += [ rfc1155.Sequence(item) for item in test_sequences.values() ]
+        objects.append(rfc1155.Null())
+        objects.append(rfc1155.OctetString(b'x' * 300))
+        objects.append(rfc1155.Sequence([rfc1155.Sequence([rfc1155.OctetString(b'y' * 126)]), rfc1155.Integer(1)]))
+
+        for myobj in objects:
+            self.assertEqual(myobj.encodedLength(), len(myobj.encode()))
+            self.assertEqual(myobj.contentsLength(), len(myobj.encodeContents()))
+
+    def test_nestedSequenceEncode(self):
+        """ Test encoding of nested Sequences with long form lengths
+        """
+        inner = rfc1155.Sequence([rfc1155.OctetString(b'x' * 200)])
+        outer = rfc1155.Sequence([rfc1155.Integer(5), inner, b'\005\000'])
+        octets = outer.encode()
+
+        expected = b'\060\201\323\002\001\005\060\201\313\004\201\310' + b'x' * 200 + b'\005\000'
+        self.assertEqual(expected, octets)
+
+        object = rfc1155.Asn1Object().decode(octets)[0]
+        self.assertEqual(object[1][0].value, b'x' * 200)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# $Id$
+# $Revision$
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Unit tests for the formatting module
+
+import io
+import unittest
+
+import sys
+sys.path.append('../lib')
+
+from libsnmp import rfc1155
+from libsnmp import rfc1157
+from libsnmp import util
+from libsnmp import formatting
+
+
+class FormattingTest(unittest.TestCase):
+
+    def test_octetsToHex(self):
+        octets = bytes(range(256))
+        self.assertEqual(formatting.octetsToHex(octets), ''.join(['%.2x' % byte for byte in octets]))
+        self.assertEqual(formatting.octetsToHex(memoryview(b'\001\377'), ' '), '01 ff')
+        self.assertEqual(util.octetsToHex(b''), '')
+
+    def test_octetsToOct(self):
+        self.assertEqual(formatting.octetsToOct(b'\000\010\100\377'), '0o0,0o10,0o100,0o377,')
+        self.assertEqual(util.octetsToOct(bytearray(b'\007')), '0o7,')
+
+    def test_printable(self):
+        self.assertTrue(formatting.isPrintable(b'eth0 uplink\r\n'))
+        self.assertFalse(formatting.isPrintable(b'\000\001'))
+        self.assertEqual(formatting.octetsToPrintable(b'ab\000\tc\377'), 'ab..c.')
+
+    def test_hexDump(self):
+        dump = formatting.hexDump(b'public\000' * 3, width=8)
+        self.assertEqual(dump.split('\n'), [
+            '0000  70 75 62 6c 69 63 00 70  |public.p|',
+            '0008  75 62 6c 69 63 00 70 75  |ublic.pu|',
+            '0010  62 6c 69 63 00           |blic.|',
+            ])
+        self.assertEqual(formatting.hexDump(b''), '')
+
+    def test_formatVarBind(self):
+        oid = rfc1155.ObjectID('.1.3.6.1.2.1.2.2.1.2.1')
+        text = rfc1157.VarBind(oid, rfc1155.OctetString('eth0'))
+        mac = rfc1157.VarBind(oid, rfc1155.OctetString(b'\000\032\053\074\115\136'))
+        number = rfc1157.VarBind(oid, rfc1155.Integer(6))
+
+        self.assertEqual(formatting.formatVarBind(text), '.1.3.6.1.2.1.2.2.1.2.1 = OctetString: eth0')
+        self.assertEqual(formatting.formatVarBind(mac), '.1.3.6.1.2.1.2.2.1.2.1 = OctetString: 00 1a 2b 3c 4d 5e')
+        self.assertEqual(formatting.formatVarBind(number, showHex=True), '.1.3.6.1.2.1.2.2.1.2.1 = Integer: 6')
+        self.assertEqual(formatting.formatVarBind(text, showHex=True).split('\n')[1], '   hex: 65746830')
+
+    def test_walkFormatter(self):
+        stream = io.StringIO()
+        formatter = formatting.WalkFormatter(stream, batchSize=2)
+        varbinds = [ rfc1157.VarBind(rfc1155.ObjectID('.1.3.6.1.2.1.1.%d.0' % i), rfc1155.Integer(i))
+                     for i in range(1, 4) ]
+
+        for varbind in varbinds:
+            formatter(None, varbind)
+            pass
+        self.assertEqual(stream.getvalue().count('\n'), 2)
+
+        formatter.flush()
+        self.assertEqual(stream.getvalue().split('\n'), [ formatting.formatVarBind(varbind) for varbind in varbinds ] + [''])
+        self.assertEqual(formatter.count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+# $Id$
+# $Revision$
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Unit tests for the codec instrumentation
+
+import unittest
+
+import sys
+sys.path.append('../lib')
+
+from libsnmp import rfc1155
+from libsnmp import rfc1157
+from libsnmp import instrument
+
+
+def buildMessage():
+    varbinds = [ rfc1157.VarBind(rfc1155.ObjectID('.1.3.6.1.2.1.1.%d.0' % i), rfc1155.OctetString('x' * 200))
+                 for i in range(1, 3) ]
+    pdu = rfc1157.Response(5, varBindList=rfc1157.VarBindList(varbinds))
+    return rfc1157.Message(data=pdu)
+
+
+class InstrumentTest(unittest.TestCase):
+
+    def setUp(self):
+        instrument.reset()
+
+    def tearDown(self):
+        instrument.disable()
+        instrument.reset()
+        del instrument.tracers[:]
+
+    def test_disabled(self):
+        """ Test nothing is counted, or wrapped, while disabled
+        """
+        decodeContents = rfc1155.Integer.__dict__['decodeContents']
+        decoder = rfc1155.tagDecoders[0x04]
+
+        octets = buildMessage().encode()
+        rfc1157.Message().decode(octets)
+        self.assertEqual(instrument.snapshot(), {})
+
+        instrument.enable()
+        self.assertIsNot(rfc1155.Integer.__dict__['decodeContents'], decodeContents)
+        instrument.disable()
+
+        self.assertIs(rfc1155.Integer.__dict__['decodeContents'], decodeContents)
+        self.assertEqual(rfc1155.tagDecoders[0x04].__qualname__, decoder.__qualname__)
+        rfc1157.Message().decode(octets)
+        rfc1155.Integer().decodeContents(b'\001')
+        self.assertEqual(instrument.snapshot(), {})
+
+    def test_counters(self):
+        """ Test decoding and encoding a message counts each object
+        """
+        instrument.enable()
+        octets = buildMessage().encode()
+        rfc1157.Message().decode(octets)
+        rfc1157.Message().decodeRaw(octets)
+        rfc1155.Integer().decodeContents(b'\001')
+
+        counters = instrument.snapshot()
+        self.assertEqual(counters['encode.Message'], 1)
+        self.assertEqual(counters['octets.encoded'], len(octets))
+        self.assertEqual(counters['encodeLength.long'], 7)
+        self.assertEqual(counters['encodeContentsInto.VarBind'], 2)
+        self.assertTrue(counters['decode.OctetString'] >= 3)
+        self.assertEqual(counters['decodeRaw.OctetString'], 2)
+        self.assertEqual(counters['decodeRaw.ObjectID'], 2)
+        self.assertEqual(counters['decodeContents.Integer'], 1)
+        self.assertTrue(counters['octets.decoded'] > len(octets))
+
+    def test_tracer(self):
+        """ Test tracers see each event, and registerDecoder keeps the
+            instrumentation in place
+        """
+        events = []
+        instrument.addTracer(lambda event, obj, octets: events.append((event, obj, octets)))
+        instrument.enable()
+
+        class Tagged(rfc1155.OctetString):
+            __slots__ = ()
+        original = rfc1155.tagDecodeDict[0x44]
+        rfc1155.registerDecoder(0x44, Tagged)
+        try:
+            rfc1155.Asn1Object().decode(b'\104\002hi')
+        finally:
+            rfc1155.registerDecoder(0x44, original)
+
+        self.assertEqual(events[-1], ('decode', Tagged, b'hi'))
+        self.assertEqual(instrument.snapshot()['decode.Tagged'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
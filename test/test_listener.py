@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# $Id$
+# $Revision$
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Unit tests for the multi-process trap listener, with the traps sent
+# over loopback
+
+import multiprocessing
+import socket
+import time
+import unittest
+
+import sys
+sys.path.append('../lib')
+
+from libsnmp import listener
+
+canFork = hasattr(socket, 'SO_REUSEPORT') and 'fork' in multiprocessing.get_all_start_methods()
+
+
+def waitFor(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+        pass
+    return condition()
+
+
+@unittest.skipUnless(canFork, 'Needs fork() and SO_REUSEPORT')
+class TrapListenerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.traps = multiprocessing.get_context('fork').SimpleQueue()
+        self.trapListener = None
+
+    def tearDown(self):
+        if self.trapListener is not None:
+            self.trapListener.stop()
+            pass
+
+    def trapCallback(self, snmpClient, msg):
+        """ Runs in the workers, sending back what arrived where
+        """
+        specificTrap = int(msg.data.specificTrap)
+        if specificTrap == 13:
+            raise RuntimeError('unlucky')
+        self.traps.put((specificTrap, snmpClient.slot // listener.FIELDS))
+
+    def test_workersShareTraps(self):
+        """ Test the traps are spread across the workers, each handed to
+            the callback once, and counted
+        """
+        self.trapListener = listener.TrapListener(self.trapCallback, ('127.0.0.1', 0), workers=2)
+        self.trapListener.start()
+        port = self.trapListener.interface[1]
+        self.assertNotEqual(port, 0)
+
+        listener.sendTraps(self.trapListener.interface, 200, sources=32)
+        self.assertTrue(waitFor(lambda: sum(worker['received'] for worker in self.trapListener.stats()) == 200))
+
+        received = [ self.traps.get() for i in range(199) ]
+        self.assertEqual(sorted(trap for (trap, slot) in received), [ i for i in range(200) if i != 13 ])
+        self.assertEqual(set(slot for (trap, slot) in received), {0, 1})
+
+        stats = self.trapListener.stats()
+        self.assertEqual(sum(worker['traps'] for worker in stats), 199)
+        self.assertEqual(sum(worker['errors'] for worker in stats), 1)
+        for (slot, worker) in enumerate(stats):
+            self.assertTrue(worker['alive'])
+            self.assertEqual(worker['traps'], len([ trap for trap in received if trap[1] == slot ]))
+            if sys.platform.startswith('linux'):
+                self.assertEqual(worker['drops'], 0)
+                pass
+            pass
+
+        # nothing new since the last call
+        self.assertEqual([ worker['rate'] for worker in self.trapListener.stats() ], [0, 0])
+
+    def test_stop(self):
+        self.trapListener = listener.TrapListener(self.trapCallback, ('127.0.0.1', 0), workers=1)
+        self.trapListener.start()
+        self.trapListener.stop()
+        self.assertFalse(self.trapListener.stats()[0]['alive'])
+
+    def test_badWorker(self):
+        """ Test start() says so when a worker can't listen
+        """
+        busy = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        busy.bind(('127.0.0.1', 0))
+        try:
+            self.trapListener = listener.TrapListener(self.trapCallback, busy.getsockname(), workers=1)
+            self.assertRaises(RuntimeError, self.trapListener.start)
+        finally:
+            busy.close()
+
+    def test_socketDrops(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(('127.0.0.1', 0))
+        try:
+            drops = listener.socketDrops()
+            if sys.platform.startswith('linux'):
+                self.assertEqual(drops[listener.os.fstat(sock.fileno()).st_ino], 0)
+                pass
+        finally:
+            sock.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
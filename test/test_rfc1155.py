@@ -89,17 +89,18 @@ class EncoderTest(unittest.TestCase):
 
     def test_ip_address(self):
         
-        addresses = (('0.0.0.0',          '@\x04\x00\x00\x00\x00'),
-                     ('255.255.255.255',  '@\x04\xff\xff\xff\xff'),
-                     ('1.2.3.4',          '@\x04\x01\x02\x03\x04'),
-                     ('10.0.0.1',         '@\x04\n\x00\x00\x01'),
-                     ('254.154.1.0',      '@\x04\xfe\x9a\x01\x00'),
-                     ('0.0.0.1',          '@\x04\x00\x00\x00\x01'),
-                     ('255.0.0.0',        '@\x04\xff\x00\x00\x00'))
+        addresses = (('0.0.0.0',          b'@\x04\x00\x00\x00\x00'),
+                     ('255.255.255.255',  b'@\x04\xff\xff\xff\xff'),
+                     ('1.2.3.4',          b'@\x04\x01\x02\x03\x04'),
+                     ('10.0.0.1',         b'@\x04\n\x00\x00\x01'),
+                     ('254.154.1.0',      b'@\x04\xfe\x9a\x01\x00'),
+                     ('0.0.0.1',          b'@\x04\x00\x00\x00\x01'),
+                     ('255.0.0.0',        b'@\x04\xff\x00\x00\x00'))
         
         for input, output in addresses:
             a = rfc1155.IPAddress(input)
             raw = a.encode()
+            self.assertEqual(raw, output)
             b = rfc1155.Asn1Object().decode(raw)[0]
             self.assertEqual(a,b)
             pass
@@ -128,7 +129,155 @@ class EncoderTest(unittest.TestCase):
         self.assertNotEqual(len(b), len(e))
         
         return
-    
+
+    def test_objectid_hash(self):
+
+        """test ObjectIDs can be used as dict keys"""
+
+        a = rfc1155.ObjectID('.1.3.6.1.2.1.1.3.0')
+        b = rfc1155.ObjectID([1,3,6,1,2,1,1,3,0])
+        c = rfc1155.Asn1Object().decode(a.encode())[0]
+
+        table = {a: 'sysUpTime'}
+        self.assertEqual(table[b], 'sysUpTime')
+        self.assertEqual(table[c], 'sysUpTime')
+        self.assertEqual(hash(a), hash(rfc1155.ObjectID(a)))
+        self.assertFalse(hasattr(a, '__dict__'))
+        return
+
+    def test_objectid_ordering(self):
+
+        """test ObjectIDs sort in lexicographic subid order"""
+
+        oids = [ rfc1155.ObjectID(x) for x in ('.1.3.6.1.2.1.2',
+                                                '.1.3.6.1.2.1.1.9.1',
+                                                '.1.3.6.1.2.1.1',
+                                                '.1.3.6.1.2.1.10',
+                                                '.1.3.6.1.2.1.1.10') ]
+
+        self.assertEqual([ str(x) for x in sorted(oids) ],
+                         ['.1.3.6.1.2.1.1',
+                          '.1.3.6.1.2.1.1.9.1',
+                          '.1.3.6.1.2.1.1.10',
+                          '.1.3.6.1.2.1.2',
+                          '.1.3.6.1.2.1.10'])
+
+        self.assertTrue(oids[2] < oids[1])
+        self.assertTrue(oids[1] <= oids[4])
+        self.assertTrue(oids[3] > oids[0])
+        self.assertTrue(oids[0] >= oids[0])
+        self.assertRaises(TypeError, lambda: oids[0] < '.1.3')
+        return
+
+    def test_objectid_prefix(self):
+
+        """test prefixes and slicing"""
+
+        a = rfc1155.ObjectID('.1.3.6.1.2.1.2.2.1.2')
+        b = a + 7
+
+        self.assertTrue(a.isPrefixOf(a))
+        self.assertTrue(a.isPrefixOf(b))
+        self.assertFalse(b.isPrefixOf(a))
+        self.assertFalse(rfc1155.ObjectID('.1.3.6.1.2.1.2.2.1.20').isPrefixOf(b))
+
+        self.assertEqual(b[:-1], a)
+        self.assertEqual(b[-1], 7)
+        self.assertIsInstance(b[2:], rfc1155.ObjectID)
+        self.assertEqual(str(a + [3, 4]), '.1.3.6.1.2.1.2.2.1.2.3.4')
+
+        # adding subids leaves the original alone
+        self.assertEqual(len(a), 10)
+        return
+
+    def test_objectid_encoded_compare(self):
+
+        """test ordering and prefixes on encoded ObjectIDs agree with
+        the subids"""
+
+        oids = ['.1.3.6.1.2.1.2.2.1.2', '.1.3.6.1.2.1.2.2.1.2.7', '.1.3.6.1.2.1.2.2.1.20',
+                '.1.3.6.1.2.1.2.2.1.2.127', '.1.3.6.1.2.1.2.2.1.2.128', '.1.3.6.1.2.1.2.2.1.2.16383',
+                '.1.3.6.1.2.1.2.2.1.2.16384', '.1.3.6.1.2.1.2.2.1.2.16384.0', '.1.3.6.1.2.1.2.2.1.3',
+                '.1.3.6.1.4.1.2147483647', '.1.3', '.2.5.1']
+        oids = [ rfc1155.ObjectID(oid) for oid in oids ]
+
+        for a in oids:
+            octetsA = a.encodeContents()
+            for b in oids:
+                octetsB = memoryview(b.encodeContents())
+                expected = (a > b) - (a < b)
+                self.assertEqual(rfc1155.compareEncodedOIDs(octetsA, octetsB), expected, (a, b))
+                self.assertEqual(rfc1155.isEncodedPrefix(octetsA, octetsB), a.isPrefixOf(b))
+                self.assertEqual(rfc1155.isPastSubtree(octetsA, octetsB), b > a and not a.isPrefixOf(b))
+                pass
+            pass
+
+        # the octets alone would put 16383 (0xff 0x7f) after 16384 (0x81 0x80 0x00)
+        self.assertEqual(rfc1155.compareEncodedOIDs(b'\053\377\177', b'\053\201\200\000'), -1)
+        self.assertRaises(ValueError, rfc1155.compareEncodedOIDs, b'\053\001\201', b'\053\001\202')
+        return
+
+    def test_objectid_cache(self):
+
+        """test the ObjectID caches count hits and misses"""
+
+        try:
+            rfc1155.setObjectIDCacheSize(2)
+
+            for i in range(3):
+                a = rfc1155.ObjectID('.1.3.6.1.2.1.1.5.0')
+                octets = a.encode()
+                b = rfc1155.Asn1Object().decode(octets)[0]
+                self.assertEqual(a, b)
+                pass
+
+            info = rfc1155.objectIDCacheInfo()
+            self.assertEqual(info['parse'].misses, 1)
+            self.assertEqual(info['parse'].hits, 2)
+            self.assertEqual(info['decode'].misses, 1)
+            self.assertEqual(info['decode'].hits, 2)
+            self.assertEqual(info['encode'].misses, 1)
+
+            # the least recently used entry goes when the cache is full
+            for oid in ('.1.3.6.1.2.1.1.5.0', '.1.3.6.1.2.1.1.6.0', '.1.3.6.1.2.1.1.7.0'):
+                rfc1155.ObjectID(oid)
+                pass
+            info = rfc1155.objectIDCacheInfo()
+            self.assertEqual(info['parse'].maxsize, 2)
+            self.assertEqual(info['parse'].currsize, 2)
+
+            # a size of 0 turns caching off
+            rfc1155.setObjectIDCacheSize(0)
+            rfc1155.ObjectID('.1.3.6.1.2.1.1.5.0')
+            rfc1155.ObjectID('.1.3.6.1.2.1.1.5.0')
+            self.assertEqual(rfc1155.objectIDCacheInfo()['parse'].hits, 0)
+
+        finally:
+            rfc1155.setObjectIDCacheSize()
+            pass
+        return
+
+    def test_slots(self):
+
+        """test decoded values don't carry an instance dict"""
+
+        values = [ rfc1155.Integer(5),
+                   rfc1155.OctetString('blah'),
+                   rfc1155.ObjectID('.1.3.6.1'),
+                   rfc1155.Null(),
+                   rfc1155.IPAddress('10.0.0.1'),
+                   rfc1155.Counter(5),
+                   rfc1155.Guage(5),
+                   rfc1155.TimeTicks(5),
+                   rfc1155.Opaque(b'blah') ]
+
+        for value in values:
+            self.assertFalse(hasattr(value, '__dict__'), value.__class__.__name__)
+            pass
+
+        self.assertRaises(AttributeError, setattr, values[0], 'foo', 1)
+        return
+
     pass
 
 if __name__ == '__main__':
@@ -56,6 +56,20 @@ class rfc1157Test(unittest.TestCase):
 #            self.log.debug('item: %s: %s' % (item.__class__, item) )
 
 
+    def test_varBindAttributes(self):
+        """ Test the name and value of a VarBind are kept in its value
+        """
+        name = rfc1155.ObjectID('.1.0.3.4.5.7')
+        varbind = rfc1157.VarBind(name, rfc1155.Integer(47))
+
+        self.assertIs(varbind.objectID, name)
+        self.assertEqual(varbind.objectValue, rfc1155.Integer(47))
+        self.assertFalse(hasattr(varbind, '__dict__'))
+
+        varbind.objectValue = rfc1155.OctetString('blah')
+        self.assertEqual(varbind.value[1], rfc1155.OctetString('blah'))
+        self.assertEqual(varbind.encode(), rfc1157.VarBind(name, rfc1155.OctetString('blah')).encode())
+
     def test_varBindListEncode(self):
         """ Test encode/decode of a VarBindList
         """
@@ -138,6 +152,191 @@ class rfc1157Test(unittest.TestCase):
 #        for item in objectList:
 #            self.log.debug('item: %s: %s' % (item.__class__, item) )
 
+    def test_lazyMessageDecode(self):
+        """ Test lazy decoding of a Response message
+        """
+        myList = []
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.0.3.4.5.7'), rfc1155.Integer(47) ) )
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.4.5.4.55.4465.7'), rfc1155.Null() ) )
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.2.5.8.6858.7'), rfc1155.OctetString('blah') ) )
+        pdu = rfc1157.Response(5, 2, 1, varBindList=rfc1157.VarBindList( myList ))
+        octets = rfc1157.Message(data=pdu).encode()
+
+        eager = rfc1157.Message().decode(octets)
+        msg = rfc1157.Message().decode(octets, lazy=True)
+
+        self.assertEqual(msg.version, 0)
+        self.assertEqual(msg.community.value, b'public')
+        self.assertIsInstance(msg.data, rfc1157.PDU)
+        self.assertEqual(msg.data.asnTagNumber, rfc1157.Response.asnTagNumber)
+        self.assertEqual(msg.data.requestID, 5)
+        self.assertEqual(msg.data.errorStatus, 2)
+        self.assertEqual(msg.data.errorIndex, 1)
+
+        varBindList = msg.data.varBindList
+        self.assertIsInstance(varBindList, rfc1157.VarBindList)
+        self.assertEqual(len(varBindList), 3)
+        self.assertEqual(varBindList.items, [None, None, None])
+
+        self.assertEqual(varBindList[-1].objectValue.value, b'blah')
+        self.assertEqual(varBindList.items[:2], [None, None])
+
+        for x, y in zip(eager.data.varBindList, varBindList):
+            self.assertEqual(x.objectID, y.objectID)
+            self.assertEqual(x.objectValue.value, y.objectValue.value)
+
+        self.assertEqual(msg.encode(), octets)
+
+    def test_lazyMessageDecodeMalformed(self):
+        """ Test a malformed varbind is reported when it is accessed
+        """
+        pdu = rfc1157.Response(5, varBindList=rfc1157.VarBindList())
+        octets = bytearray(rfc1157.Message(data=pdu).encode())
+        octets[1] += 3
+        octets[14] += 3
+        octets[-1] += 3
+        octets += b'\002\001\001'
+
+        msg = rfc1157.Message().decode(bytes(octets), lazy=True)
+        self.assertEqual(msg.data.requestID, 5)
+        self.assertRaises(rfc1157.PDUError, len, msg.data.varBindList)
+
+    def test_iterVarBinds(self):
+        """ Test streaming the varbinds out of encoded messages
+        """
+        myList = []
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.0.3.4.5.7'), rfc1155.Integer(47) ) )
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.4.5.4.55.4465.7'), rfc1155.Null() ) )
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.2.5.8.6858.7'), rfc1155.OctetString('blah') ) )
+
+        response = rfc1157.Response(5, varBindList=rfc1157.VarBindList( myList ))
+        trap = rfc1157.TrapPDU(rfc1155.ObjectID('.1.3.6.1.4.1.2'), rfc1155.NetworkAddress('10.232.8.6'),
+                               rfc1157.GenericTrap(6), rfc1155.Integer(1), rfc1155.TimeTicks(100),
+                               rfc1157.VarBindList( myList ))
+
+        for pdu in (response, trap):
+            octets = rfc1157.Message(data=pdu).encode()
+            result = list(rfc1157.iterVarBinds(octets))
+
+            self.assertEqual(len(result), len(myList))
+            for varbind, (name, value) in zip(myList, result):
+                self.assertEqual(varbind.objectID, name)
+                self.assertIsInstance(value, varbind.objectValue.__class__)
+                self.assertEqual(varbind.objectValue.value, value.value)
+
+    def test_iterVarBindsEmpty(self):
+        """ Test streaming a message without any varbinds
+        """
+        pdu = rfc1157.Response(5, varBindList=rfc1157.VarBindList())
+        octets = rfc1157.Message(data=pdu).encode()
+        self.assertEqual(list(rfc1157.iterVarBinds(octets)), [])
+
+    def test_decodeRaw(self):
+        """ Test decoding varbinds into plain values
+        """
+        myList = []
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.0.3.4.5.7'), rfc1155.Integer(-47) ) )
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.4.5.4.55.4465.7'), rfc1155.Null() ) )
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.2.5.8.6858.7'), rfc1155.OctetString('blah') ) )
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.2.5.8.6858.8'), rfc1155.Counter(3000000000) ) )
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.2.5.8.6858.9'), rfc1155.IPAddress('10.0.0.1') ) )
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.2.5.8.6858.10'), rfc1155.ObjectID('.1.3.6.1') ) )
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.2.5.8.6858.11'), rfc1155.OctetString(b'x' * 300) ) )
+
+        pdu = rfc1157.Response(5, varBindList=rfc1157.VarBindList( myList ))
+        octets = rfc1157.Message(data=pdu).encode()
+        result = rfc1157.Message().decodeRaw(octets)
+
+        self.assertEqual(result, [
+            ((1, 0, 3, 4, 5, 7), -47, 0x02),
+            ((1, 4, 5, 4, 55, 4465, 7), None, 0x05),
+            ((1, 2, 5, 8, 6858, 7), b'blah', 0x04),
+            ((1, 2, 5, 8, 6858, 8), 3000000000, 0x41),
+            ((1, 2, 5, 8, 6858, 9), b'\012\000\000\001', 0x40),
+            ((1, 2, 5, 8, 6858, 10), (1, 3, 6, 1), 0x06),
+            ((1, 2, 5, 8, 6858, 11), b'x' * 300, 0x04),
+            ])
+
+        # and agrees with the objects a full decode builds
+        for (name, value, tag), varbind in zip(result, rfc1157.Message().decode(octets).data.varBindList):
+            self.assertEqual(name, varbind.objectID.value)
+            self.assertEqual(value, varbind.objectValue.value)
+            self.assertIsInstance(varbind.objectValue, rfc1155.tagDecodeDict[tag])
+
+        # a varbind whose name runs into the value
+        broken = bytearray(octets)
+        broken[octets.index(b'\006\005\050\003')+1] = 0x09
+        self.assertRaises((rfc1157.PDUError, ValueError), rfc1157.Message().decodeRaw, bytes(broken))
+        self.assertRaises((rfc1157.PDUError, ValueError), rfc1157.Message().decodeRaw, octets[:-3])
+
+    def test_iterVarBindOffsets(self):
+        """ Test finding the fields and varbinds of an encoded
+            response without decoding them
+        """
+        myList = []
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.3.6.1.2.1.1.1.0'), rfc1155.OctetString(b'x' * 300) ) )
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.3.6.1.2.1.1.3.0'), rfc1155.TimeTicks(5) ) )
+
+        pdu = rfc1157.Response(7, 2, 1, varBindList=rfc1157.VarBindList( myList ))
+        octets = rfc1157.Message(data=pdu).encode()
+        (errorStatus, errorIndex, start, end) = rfc1157.locateResponse(octets)
+        self.assertEqual((errorStatus, errorIndex), (2, 1))
+        self.assertEqual(rfc1157.locateVarBindList(octets), (0xa2, start, end))
+
+        offsets = list(rfc1157.iterVarBindOffsets(octets, start, end))
+        self.assertEqual([ tag for (nameStart, nameEnd, tag, valueStart, valueEnd) in offsets ], [0x04, 0x43])
+        self.assertEqual([ octets[valueStart:valueEnd] for (nameStart, nameEnd, tag, valueStart, valueEnd) in offsets ],
+                         [b'x' * 300, b'\005'])
+
+        (name, value) = rfc1157.decodeVarBindOffsets(octets, offsets[1], rfc1157.codec.decoders)
+        self.assertEqual(name.value, (1, 3, 6, 1, 2, 1, 1, 3, 0))
+        self.assertEqual(value.value, 5)
+
+        # a varbind whose value runs past it
+        broken = bytearray(octets)
+        broken[-2] = 0x02
+        self.assertRaises((rfc1157.PDUError, ValueError), list, rfc1157.iterVarBindOffsets(bytes(broken), start, end))
+
+    def test_requestTemplate(self):
+        """ Test rendering a pre-encoded request with new requestIDs
+        """
+        myList = []
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.3.6.1.2.1.1.1.0'), rfc1155.Null() ) )
+        myList.append( rfc1157.VarBind( rfc1155.ObjectID('.1.3.6.1.2.1.1.3.0'), rfc1155.Null() ) )
+
+        msg = rfc1157.Message(data=rfc1157.Get(7, varBindList=rfc1157.VarBindList( myList )))
+        template = rfc1157.RequestTemplate(msg)
+
+        # Building the template leaves the message alone
+        self.assertEqual(msg.data.requestID, 7)
+
+        for reqID in (template.REQUEST_ID_MIN, 0x12345678, template.REQUEST_ID_MAX):
+            msg.data.requestID = rfc1155.Integer(reqID)
+            msg.data.value[0] = msg.data.requestID
+            self.assertEqual(template.render(reqID), msg.encode())
+            self.assertEqual(len(template.render(reqID)), len(template))
+
+        self.assertRaises(ValueError, template.render, 0)
+        self.assertRaises(ValueError, template.render, template.REQUEST_ID_MAX + 1)
+
+    def test_peekHeader(self):
+        """ Test reading the header of a message without decoding it
+        """
+        myList = [ rfc1157.VarBind( rfc1155.ObjectID('.1.3.6.1.2.1.1.1.0'), rfc1155.OctetString(b'x' * 300) ) ]
+        pdu = rfc1157.Response(0x123456, varBindList=rfc1157.VarBindList( myList ))
+        octets = rfc1157.Message(community='private', data=pdu).encode()
+        self.assertEqual(rfc1157.peekHeader(octets), (0, b'private', 0xa2, 0x123456))
+
+        trap = rfc1157.TrapPDU(rfc1155.ObjectID('.1.3.6.1.4.1.2'), rfc1155.NetworkAddress('10.0.0.1'),
+                               rfc1157.GenericTrap(6), rfc1155.Integer(1), rfc1155.TimeTicks(100),
+                               rfc1157.VarBindList())
+        octets = rfc1157.Message(data=trap).encode()
+        self.assertEqual(rfc1157.peekHeader(octets), (0, b'public', 0xa4, None))
+
+        errors = (rfc1157.MessageError, rfc1157.PDUError, ValueError)
+        for broken in (b'', b'\060\000', octets[:-1], octets[:4], b'\002\001\000'):
+            self.assertRaises(errors, rfc1157.peekHeader, broken)
+
 if __name__ == '__main__':
     unittest.main()
 
@@ -1,8 +1,37 @@
+import asyncio
+import socket
+import threading
+import time
 import unittest
 
 from libsnmp import rfc1157
+from libsnmp import rfc1905
 from libsnmp.rfc1155 import ObjectID
-from libsnmp.snmpmanager import snmpManager
+from libsnmp.snmpmanager import snmpManager, RateLimit
+
+
+class Agent(asyncio.DatagramProtocol):
+    """ A fake agent, answering each Get with the value of its first
+        oid in values, and ignoring the ones it has no value for
+    """
+
+    def __init__(self, values):
+        self.values = values
+        self.transport = None
+        self.arrivals = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, octets, src):
+        self.arrivals.append(time.monotonic())
+        request = rfc1905.Message().decode(octets)
+        oid = str(request.data.varBindList[0].objectID)
+        if oid not in self.values:
+            return
+        varbind = rfc1905.VarBind(ObjectID(oid), self.values[oid])
+        pdu = rfc1905.Response(int(request.data.requestID), varBindList=rfc1905.VarBindList([varbind]))
+        self.transport.sendto(rfc1905.Message(data=pdu).encode(), src)
 
 
 class TestSNMPManager(unittest.TestCase):
@@ -10,6 +39,7 @@ class TestSNMPManager(unittest.TestCase):
         self.manager = snmpManager()
 
     def tearDown(self):
+        self.manager.close()
         self.manager = None
 
     def test_createGetRequestPDU(self):
@@ -42,5 +72,414 @@ class TestSNMPManager(unittest.TestCase):
     def test_createSetRequestMessage(self):
         message = self.manager.createSetRequestMessage('1.3.6.1.2.1.1.1.0', 0x02, 1, community='public', version=1)
         self.assertIsInstance(message, rfc1157.Message)
-        self.assertEqual(message.community.value, 'public')
+        self.assertEqual(message.community.value, b'public')
         self.assertIsInstance(message.data, rfc1157.Set)
+
+    def test_getRequestTemplate(self):
+        oids = ['1.3.6.1.2.1.1.1.0', '1.3.6.1.2.1.1.3.0']
+        template = self.manager.createGetRequestTemplate(oids, community='public', version=2)
+
+        callback = lambda manager, msg: None
+        reqID = self.manager.snmpGetTemplate(template, ('127.0.0.1', 161), callback)
+        self.assertIs(self.manager.callbacks[reqID], callback)
+
+        (octets, remote) = self.manager.outbound.get(0)
+        self.assertEqual(len(octets), len(template))
+
+        message = rfc1905.Message().decode(octets)
+        self.assertEqual(message.data.asnTagNumber, rfc1905.Get.asnTagNumber)
+        self.assertEqual(message.data.requestID, reqID)
+        self.assertEqual([str(varbind.objectID) for varbind in message.data.varBindList],
+                         ['.' + oid for oid in oids])
+
+        # the rendered message matches one built and encoded from scratch
+        pdu = rfc1905.Get(reqID, varBindList=template.message.data.varBindList)
+        self.assertEqual(octets, rfc1905.Message(data=pdu).encode())
+
+    def test_getRequestTemplateRange(self):
+        template = self.manager.createGetRequestTemplate(['1.3.6.1.2.1.1.1.0'], version=1)
+        self.assertRaises(ValueError, template.render, 5)
+        self.assertRaises(ValueError, template.render, template.REQUEST_ID_MAX + 1)
+
+    def test_getTemplateRequestIDWraps(self):
+        """ Test templated gets keep working once the shared counter
+            has passed the template's largest requestID
+        """
+        template = self.manager.createGetRequestTemplate(['1.3.6.1.2.1.1.1.0'])
+        span = template.REQUEST_ID_MAX - template.REQUEST_ID_MIN + 1
+        self.manager.nextRequestID = span - 1
+        self.assertEqual(self.manager.snmpGetTemplate(template, ('127.0.0.1', 9), None), template.REQUEST_ID_MAX)
+        self.assertEqual(self.manager.snmpGetTemplate(template, ('127.0.0.1', 9), None), template.REQUEST_ID_MIN)
+
+        self.manager.nextRequestID = 1 << 40
+        reqID = self.manager.snmpGetTemplate(template, ('127.0.0.1', 9), None)
+        self.assertTrue(template.REQUEST_ID_MIN <= reqID <= template.REQUEST_ID_MAX)
+        request = rfc1905.Message().decode(self.manager.outbound.queue[-1][0])
+        self.assertEqual(int(request.data.requestID), reqID)
+
+    def test_encodeMany(self):
+        template = self.manager.createGetRequestTemplate(['1.3.6.1.2.1.1.1.0'])
+        messages = [self.manager.createGetRequestMessage('.1.3.6.1.2.1.1.%d.0' % i) for i in range(1, 4)]
+        messages.append(template.render(template.REQUEST_ID_MIN))
+
+        views = self.manager.encodeMany(messages)
+        self.assertEqual([bytes(view) for view in views[:3]], [msg.encode() for msg in messages[:3]])
+        self.assertEqual(bytes(views[3]), messages[3])
+
+    def test_sendMany(self):
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(2)
+        try:
+            remote = receiver.getsockname()
+            messages = [self.manager.createGetRequestMessage('.1.3.6.1.2.1.1.%d.0' % i) for i in range(1, 4)]
+            self.manager.sendMany([(msg, remote) for msg in messages])
+
+            received = [receiver.recvfrom(65536)[0] for msg in messages]
+            self.assertEqual(received, [msg.encode() for msg in messages])
+        finally:
+            receiver.close()
+
+    def test_sendManyBatched(self):
+        """ Test a batched manager sends what it's given in batches,
+            and lets go of the shared buffer after
+        """
+        self.manager.close()
+        self.manager = snmpManager(interface=('127.0.0.1', 0), batchSize=2)
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(2)
+        try:
+            remote = receiver.getsockname()
+            messages = [self.manager.createGetRequestMessage('.1.3.6.1.2.1.1.%d.0' % i) for i in range(1, 6)]
+            self.manager.sendMany([(msg, remote) for msg in messages])
+
+            received = [receiver.recvfrom(65536)[0] for msg in messages]
+            self.assertEqual(received, [msg.encode() for msg in messages])
+            self.manager.batchEncoder.buf.extend(b'free')
+        finally:
+            receiver.close()
+
+    def test_sendBufferFull(self):
+        """ Test requests a full send buffer has no room for stay
+            queued, in order, and go once poll() finds it has room
+        """
+        self.manager.close()
+        self.manager = snmpManager(interface=('127.0.0.1', 0), batchSize=4)
+        receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        receiver.bind(('127.0.0.1', 0))
+        receiver.settimeout(2)
+
+        # the send buffer is full after the first 3 datagrams
+        sendMany = self.manager.manager.sendMany
+        full = [True]
+
+        def fill(datagrams):
+            if full:
+                full.pop()
+                return sendMany(datagrams[:3])
+            return sendMany(datagrams)
+
+        self.manager.manager.sendMany = fill
+        try:
+            remote = receiver.getsockname()
+            messages = [self.manager.createGetRequestMessage('.1.3.6.1.2.1.1.%d.0' % i) for i in range(1, 11)]
+            for msg in messages:
+                self.manager.queueRequest(msg, remote)
+            self.manager.flushOutbound()
+            self.assertTrue(self.manager.sendBlocked)
+            self.assertEqual(self.manager.outbound.qsize(), 7)
+            self.assertEqual(self.manager.sendDelay(), self.manager.timeout)
+
+            start = time.monotonic()
+            self.manager.poll(5)
+            self.assertLess(time.monotonic() - start, 2)
+            self.assertFalse(self.manager.sendBlocked)
+
+            while not self.manager.outbound.empty():
+                self.manager.flushOutbound()
+            received = [receiver.recvfrom(65536)[0] for msg in messages]
+            self.assertEqual(received, [msg.encode() for msg in messages])
+        finally:
+            receiver.close()
+
+    def test_receiveData(self):
+        received = []
+        callback = lambda manager, msg: received.append(msg)
+        reqID = int(self.manager.snmpGet('.1.3.6.1.2.1.1.3.0', ('127.0.0.1', 161), callback))
+
+        def response(requestID):
+            varbind = rfc1905.VarBind(ObjectID('.1.3.6.1.2.1.1.3.0'), rfc1905.TimeTicks(5))
+            pdu = rfc1905.Response(requestID, varBindList=rfc1905.VarBindList([varbind]))
+            return rfc1905.Message(data=pdu).encode()
+
+        # unsolicited, malformed and unwanted messages are dropped
+        noise = (None, None, None)
+        src = ('127.0.0.1', 161)
+        self.manager.receiveData(self.manager, None, (response(reqID + 1000), src), noise)
+        self.manager.receiveData(self.manager, None, (b'\060\003\002\001', src), noise)
+        trap = rfc1905.Message(data=rfc1905.TrapV2(1)).encode()
+        self.manager.receiveData(self.manager, None, (trap, src), noise)
+        self.assertEqual(received, [])
+
+        # the response we asked for is dispatched once
+        self.manager.receiveData(self.manager, None, (response(reqID), src), noise)
+        self.manager.receiveData(self.manager, None, (response(reqID), src), noise)
+        self.assertEqual([msg.data.requestID for msg in received], [reqID])
+        self.assertNotIn(reqID, self.manager.callbacks)
+
+        # traps go to the trapCallback
+        self.manager.trapCallback = callback
+        self.manager.receiveData(self.manager, None, (trap, src), noise)
+        self.assertIsInstance(received[-1].data, rfc1905.TrapV2)
+
+        # as do the SNMPv1 Traps v2.SNMP sends in SNMPv2c messages
+        pdu = rfc1157.TrapPDU(ObjectID('.1.3.6.1.4'), rfc1157.NetworkAddress('127.0.0.1'), rfc1157.GenericTrap(6),
+                              rfc1157.Integer(7), rfc1157.TimeTicks(100), rfc1157.VarBindList())
+        self.manager.receiveData(self.manager, None, (rfc1905.Message(data=pdu).encode(), src), noise)
+        self.assertIsInstance(received[-1].data, rfc1157.TrapPDU)
+        self.assertEqual(received[-1].data.specificTrap.value, 7)
+
+    def test_serve(self):
+        """ Test a manager sharing a running loop sends what's queued
+            and dispatches the response when it arrives
+        """
+        async def get():
+            loop = asyncio.get_running_loop()
+            (agent, protocol) = await loop.create_datagram_endpoint(
+                lambda: Agent({'.1.3.6.1.2.1.1.3.0': rfc1905.TimeTicks(5)}), local_addr=('127.0.0.1', 0))
+            manager = snmpManager(interface=('127.0.0.1', 0), timeout=0.01, loop=loop)
+            server = loop.create_task(manager.serve())
+            try:
+                done = loop.create_future()
+                manager.snmpGet('.1.3.6.1.2.1.1.3.0', agent.get_extra_info('sockname'),
+                                lambda manager, msg: done.set_result(msg))
+                msg = await asyncio.wait_for(done, 2)
+            finally:
+                server.cancel()
+                manager.close()
+                agent.close()
+            return msg
+
+        msg = asyncio.run(get())
+        self.assertEqual(msg.data.varBindList[0].objectValue.value, 5)
+
+    def test_awaitableRequests(self):
+        """ Test get, getNext and set resolve to their responses, fanned
+            out with gather, and time out or cancel cleanly
+        """
+        async def requests():
+            loop = asyncio.get_running_loop()
+            values = dict(('.1.3.6.1.2.1.1.%d.0' % i, rfc1905.Integer32(i)) for i in range(1, 9))
+            (agent, protocol) = await loop.create_datagram_endpoint(lambda: Agent(values),
+                                                                    local_addr=('127.0.0.1', 0))
+            remote = agent.get_extra_info('sockname')
+            manager = snmpManager(interface=('127.0.0.1', 0), loop=loop)
+            try:
+                gets = await asyncio.gather(*[ manager.get(oid, remote, timeout=2) for oid in values ])
+                nxt = await manager.getNext(['.1.3.6.1.2.1.1.2.0'], remote, timeout=2)
+                put = await manager.set('.1.3.6.1.2.1.1.3.0', 0x02, 3, remote, timeout=2)
+
+                with self.assertRaises(asyncio.TimeoutError):
+                    await manager.get('.1.3.6.1.2.1.1.99.0', remote, timeout=0.05)
+
+                pending = loop.create_task(manager.get('.1.3.6.1.2.1.1.98.0', remote))
+                await asyncio.sleep(0)
+                self.assertEqual(len(manager.callbacks), 1)
+                pending.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await pending
+                self.assertEqual(manager.callbacks, {})
+            finally:
+                manager.close()
+                agent.close()
+            return gets, nxt, put
+
+        (gets, nxt, put) = asyncio.run(requests())
+        self.assertEqual([msg.data.varBindList[0].objectValue.value for msg in gets], list(range(1, 9)))
+        self.assertEqual(nxt.data.varBindList[0].objectValue.value, 2)
+        self.assertEqual(put.data.varBindList[0].objectValue.value, 3)
+
+    def test_awaitableRateLimit(self):
+        """ Test awaitable requests keep to the rate limit
+        """
+        async def requests():
+            loop = asyncio.get_running_loop()
+            values = dict(('.1.3.6.1.2.1.1.%d.0' % i, rfc1905.Integer32(i)) for i in range(1, 7))
+            (agent, protocol) = await loop.create_datagram_endpoint(lambda: Agent(values),
+                                                                    local_addr=('127.0.0.1', 0))
+            remote = agent.get_extra_info('sockname')
+            manager = snmpManager(interface=('127.0.0.1', 0), loop=loop, sendRate=20, sendBurst=2)
+            try:
+                gets = await asyncio.gather(*[ manager.get(oid, remote, timeout=2) for oid in values ])
+            finally:
+                manager.close()
+                agent.close()
+            return gets, protocol.arrivals
+
+        (gets, arrivals) = asyncio.run(requests())
+        self.assertEqual([msg.data.varBindList[0].objectValue.value for msg in gets], list(range(1, 7)))
+
+        # a burst of 2, then the other 4 at 20 a second
+        self.assertGreater(arrivals[-1] - arrivals[0], 0.18)
+
+    def test_runDrainsQueue(self):
+        """ Test run() sends everything queued a batch at a time,
+            without waiting between batches, rather than a request each
+            time it polls
+        """
+        class Done(Exception):
+            pass
+
+        def queueEmpty(manager):
+            raise Done()
+
+        agent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        agent.bind(('127.0.0.1', 0))
+        agent.settimeout(2)
+        try:
+            self.manager.close()
+            self.manager = snmpManager(queueEmpty, interface=('127.0.0.1', 0), timeout=0.25)
+            for i in range(200):
+                self.manager.snmpGet('.1.3.6.1.2.1.1.3.0', agent.getsockname(), None)
+                pass
+            self.assertEqual(self.manager.sendDelay(), 0)
+
+            # a batch each pass
+            self.manager.flushOutbound()
+            self.assertEqual(self.manager.outbound.qsize(), 200 - self.manager.manager.batchSize)
+            self.assertEqual(self.manager.sendDelay(), 0)
+
+            start = time.monotonic()
+            self.assertRaises(Done, self.manager.run)
+            self.assertLess(time.monotonic() - start, 1.0)
+            self.assertEqual(len([ agent.recvfrom(65536) for i in range(200) ]), 200)
+            self.assertEqual(self.manager.sendDelay(), 0.25)
+        finally:
+            agent.close()
+
+    def test_queueWakesPoll(self):
+        """ Test a request queued from another thread ends a poll()
+            without waiting out its timeout
+        """
+        queued = threading.Timer(0.05, self.manager.snmpGet,
+                                 ('.1.3.6.1.2.1.1.3.0', ('127.0.0.1', 9), None))
+        queued.start()
+        try:
+            start = time.monotonic()
+            self.manager.poll(5)
+            self.assertLess(time.monotonic() - start, 2)
+            self.assertFalse(self.manager.outbound.empty())
+        finally:
+            queued.cancel()
+
+    def test_rateLimit(self):
+        limit = RateLimit(100, 10)
+        self.assertEqual(limit.allowance(), 10)
+        limit.spend(10)
+        self.assertEqual(limit.allowance(), 0)
+        self.assertGreater(limit.delay(), 0)
+        self.assertLessEqual(limit.delay(), 0.01)
+
+        # a second's worth by default
+        self.assertEqual(RateLimit(50).allowance(), 50)
+
+        self.manager.close()
+        self.manager = snmpManager(interface=('127.0.0.1', 0), sendRate=10, sendBurst=5)
+        for i in range(8):
+            self.manager.queueRequest(b'request', ('127.0.0.1', 9))
+            pass
+        self.manager.sendMany = lambda requests: self.sent.extend(requests) or len(requests)
+        self.sent = []
+        self.manager.flushOutbound()
+        self.assertEqual(len(self.sent), 5)
+        self.assertEqual(self.manager.outbound.qsize(), 3)
+        self.assertGreater(self.manager.sendDelay(), 0.05)
+        self.assertLessEqual(self.manager.sendDelay(), 0.1)
+
+    def test_snmpWalk(self):
+        root = '.1.3.6.1.2.1.2.2.1.2'
+        seen = []
+        done = []
+        walk = self.manager.snmpWalk(root, ('127.0.0.1', 161), lambda manager, varbind: seen.append(varbind),
+                                     whenDone=lambda manager, walk: done.append(walk))
+        noise = (None, None, None)
+
+        def answer(oid, value):
+            (msg, remote) = self.manager.outbound.get(0)
+            varbind = rfc1905.VarBind(ObjectID(oid), value)
+            pdu = rfc1905.Response(int(msg.data.requestID), varBindList=rfc1905.VarBindList([varbind]))
+            octets = rfc1905.Message(data=pdu).encode()
+            self.manager.receiveData(self.manager, None, (octets, remote), noise)
+            return msg
+
+        answer(root + '.1', rfc1905.OctetString('lo'))
+        msg = answer(root + '.16384', rfc1905.OctetString('eth0'))
+        self.assertEqual(str(msg.data.varBindList[0].objectID), root + '.1')
+        self.assertEqual(done, [])
+
+        # the next column ends the walk
+        answer('.1.3.6.1.2.1.2.2.1.3.1', rfc1905.Integer32(6))
+        self.assertEqual([str(varbind.objectID) for varbind in seen], [root + '.1', root + '.16384'])
+        self.assertEqual([varbind.objectValue.value for varbind in seen], [b'lo', b'eth0'])
+        self.assertEqual(done, [walk])
+        self.assertIsNone(walk.error)
+        self.assertTrue(self.manager.outbound.empty())
+        self.assertEqual(self.manager.rawCallbacks, {})
+
+    def test_snmpWalkScalar(self):
+        """ Test walking a scalar Gets it, there being nothing
+            beneath it
+        """
+        root = '.1.3.6.1.2.1.1.1.0'
+        seen = []
+        walk = self.manager.snmpWalk(root, ('127.0.0.1', 161), lambda manager, varbind: seen.append(varbind))
+        noise = (None, None, None)
+
+        def answer(oid, value):
+            (msg, remote) = self.manager.outbound.get(0)
+            varbind = rfc1905.VarBind(ObjectID(oid), value)
+            pdu = rfc1905.Response(int(msg.data.requestID), varBindList=rfc1905.VarBindList([varbind]))
+            octets = rfc1905.Message(data=pdu).encode()
+            self.manager.receiveData(self.manager, None, (octets, remote), noise)
+            return msg
+
+        answer('.1.3.6.1.2.1.1.2.0', rfc1905.ObjectID('.1.3.6.1.4.1.8072'))
+        msg = answer(root, rfc1905.OctetString('Linux'))
+        self.assertIsInstance(msg.data, rfc1905.Get)
+        self.assertEqual(str(msg.data.varBindList[0].objectID), root)
+
+        self.assertEqual([(str(varbind.objectID), varbind.objectValue.value) for varbind in seen], [(root, b'Linux')])
+        self.assertEqual((walk.finished, walk.error, walk.count), (True, None, 1))
+        self.assertTrue(self.manager.outbound.empty())
+        self.assertEqual(self.manager.rawCallbacks, {})
+
+    def test_snmpWalkErrors(self):
+        root = '.1.3.6.1.2.1.2.2.1.2'
+        noise = (None, None, None)
+
+        def answer(oid, value, errorStatus=0):
+            (msg, remote) = self.manager.outbound.get(0)
+            varbind = rfc1905.VarBind(ObjectID(oid), value)
+            pdu = rfc1905.Response(int(msg.data.requestID), errorStatus, varBindList=rfc1905.VarBindList([varbind]))
+            octets = rfc1905.Message(data=pdu).encode()
+            self.manager.receiveData(self.manager, None, (octets, remote), noise)
+
+        # an agent that goes backwards
+        walk = self.manager.snmpWalk(root, ('127.0.0.1', 161), lambda manager, varbind: None)
+        answer(root + '.5', rfc1905.Integer32(1))
+        answer(root + '.4', rfc1905.Integer32(1))
+        self.assertEqual((walk.finished, walk.error, walk.count), (True, 'OID not increasing', 1))
+
+        # the end of the MIB, with nothing at the root either
+        walk = self.manager.snmpWalk(root, ('127.0.0.1', 161), lambda manager, varbind: None)
+        answer(root + '.1', rfc1905.EndOfMibView())
+        self.assertFalse(walk.finished)
+        answer(root, rfc1905.NoSuchObject())
+        self.assertEqual((walk.finished, walk.error, walk.count), (True, None, 0))
+
+        # an error status
+        walk = self.manager.snmpWalk(root, ('127.0.0.1', 161), lambda manager, varbind: None)
+        answer(root + '.1', rfc1905.Null(), errorStatus=5)
+        self.assertTrue(walk.finished)
+        self.assertIsNotNone(walk.error)
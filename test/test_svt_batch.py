@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Stress/volume tests for encoding requests in batches.  Times a fan
+# out poller's tick of Get requests encoded one at a time against the
+# same requests encoded with BatchEncoder.encodeMany() and
+# BatchEncoder.encodeEnds(), and the memory each keeps hold of.
+
+import timeit
+import tracemalloc
+
+import sys
+sys.path.append('../lib')
+
+from libsnmp import rfc1155
+from libsnmp import rfc1905
+
+# How many Gets a tick sends
+REQUESTS = 10000
+
+# How many ticks to time, keeping the fastest
+REPEATS = 5
+
+
+def buildRequests(count=REQUESTS):
+    """ Build one Get for sysUpTime per agent
+    """
+    requests = []
+    for index in range(count):
+        varbind = rfc1905.VarBind(rfc1155.ObjectID('.1.3.6.1.2.1.1.3.0'), rfc1905.Null())
+        pdu = rfc1905.Get(index, varBindList=rfc1905.VarBindList([varbind]))
+        requests.append(rfc1905.Message(data=pdu))
+        pass
+    return requests
+
+
+def encodeEach(requests):
+    return [ msg.encode() for msg in requests ]
+
+
+def measureMemory(encode, requests):
+    """ Return the bytes held by the result of encode(requests)
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = encode(requests)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before
+
+
+if __name__ == '__main__':
+
+    requests = buildRequests()
+    encoder = rfc1155.BatchEncoder()
+    assert [ bytes(view) for view in encoder.encodeMany(requests) ] == encodeEach(requests)
+
+    print('Encoding %d Get requests' % len(requests))
+    print('%-16s %12s %14s' % ('', 'ms per tick', 'bytes held'))
+
+    for (name, encode) in (('one at a time', encodeEach),
+                           ('encodeMany', encoder.encodeMany),
+                           ('encodeEnds', encoder.encodeEnds)):
+        elapsed = min(timeit.repeat(lambda: encode(requests), number=1, repeat=REPEATS))
+        held = measureMemory(encode, requests)
+        print('%-16s %12.2f %14d' % (name, elapsed * 1000, held))
+        pass
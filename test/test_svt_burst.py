@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Stress/volume tests for sending bursts of requests.  Queues a burst
+# of Gets from another thread while snmpManager.run() is polling, and
+# times how long it takes for all of them to reach an agent, with the
+# scheduler run() used to have, sending one request each time it
+# polled, and with the one that sends everything queued as soon as it
+# is queued.
+
+import socket
+import threading
+import time
+
+import sys
+sys.path.append('../lib')
+
+from libsnmp.snmpmanager import snmpManager
+
+# The burst sizes to time, and the largest the old scheduler is timed
+# on, it taking a poll timeout per request
+BURSTS = (10, 100, 1000, 10000)
+LEGACY_MAX = 10
+TIMEOUT = 0.25
+
+
+class LegacyManager(snmpManager):
+    """ The scheduler snmpManager.run() used to have
+    """
+
+    def run(self):
+        while 1:
+            self.poll()
+            if self.outbound.empty():
+                if self.queueEmpty:
+                    self.queueEmpty(self)
+                    pass
+                continue
+            request = self.outbound.get(0)
+            self.send(self.encodeRequest(request[0]), request[1])
+            pass
+
+    pass
+
+
+class Done(Exception):
+    pass
+
+
+def timeBurst(managerClass, count):
+    """ Return the seconds from the first of count Gets being queued
+        to the last of them arriving at the agent
+    """
+    agent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    agent.bind(('127.0.0.1', 0))
+    agent.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 24)
+    agent.settimeout(TIMEOUT * (count + 10))
+    times = {}
+
+    def receive():
+        for i in range(count):
+            agent.recvfrom(65536)
+            pass
+        times['last'] = time.perf_counter()
+        return
+
+    def queueEmpty(manager):
+        if 'last' in times:
+            raise Done()
+
+    manager = managerClass(queueEmpty, interface=('127.0.0.1', 0), timeout=TIMEOUT)
+    template = manager.createGetRequestTemplate(['.1.3.6.1.2.1.1.3.0'])
+
+    def queue():
+        # while run() is waiting in poll()
+        time.sleep(TIMEOUT / 2)
+        times['first'] = time.perf_counter()
+        for i in range(count):
+            manager.snmpGetTemplate(template, agent.getsockname(), None)
+            pass
+        return
+
+    receiver = threading.Thread(target=receive)
+    receiver.start()
+    threading.Thread(target=queue).start()
+    try:
+        manager.run()
+    except Done:
+        pass
+    finally:
+        receiver.join()
+        manager.close()
+        agent.close()
+        pass
+    return times['last'] - times['first']
+
+
+if __name__ == '__main__':
+
+    print('%-8s %16s %16s' % ('burst', 'one per poll', 'drain on queue'))
+    for count in BURSTS:
+        legacy = '-'
+        if count <= LEGACY_MAX:
+            legacy = '%.1f ms' % (timeBurst(LegacyManager, count) * 1e3)
+            pass
+        print('%-8d %16s %16s' % (count, legacy, '%.1f ms' % (timeBurst(snmpManager, count) * 1e3)))
+        pass
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Stress/volume tests for batched datagram I/O.  Sends and reads back
+# a burst of requests over loopback, a datagram per system call and
+# then a batch per recvmmsg() and sendmmsg() call, and prints the
+# datagrams per second each way manages.
+
+import socket
+import time
+from unittest.mock import patch
+
+import sys
+sys.path.append('../lib')
+
+from libsnmp import role
+from libsnmp.snmpmanager import snmpManager
+
+# How many requests in each burst, how many bursts to time, and how
+# many datagrams to move per batch
+BURST = 2000
+REPEATS = 5
+BATCH_SIZE = 64
+
+
+def timeBurst(manager, receiver, requests):
+    """ Send a burst of datagrams to receiver, then read them all
+        back, returning the time taken
+    """
+    remote = receiver.manager.socket.getsockname()
+    datagrams = [ (request, remote) for request in requests ]
+
+    start = time.perf_counter()
+    for first in range(0, len(datagrams), BATCH_SIZE):
+        sent = manager.manager.sendMany(datagrams[first:first + BATCH_SIZE])
+        received = 0
+        while received < sent:
+            received += len(receiver.manager.readMany())
+            pass
+        pass
+    return time.perf_counter() - start
+
+
+def run(label):
+    manager = snmpManager(interface=('127.0.0.1', 0), batchSize=BATCH_SIZE)
+    receiver = snmpManager(interface=('127.0.0.1', 0), batchSize=BATCH_SIZE)
+    try:
+        requests = [ manager.createGetRequestMessage('.1.3.6.1.2.1.1.%d.0' % (i % 9 + 1)).encode()
+                     for i in range(BURST) ]
+        best = min([ timeBurst(manager, receiver, requests) for i in range(REPEATS) ])
+        print('%-24s %12.0f' % (label, BURST / best))
+    finally:
+        manager.close()
+        receiver.close()
+        pass
+    return
+
+
+if __name__ == '__main__':
+
+    print('%-24s %12s' % ('', 'datagrams/s'))
+    with patch.object(role, 'recvmmsg', None), patch.object(role, 'sendmmsg', None):
+        run('sendto/recvfrom')
+        pass
+
+    if role.recvmmsg is None:
+        print('No recvmmsg() or sendmmsg() here')
+    else:
+        run('sendmmsg/recvmmsg')
+        pass
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Stress/volume tests for decoding large responses.  Compares the
+# cursor based decoder against the original decoder, which sliced
+# off the remainder of the stream after every tag, length and object,
+# and times the decode function of every type in the SNMPv2c codec
+# against instantiating the type and calling decodeContents().
+
+import time
+
+import sys
+sys.path.append('../lib')
+
+from libsnmp import rfc1155
+from libsnmp import rfc1157
+from libsnmp import rfc1905
+
+# Size of the encoded response to decode, in octets
+RESPONSE_SIZE = 65536
+
+# How many times to decode it
+ITERATIONS = 20
+
+# How many times to decode each type in the per type benchmark
+TYPE_ITERATIONS = 20000
+
+
+def buildResponse(size=RESPONSE_SIZE):
+    """ Build an encoded Response that is roughly size octets long
+    """
+    varbinds = []
+    length = 0
+    index = 0
+    while length < size:
+        oid = rfc1155.ObjectID('.1.3.6.1.2.1.2.2.1.2.%d' % index)
+        value = rfc1155.OctetString('interface number %d' % index)
+        varbind = rfc1157.VarBind(oid, value)
+        length += len(varbind.encode())
+        varbinds.append(varbind)
+        index += 1
+        pass
+
+    pdu = rfc1157.Response(1, varBindList=rfc1157.VarBindList(varbinds))
+    return rfc1157.Message(data=pdu).encode()
+
+
+def legacyDecode(stream):
+    """ The original decoder, kept here as a reference point
+    """
+    decoder = rfc1155.Asn1Object()
+    objects = []
+    while len(stream) > 0:
+
+        (tag, stream) = decoder.decodeTag(stream)
+        (length, stream) = decoder.decodeLength(stream)
+
+        objectData = stream[:length]
+        stream = stream[length:]
+
+        if tag == 0x30 or tag & 0xa0 == 0xa0:
+            obj = rfc1155.Sequence(legacyDecode(objectData))
+        else:
+            obj = rfc1157.codec.types[tag]().decodeContents(objectData)
+            pass
+        objects.append(obj)
+        pass
+
+    return objects
+
+
+def sampleObject(cls):
+    """ Build a typical object of a codec type
+    """
+    varbinds = rfc1157.VarBindList([rfc1157.VarBind(rfc1155.ObjectID('.1.3.6.1.2.1.1.3.0'),
+                                                    rfc1155.TimeTicks(12345))])
+    if issubclass(cls, rfc1157.PDU):
+        return cls(1, varBindList=varbinds)
+    elif issubclass(cls, rfc1905.BulkPDU):
+        return cls(1, 0, 10, varBindList=varbinds)
+    elif issubclass(cls, rfc1157.TrapPDU):
+        return cls(rfc1155.ObjectID('.1.3.6.1.4.1.2'), rfc1155.NetworkAddress('10.0.0.1'),
+                   rfc1157.GenericTrap(6), rfc1155.Integer(1), rfc1155.TimeTicks(100), varbinds)
+    elif issubclass(cls, rfc1155.Sequence):
+        return cls([rfc1155.Integer(1), rfc1155.OctetString('public')])
+    elif issubclass(cls, rfc1155.IPAddress):
+        return cls('10.0.0.1')
+    elif issubclass(cls, rfc1155.OctetString):
+        return cls('interface number 1')
+    elif issubclass(cls, rfc1155.ObjectID):
+        return cls('.1.3.6.1.2.1.2.2.1.10.1')
+    elif issubclass(cls, rfc1155.Integer):
+        return cls(1234567)
+    return cls()
+
+
+def encodeWithTag(tag, obj):
+    """ Encode obj under the identifier octet it is registered with
+    """
+    contents = obj.encodeContents()
+    return bytes([tag]) + obj.encodeLength(len(contents)) + contents
+
+
+def timeTypes(codec=rfc1905.codec, iterations=TYPE_ITERATIONS):
+    """ Time decoding one object of every type in codec, by
+        instantiation and by decode function
+    """
+    results = []
+    for tag in sorted(codec.types):
+        cls = codec.types[tag]
+        stream = memoryview(encodeWithTag(tag, sampleObject(cls)))
+        (tag, start, end) = rfc1155.decodeHeaderAt(stream, 0, len(stream))
+        contents = stream[start:end]
+        decode = codec.decoders[tag]
+
+        begin = time.time()
+        for i in range(iterations):
+            cls().decodeContents(contents)
+            pass
+        instantiate = (time.time() - begin) / iterations
+
+        begin = time.time()
+        for i in range(iterations):
+            decode(stream, start, end)
+            pass
+        function = (time.time() - begin) / iterations
+
+        results.append((tag, cls, instantiate, function))
+        pass
+    return results
+
+
+def timeDecoder(decoder, octets, iterations=ITERATIONS):
+    start = time.time()
+    for i in range(iterations):
+        decoder(octets)
+        pass
+    return (time.time() - start) / iterations
+
+
+if __name__ == '__main__':
+
+    octets = buildResponse()
+    print('Decoding a %d octet response %d times' % (len(octets), ITERATIONS))
+
+    legacy = timeDecoder(legacyDecode, octets)
+    current = timeDecoder(rfc1157.codec.decode, octets)
+
+    print('legacy decoder:  %8.2f ms per response' % (legacy * 1000))
+    print('current decoder: %8.2f ms per response' % (current * 1000))
+    print('speedup:         %8.2fx' % (legacy / current))
+
+    # A callback that only looks at the header and the first varbind
+    def lazyDecode(octets):
+        msg = rfc1157.Message().decode(octets, lazy=True)
+        return int(msg.data.errorStatus), msg.data.varBindList[0]
+
+    lazy = timeDecoder(lazyDecode, octets)
+    print('lazy decoder:    %8.2f ms per response' % (lazy * 1000))
+
+    def streamDecode(octets):
+        for (name, value) in rfc1157.iterVarBinds(octets):
+            pass
+
+    stream = timeDecoder(streamDecode, octets)
+    print('varbind stream:  %8.2f ms per response' % (stream * 1000))
+
+    raw = timeDecoder(rfc1157.Message().decodeRaw, octets)
+    print('raw decoder:     %8.2f ms per response' % (raw * 1000))
+
+    print('')
+    print('Decoding each type %d times' % TYPE_ITERATIONS)
+    print('%-4s %-16s %14s %14s' % ('tag', 'type', 'instantiate', 'decode func'))
+    for (tag, cls, instantiate, function) in timeTypes():
+        print('0x%02x %-16s %11.2f us %11.2f us' % (tag, cls.__name__, instantiate * 1e6, function * 1e6))
+        pass
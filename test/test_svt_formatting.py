@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Stress/volume tests for formatting.  Times the hex and octal
+# renderings in the formatting module against the ones util used to
+# have, which sliced the input and grew the output an octet at a time.
+
+import timeit
+
+import sys
+sys.path.append('../lib')
+
+from libsnmp import formatting
+
+# Lengths of OctetString to format
+LENGTHS = (16, 256, 4096, 65536)
+
+REPEATS = 3
+
+
+def legacyOctetsToHex(octets):
+    result = ''
+    while octets:
+        byte = octets[0]
+        octets = octets[1:]
+        result += "%.2x" % byte
+
+    return result
+
+
+def legacyOctetsToOct(octets):
+    result = ''
+    while octets:
+        byte = octets[0]
+        octets = octets[1:]
+        result += "%.4s," % oct(byte)
+
+    return result
+
+
+def timeFormat(format, octets):
+    number = max(1, 65536 // len(octets))
+    return min(timeit.repeat(lambda: format(octets), number=number, repeat=REPEATS)) / number
+
+
+if __name__ == '__main__':
+
+    print('%-8s %14s %14s %14s %14s' % ('length', 'legacy hex', 'hex', 'legacy oct', 'oct'))
+    for length in LENGTHS:
+        octets = bytes(range(64)) * (length // 64) or bytes(range(length))
+        assert formatting.octetsToHex(octets) == legacyOctetsToHex(octets)
+        times = [ timeFormat(format, octets) for format in
+                  (legacyOctetsToHex, formatting.octetsToHex, legacyOctetsToOct, formatting.octetsToOct) ]
+        print('%-8d' % length + ''.join([ '%11.1f us' % (t * 1e6) for t in times ]))
+        pass
@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Stress/volume tests for the Integer codec.  Times int.from_bytes and
+# int.to_bytes, which Integer and its subclasses now use, against the
+# three twos complement decoders Integer used to carry for comparison
+# and the byte at a time encoder, across every width of value SNMP
+# sends.
+
+import timeit
+from functools import reduce
+
+import sys
+sys.path.append('../lib')
+
+from libsnmp import rfc1155
+
+# How many times to run each codec for each width, and how many times
+# to repeat that, keeping the fastest run
+ITERATIONS = 100000
+REPEATS = 5
+
+
+def decodeTwosInteger1(stream):
+    """ Original pysnmp algorithm """
+    octets = list(stream)
+    if octets[0] & 0x80:
+        octets.insert(0, -1)
+        pass
+
+    return reduce(lambda x, y: x << 8 | y, octets, 0)
+
+
+def decodeTwosInteger2(stream):
+    """ A second algorithm, coded from scratch by jpw, and the one
+        Integer.decodeContents() used """
+    val = 0
+    byte = stream[0]
+    if (byte & 0x80) == 0x80:
+        negbit = 0x80
+        val = byte & 0x7f
+
+        for i in range(len(stream) - 1):
+            byte = stream[i + 1]
+            negbit <<= 8
+            val = (val << 8) | byte
+            pass
+
+        val = val - negbit
+
+    else:
+        val = byte
+        for i in range(len(stream) - 1):
+            byte = stream[i + 1]
+            val = (val << 8) | byte
+            pass
+        pass
+    return val
+
+
+def decodeTwosInteger3(stream):
+    """ A third algorithm, coded from scratch by jpw """
+    val = 0
+    octets = list(stream)
+
+    if octets[0] & 0x80:
+        octets[0] = octets[0] & 0x7f  # invert bit 8
+        negbit = 0x80
+        for i in octets:
+            negbit <<= 8
+            val = (val << 8) | i
+            pass
+        val = val - (negbit >> 8)
+
+    else:
+        for i in octets:
+            val = (val << 8) | i
+            pass
+        pass
+
+    return val
+
+
+def legacyEncode(integer):
+    """ The byte at a time encoder Integer.encodeContents() used """
+    if integer == 0:
+        return b'\000'
+
+    elif integer == -1:
+        return b'\377'
+
+    elif integer > 0:
+        result = bytearray()
+        while integer != 0:
+            result.append(integer & 0xff)
+            integer >>= 8
+            pass
+
+        if result[-1] & 0x80:
+            result.append(0)
+            pass
+
+        result.reverse()
+        return bytes(result)
+
+    else:
+        result = bytearray()
+        while integer != -1:
+            result.append(integer & 0xff)
+            integer >>= 8
+            pass
+
+        if result[-1] & 0x80 != 0x80:
+            result.append(0xff)
+            pass
+
+        result.reverse()
+        return bytes(result)
+
+
+DECODERS = (
+    ('decodeTwosInteger1', decodeTwosInteger1),
+    ('decodeTwosInteger2', decodeTwosInteger2),
+    ('decodeTwosInteger3', decodeTwosInteger3),
+    ('int.from_bytes', rfc1155.decodeIntegerValue),
+)
+
+ENCODERS = (
+    ('legacy encode', legacyEncode),
+    ('int.to_bytes', rfc1155.encodeIntegerValue),
+)
+
+
+def sampleValues():
+    """ A positive and a negative value for every encoded width from
+        one octet to the nine of a large Counter64
+    """
+    values = []
+    for width in range(1, 10):
+        top = 1 << (8 * width - 1)
+        values.append((width, top - 1))
+        values.append((width, -top))
+        pass
+    values[-1] = (9, (1 << 64) - 1)
+    return values
+
+
+def timeCodec(codec, arg, iterations=ITERATIONS, repeats=REPEATS):
+    timer = timeit.Timer('codec(arg)', globals={'codec': codec, 'arg': arg})
+    return min(timer.repeat(repeats, iterations)) / iterations
+
+
+if __name__ == '__main__':
+
+    print('Decoding, in ns per value')
+    print('%-6s %-21s' % ('width', 'value') + ''.join(['%20s' % name for (name, codec) in DECODERS]))
+    for (width, value) in sampleValues():
+        octets = memoryview(rfc1155.encodeIntegerValue(value))
+        assert len(octets) == width
+        for (name, codec) in DECODERS:
+            assert codec(octets) == value, name
+            pass
+        times = [ timeCodec(codec, octets) for (name, codec) in DECODERS ]
+        print('%-6d %-21d' % (width, value) + ''.join(['%20.1f' % (t * 1e9) for t in times]))
+        pass
+
+    print('')
+    print('Encoding, in ns per value')
+    print('%-6s %-21s' % ('width', 'value') + ''.join(['%20s' % name for (name, codec) in ENCODERS]))
+    for (width, value) in sampleValues():
+        for (name, codec) in ENCODERS:
+            assert codec(value) == legacyEncode(value), name
+            pass
+        times = [ timeCodec(codec, value) for (name, codec) in ENCODERS ]
+        print('%-6d %-21d' % (width, value) + ''.join(['%20.1f' % (t * 1e9) for t in times]))
+        pass
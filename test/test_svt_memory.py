@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Stress/volume tests for the memory held by decoded varbinds.  Decodes
+# a large walk and reports how many bytes each varbind keeps alive,
+# as measured by tracemalloc.
+
+import time
+import tracemalloc
+
+import sys
+sys.path.append('../lib')
+
+from libsnmp import rfc1155
+from libsnmp import rfc1902
+from libsnmp import rfc1905
+
+# How many varbinds to hold in memory
+VARBINDS = 100000
+
+# Varbinds per response, as a walk would receive them
+PER_RESPONSE = 500
+
+# One column of each type found in a typical ifTable walk
+COLUMNS = (
+    (2, lambda i: rfc1155.OctetString('interface number %d' % i)),
+    (3, lambda i: rfc1902.Integer32(6)),
+    (5, lambda i: rfc1902.Guage32(1000000000)),
+    (9, lambda i: rfc1155.TimeTicks(i * 100)),
+    (10, lambda i: rfc1902.Counter32(i * 1000)),
+    (20, lambda i: rfc1155.IPAddress('10.0.%d.%d' % (i // 256 % 256, i % 256))),
+)
+
+
+def buildWalk(count=VARBINDS, perResponse=PER_RESPONSE):
+    """ Build the encoded responses of a walk returning count varbinds
+    """
+    responses = []
+    varbinds = []
+    for index in range(count):
+        (column, valueType) = COLUMNS[index % len(COLUMNS)]
+        oid = rfc1155.ObjectID('.1.3.6.1.2.1.2.2.1.%d.%d' % (column, index))
+        varbinds.append(rfc1905.VarBind(oid, valueType(index)))
+        if len(varbinds) == perResponse:
+            pdu = rfc1905.Response(1, varBindList=rfc1905.VarBindList(varbinds))
+            responses.append(rfc1905.Message(data=pdu).encode())
+            varbinds = []
+            pass
+        pass
+
+    if varbinds:
+        pdu = rfc1905.Response(1, varBindList=rfc1905.VarBindList(varbinds))
+        responses.append(rfc1905.Message(data=pdu).encode())
+        pass
+    return responses
+
+
+def decodeWalk(responses):
+    """ Decode every response, keeping all of the varbinds
+    """
+    result = []
+    for octets in responses:
+        msg = rfc1905.Message().decode(octets)
+        result.extend(msg.data.varBindList)
+        pass
+    return result
+
+
+def measureWalk(responses):
+    """ Return the number of varbinds decoded from responses and the
+        bytes allocated to hold them
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = decodeWalk(responses)
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(result), after - before
+
+
+if __name__ == '__main__':
+
+    count = VARBINDS
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+        pass
+
+    responses = buildWalk(count)
+    print('Decoding a walk of %d varbinds in %d responses' % (count, len(responses)))
+
+    start = time.time()
+    (varbinds, size) = measureWalk(responses)
+    elapsed = time.time() - start
+
+    print('held in memory:  %8.2f MB' % (size / 1048576.0))
+    print('per varbind:     %8.1f bytes' % (size / varbinds))
+    print('decode time:     %8.2f s (under tracemalloc)' % elapsed)
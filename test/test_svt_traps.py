@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#
+#    libsnmp - a Python SNMP library
+#    Copyright (c) 2003 Justin Warren <daedalus@eigenmagic.com>
+#
+# Stress/volume tests for the multi-process trap listener.  Sends a
+# stream of traps over loopback from many source ports to one, two
+# and more workers, and prints how many traps per second they handled
+# between them, and how many their sockets dropped.
+
+import os
+import socket
+import time
+
+import sys
+sys.path.append('../lib')
+
+from libsnmp import listener
+from libsnmp import rfc1155
+from libsnmp import rfc1157
+from libsnmp import rfc1905
+
+# How many traps to send to each set of workers, from how many source
+# ports, and how many to send before checking the workers keep up
+TRAPS = 20000
+SOURCES = 64
+BURST = 32
+
+
+def encodeTraps(count):
+    """ Encode count different traps, so each worker decodes them
+        all in full
+    """
+    traps = []
+    for i in range(count):
+        varbinds = [ rfc1157.VarBind(rfc1155.ObjectID('.1.3.6.1.4.1.9.9.41.1.2.3.1.%d' % n),
+                                     rfc1155.OctetString('interface %d changed state' % n)) for n in range(4) ]
+        pdu = rfc1157.TrapPDU(rfc1155.ObjectID('.1.3.6.1.4.1.9'), rfc1155.NetworkAddress('127.0.0.1'),
+                              rfc1157.GenericTrap(6), rfc1155.Integer(i), rfc1155.TimeTicks(i),
+                              rfc1157.VarBindList(varbinds))
+        traps.append(rfc1905.Message(data=pdu).encode())
+        pass
+    return traps
+
+
+def handled(trapListener):
+    stats = trapListener.stats()
+    return sum(worker['traps'] for worker in stats), sum(worker['drops'] or 0 for worker in stats)
+
+
+def run(workers, traps):
+    trapListener = listener.TrapListener(lambda snmpClient, msg: None, ('127.0.0.1', 0), workers=workers)
+    trapListener.start()
+    sockets = [ socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for i in range(SOURCES) ]
+    try:
+        remote = trapListener.interface
+        start = time.perf_counter()
+        for first in range(0, len(traps), BURST):
+            for (i, trap) in enumerate(traps[first:first + BURST]):
+                sockets[(first + i) % SOURCES].sendto(trap, remote)
+                pass
+
+            # Keep no more than a burst in flight, so what is measured
+            # is how fast the workers decode, not how big their
+            # socket buffers are
+            while sum(handled(trapListener)) < first:
+                time.sleep(0.0005)
+                pass
+            pass
+
+        deadline = time.monotonic() + 10
+        while sum(handled(trapListener)) < len(traps) and time.monotonic() < deadline:
+            time.sleep(0.001)
+            pass
+        elapsed = time.perf_counter() - start
+        (count, drops) = handled(trapListener)
+        print('%-8d %12.0f %10d' % (workers, count / elapsed, drops))
+    finally:
+        trapListener.stop()
+        for sock in sockets:
+            sock.close()
+            pass
+        pass
+    return
+
+
+if __name__ == '__main__':
+
+    traps = encodeTraps(TRAPS)
+    print('%-8s %12s %10s' % ('workers', 'traps/s', 'drops'))
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        run(workers, traps)
+        workers *= 2
+        pass
@@ -6,6 +6,7 @@
 import getopt
 import sys
 
+from libsnmp import listener
 from libsnmp import v2
 
 
@@ -50,11 +51,25 @@ def whenDone(snmpClient):
     sys.exit(0)
 
 
+# Print how each worker is doing
+def printStats(stats):
+    for (slot, worker) in enumerate(stats):
+        print("# worker %d: %d traps, %.1f/s, %d errors, %s drops" % (
+            slot, worker['traps'], worker['rate'], worker['errors'], worker['drops']))
+
+
 # Main bits
 
-# Read command line
-options, args = getopt.getopt(sys.argv[1:], '', [])
+# Read command line: -w N spreads the traps across N worker processes
+options, args = getopt.getopt(sys.argv[1:], 'w:', [])
+workers = 0
+for (option, value) in options:
+    if option == '-w':
+        workers = int(value)
 
 # Listen on SNMP trap port
-myClient = v2.SNMP(('0.0.0.0', 162), trapCallback=checkResponse)
-myClient.run()
+if workers:
+    listener.TrapListener(checkResponse, ('0.0.0.0', 162), workers=workers).run(report=printStats)
+else:
+    myClient = v2.SNMP(('0.0.0.0', 162), trapCallback=checkResponse)
+    myClient.run()